@@ -0,0 +1,190 @@
+from bisect import bisect_left
+from datetime import datetime, time as dt_time, timedelta
+from django.conf import settings
+from data_store import data_store
+import threading
+import time
+
+# Appointments can start between 8 AM and 6 PM (inclusive)
+WORKING_START = dt_time(8, 0)
+WORKING_END = dt_time(18, 0)
+
+def time_to_minutes(time_str):
+    """Convert 'HH:MM' or 'HH:MM:SS' to minutes after midnight"""
+    hours, minutes = time_str.split(':')[:2]
+    return int(hours) * 60 + int(minutes)
+
+class DayIndex:
+    """Booked intervals for one doctor or patient on one day, sorted by start"""
+
+    def __init__(self, appointments, default_duration):
+        intervals = []
+        for apt in appointments:
+            start = time_to_minutes(apt["time"])
+            duration = apt.get("duration_minutes") or default_duration
+            intervals.append((start, start + duration, apt["id"]))
+        intervals.sort()
+
+        self.intervals = intervals
+        self.starts = [interval[0] for interval in intervals]
+        self.max_duration = max((end - start for start, end, _ in intervals), default=0)
+
+    def conflicts(self, start, end, exclude_id=None):
+        """Return the IDs of appointments overlapping [start, end)"""
+        # Only intervals starting in (start - max_duration, end) can overlap
+        first = bisect_left(self.starts, start - self.max_duration + 1)
+        last = bisect_left(self.starts, end)
+        return [
+            apt_id for apt_start, apt_end, apt_id in self.intervals[first:last]
+            if apt_end > start and str(apt_id) != str(exclude_id)
+        ]
+
+class AvailabilityIndex:
+    """In-memory per-day interval index of doctor and patient bookings
+
+    Day indexes are cached for settings.AVAILABILITY_INDEX_TTL seconds and
+    dropped with invalidate() whenever an appointment is written.
+    """
+
+    def __init__(self, ttl=None, default_duration=None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'AVAILABILITY_INDEX_TTL', 60)
+        self.default_duration = default_duration or getattr(settings, 'APPOINTMENT_DURATION_MINUTES', 30)
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _store(self, party, party_id, date_str, appointments):
+        index = DayIndex(appointments, self.default_duration)
+        with self._lock:
+            self._indexes[(party, str(party_id), date_str)] = (index, time.monotonic() + self.ttl)
+        return index
+
+    def _cached(self, party, party_id, date_str):
+        with self._lock:
+            entry = self._indexes.get((party, str(party_id), date_str))
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+    def load_day(self, date_str, doctor_id=None, patient_id=None):
+        """Load a doctor's and/or patient's bookings for a day in one query
+
+        Returns a dict with 'doctor' and/or 'patient' DayIndex entries.
+        """
+        rows = data_store.day_bookings(date_str, doctor_id=doctor_id, patient_id=patient_id)
+
+        indexes = {}
+        if doctor_id:
+            doctor_rows = [apt for apt in rows if str(apt["doctor_id"]) == str(doctor_id)]
+            indexes["doctor"] = self._store("doctor", doctor_id, date_str, doctor_rows)
+        if patient_id:
+            patient_rows = [apt for apt in rows if str(apt["patient_id"]) == str(patient_id)]
+            indexes["patient"] = self._store("patient", patient_id, date_str, patient_rows)
+        return indexes
+
+    def get_doctor_day(self, doctor_id, date_str):
+        """Return the (possibly cached) DayIndex for a doctor"""
+        return self._cached("doctor", doctor_id, date_str) or self.load_day(date_str, doctor_id=doctor_id)["doctor"]
+
+    def check_slots(self, doctor_id, date_str, times, duration=None):
+        """Check many candidate start times for a doctor at once
+
+        Returns a dict mapping each time string to True if it is free.
+        """
+        duration = duration or self.default_duration
+        index = self.get_doctor_day(doctor_id, date_str)
+        return {
+            time_str: not index.conflicts(time_to_minutes(time_str), time_to_minutes(time_str) + duration)
+            for time_str in times
+        }
+
+    def check_booking(self, doctor_id, patient_id, date_str, time_str, exclude_appointment_id=None, duration=None):
+        """Check a booking for doctor and patient conflicts with one fresh query
+
+        The booking path always reloads rather than trusting the cache, so
+        another process's recent booking is never missed.
+        Returns (valid, party) where party is 'doctor' or 'patient' on conflict.
+        """
+        start = time_to_minutes(time_str)
+        end = start + (duration or self.default_duration)
+        indexes = self.load_day(date_str, doctor_id=doctor_id, patient_id=patient_id)
+
+        for party in ("doctor", "patient"):
+            if party in indexes and indexes[party].conflicts(start, end, exclude_appointment_id):
+                return False, party
+        return True, None
+
+    def invalidate(self, date_str, doctor_id=None, patient_id=None):
+        """Drop cached day indexes after an appointment is created or updated"""
+        with self._lock:
+            if doctor_id:
+                self._indexes.pop(("doctor", str(doctor_id), date_str), None)
+            if patient_id:
+                self._indexes.pop(("patient", str(patient_id), date_str), None)
+
+def find_free_slots(doctor_ids, start_date, end_date, slot_minutes=None, now=None):
+    """Find open start times for doctors over an inclusive date range
+
+    Each doctor-day is a bitmap with one bit per candidate start time inside
+    working hours. Every booking marks the starts it overlaps as busy, using
+    its duration_minutes like DayIndex does and APPOINTMENT_DURATION_MINUTES
+    for the new booking, so the whole range costs one bulk query plus
+    integer bit operations.
+    Returns {doctor_id: {date: ['HH:MM', ...]}}.
+    """
+    duration = getattr(settings, 'APPOINTMENT_DURATION_MINUTES', 30)
+    step = slot_minutes or duration
+    now = now or datetime.now()
+
+    day_start = WORKING_START.hour * 60 + WORKING_START.minute
+    day_end = WORKING_END.hour * 60 + WORKING_END.minute
+    slot_count = (day_end - day_start) // step + 1
+    full_mask = (1 << slot_count) - 1
+    slot_labels = [
+        f"{(day_start + i * step) // 60:02d}:{(day_start + i * step) % 60:02d}" for i in range(slot_count)
+    ]
+
+    first_day = datetime.strptime(start_date, '%Y-%m-%d').date()
+    last_day = datetime.strptime(end_date, '%Y-%m-%d').date()
+    dates = [
+        (first_day + timedelta(days=offset)).isoformat()
+        for offset in range((last_day - first_day).days + 1)
+    ]
+
+    busy = {(str(doctor_id), date_str): 0 for doctor_id in doctor_ids for date_str in dates}
+    for booking in data_store.doctor_bookings(doctor_ids, start_date, end_date):
+        key = (str(booking["doctor_id"]), booking["date"])
+        if key not in busy:
+            continue
+        booked_start = time_to_minutes(booking["time"])
+        booked_end = booked_start + (booking.get("duration_minutes") or duration)
+        # A new booking at slot i overlaps when start_i < booked_end and start_i + duration > booked_start
+        lo = max(0, -(-(booked_start - duration + 1 - day_start) // step))
+        hi = min(slot_count - 1, (booked_end - 1 - day_start) // step)
+        if lo <= hi:
+            busy[key] |= ((1 << (hi - lo + 1)) - 1) << lo
+
+    # Starts that are already in the past are not bookable
+    today = now.date().isoformat()
+    now_minutes = now.hour * 60 + now.minute
+    past_today = 0
+    if day_start <= now_minutes:
+        past_count = min(slot_count, (now_minutes - day_start) // step + 1)
+        past_today = (1 << past_count) - 1
+
+    slots = {}
+    for (doctor_id, date_str), busy_mask in busy.items():
+        if date_str < today:
+            free_mask = 0
+        else:
+            free_mask = full_mask & ~busy_mask
+            if date_str == today:
+                free_mask &= ~past_today
+        slots.setdefault(doctor_id, {})[date_str] = [
+            slot_labels[i] for i in range(slot_count) if free_mask >> i & 1
+        ]
+    return slots
+
+# Create a singleton instance
+availability_index = AvailabilityIndex()
+
+__all__ = ['availability_index', 'AvailabilityIndex', 'find_free_slots', 'time_to_minutes', 'WORKING_START', 'WORKING_END']
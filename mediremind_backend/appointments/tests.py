@@ -1,3 +1,293 @@
-from django.test import TestCase
+from django.conf import settings
+from datetime import datetime
+from django.test import RequestFactory, SimpleTestCase, override_settings
+import base64
+import json
+import os
+import unittest
+import uuid
+from unittest import mock
+from data_store import PostgresDataStore, SupabaseDataStore
+from providers import providers
+from notifications.utils import appointment_shard
+from .availability import find_free_slots
+from .utils import decode_cursor, encode_cursor
+from .views import MAX_SLOT_SEARCH_DAYS, MAX_SLOT_SEARCH_DOCTORS, available_slots
 
-# Create your tests here.
+DOCTOR_ID = "00000000-0000-0000-0000-00000000d001"
+PATIENT_IDS = ["00000000-0000-0000-0000-00000000a001", "00000000-0000-0000-0000-00000000a002"]
+
+# (patient, date, time, status); several share a date and time so pages split on id
+APPOINTMENTS = [
+    (0, "2026-03-02", "09:00", "scheduled"),
+    (1, "2026-03-02", "09:00", "scheduled"),
+    (0, "2026-03-02", "09:00", "cancelled"),
+    (1, "2026-03-02", "10:30", "scheduled"),
+    (0, "2026-03-03", "08:00", "scheduled"),
+    (1, "2026-03-03", "08:00", "scheduled"),
+    (0, "2026-03-04", "14:00", "scheduled")
+]
+
+def raw_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+class AppointmentCursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        appointment = {"date": "2026-03-02", "time": "09:00:00", "id": DOCTOR_ID}
+        self.assertEqual(decode_cursor(encode_cursor(appointment)), ("2026-03-02", "09:00:00", DOCTOR_ID))
+
+    def test_crafted_parts_are_rejected(self):
+        for key in (
+            ['2026-03-02",id.gt."', "09:00:00", DOCTOR_ID],
+            ["2026-03-02", '09:00",status.eq."x', DOCTOR_ID],
+            ["2026-03-02", "09:00:00", f'{DOCTOR_ID}")'],
+            ["2026-03-02", "09:00:00"],
+            [20260302, "09:00:00", DOCTOR_ID]
+        ):
+            with self.subTest(key=key), self.assertRaises(ValueError):
+                decode_cursor(raw_cursor(key))
+
+OTHER_DOCTOR_ID = "00000000-0000-0000-0000-00000000d002"
+
+def booking(time_str, duration_minutes=None, doctor_id=DOCTOR_ID, date_str="2026-03-02"):
+    return {"id": str(uuid.uuid4()), "doctor_id": doctor_id, "date": date_str, "time": time_str,
+            "duration_minutes": duration_minutes}
+
+@override_settings(APPOINTMENT_DURATION_MINUTES=30)
+class FindFreeSlotsTests(SimpleTestCase):
+    def setUp(self):
+        self.data_store = self.enterContext(providers.override('data_store', mock.Mock()))
+        self.data_store.doctor_bookings.return_value = []
+
+    def free(self, *bookings, slot_minutes=None, now=datetime(2026, 3, 1, 12, 0), end_date="2026-03-02"):
+        self.data_store.doctor_bookings.return_value = list(bookings)
+        return find_free_slots([DOCTOR_ID], "2026-03-02", end_date, slot_minutes=slot_minutes, now=now)
+
+    def busy(self, *bookings, slot_minutes=None):
+        free = self.free(*bookings, slot_minutes=slot_minutes)[DOCTOR_ID]["2026-03-02"]
+        everything = self.free(slot_minutes=slot_minutes)[DOCTOR_ID]["2026-03-02"]
+        return [slot for slot in everything if slot not in free]
+
+    def test_empty_day_offers_every_start_in_working_hours(self):
+        slots = self.free()[DOCTOR_ID]["2026-03-02"]
+        self.assertEqual((slots[0], slots[-1], len(slots)), ("08:00", "18:00", 21))
+
+    def test_booking_on_a_slot_edge_blocks_only_that_slot(self):
+        self.assertEqual(self.busy(booking("09:00")), ["09:00"])
+
+    def test_booking_crossing_slot_edges_blocks_both_slots(self):
+        self.assertEqual(self.busy(booking("09:10")), ["09:00", "09:30"])
+
+    def test_booking_duration_is_honoured(self):
+        self.assertEqual(self.busy(booking("10:00", duration_minutes=90)), ["10:00", "10:30", "11:00"])
+
+    def test_overlapping_bookings(self):
+        busy = self.busy(booking("13:00", duration_minutes=60), booking("13:30"), booking("13:45", duration_minutes=10))
+        self.assertEqual(busy, ["13:00", "13:30"])
+
+    def test_new_booking_length_is_used_with_shorter_slots(self):
+        # A 30 minute booking starting at 08:45 would run into 09:00
+        self.assertEqual(self.busy(booking("09:00"), slot_minutes=15), ["08:45", "09:00", "09:15"])
+
+    def test_bookings_at_the_ends_of_the_day(self):
+        self.assertEqual(self.busy(booking("07:45"), booking("17:50")), ["08:00", "17:30", "18:00"])
+
+    def test_other_doctors_and_days_are_unaffected(self):
+        self.data_store.doctor_bookings.return_value = [
+            booking("09:00", doctor_id=OTHER_DOCTOR_ID), booking("09:00", date_str="2026-03-03")
+        ]
+        slots = find_free_slots([DOCTOR_ID, OTHER_DOCTOR_ID], "2026-03-02", "2026-03-03", now=datetime(2026, 3, 1))
+
+        self.assertIn("09:00", slots[DOCTOR_ID]["2026-03-02"])
+        self.assertNotIn("09:00", slots[DOCTOR_ID]["2026-03-03"])
+        self.assertNotIn("09:00", slots[OTHER_DOCTOR_ID]["2026-03-02"])
+        self.assertIn("09:00", slots[OTHER_DOCTOR_ID]["2026-03-03"])
+
+    def test_past_starts_are_not_offered(self):
+        slots = self.free(now=datetime(2026, 3, 2, 10, 10), end_date="2026-03-03")[DOCTOR_ID]
+        self.assertEqual(slots["2026-03-02"][0], "10:30")
+        self.assertEqual(len(slots["2026-03-03"]), 21)
+
+        slots = self.free(now=datetime(2026, 3, 3, 8, 0))[DOCTOR_ID]
+        self.assertEqual(slots["2026-03-02"], [])
+
+class AvailableSlotsViewTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.enterContext(mock.patch('authapp.decorators.authenticate_request', return_value=(mock.Mock(), None)))
+        self.data_store = self.enterContext(providers.override('data_store', mock.Mock()))
+        self.data_store.doctor_bookings.return_value = []
+
+    def get(self, **params):
+        response = available_slots(self.factory.get('/api/appointments/available-slots/', params))
+        return response.status_code, json.loads(response.content)
+
+    def test_slots_are_returned(self):
+        status, body = self.get(doctor_ids=f"{DOCTOR_ID},{OTHER_DOCTOR_ID}", start_date="2030-01-01", end_date="2030-01-02")
+        self.assertEqual(status, 200)
+        self.assertEqual(set(body["slots"]), {DOCTOR_ID, OTHER_DOCTOR_ID})
+
+    def test_bounds_are_enforced(self):
+        too_many = ",".join(str(uuid.UUID(int=index)) for index in range(MAX_SLOT_SEARCH_DOCTORS + 1))
+        for params, error in (
+            ({}, "Missing doctor IDs"),
+            ({"doctor_ids": too_many}, "Too many doctors"),
+            ({"doctor_id": DOCTOR_ID, "start_date": "2030-01-01", "end_date": "2030-02-01"}, "Date range too long"),
+            ({"doctor_id": DOCTOR_ID, "start_date": "2030-01-02", "end_date": "2030-01-01"}, "Invalid date range"),
+            ({"doctor_id": DOCTOR_ID, "start_date": "01/02/2030"}, "Invalid parameters"),
+            ({"doctor_id": DOCTOR_ID, "slot_minutes": "4"}, "Invalid slot length"),
+            ({"doctor_id": DOCTOR_ID, "slot_minutes": "241"}, "Invalid slot length"),
+            ({"doctor_id": DOCTOR_ID, "slot_minutes": "half"}, "Invalid parameters")
+        ):
+            with self.subTest(params=params):
+                status, body = self.get(**params)
+                self.assertEqual((status, body["error"]), (400, error))
+        self.data_store.doctor_bookings.assert_not_called()
+
+    def test_longest_allowed_search(self):
+        doctor_ids = ",".join(str(uuid.UUID(int=index)) for index in range(MAX_SLOT_SEARCH_DOCTORS))
+        status, body = self.get(doctor_ids=doctor_ids, start_date="2030-01-01", end_date="2030-01-31")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(len(body["slots"]), MAX_SLOT_SEARCH_DOCTORS)
+        self.assertEqual(len(body["slots"][str(uuid.UUID(int=0))]), MAX_SLOT_SEARCH_DAYS)
+
+class SupabaseDataStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.admin_client = self.enterContext(providers.override('supabase_admin', mock.Mock()))
+
+    def test_parties_are_filtered_by_uuid(self):
+        SupabaseDataStore().day_bookings("2026-03-02", doctor_id=DOCTOR_ID, patient_id=PATIENT_IDS[0])
+
+        query = self.admin_client.table.return_value.select.return_value.eq.return_value
+        query.or_.assert_called_once_with(f"doctor_id.eq.{DOCTOR_ID},patient_id.eq.{PATIENT_IDS[0]}")
+
+    def test_crafted_id_is_rejected_before_querying(self):
+        with self.assertRaises(ValueError):
+            SupabaseDataStore().day_bookings("2026-03-02", doctor_id=f"{DOCTOR_ID},status.eq.cancelled")
+        self.admin_client.table.assert_not_called()
+
+    def test_sharded_day_is_filtered_by_the_database(self):
+        rpc = self.admin_client.rpc.return_value.select.return_value.order.return_value.range.return_value
+        rpc.execute.return_value = mock.Mock(data=[{"id": "a1"}])
+
+        rows = SupabaseDataStore().appointments_on_date("2026-03-02", shard=1, shard_count=3)
+
+        self.assertEqual(rows, [{"id": "a1"}])
+        self.admin_client.rpc.assert_called_once_with(
+            "appointments_in_shard", {"run_date": "2026-03-02", "shard": 1, "shard_count": 3}
+        )
+        self.admin_client.table.assert_not_called()
+
+@unittest.skipUnless(os.getenv('DATABASE_URL'), "DATABASE_URL is not set")
+class PostgresDataStoreTests(SimpleTestCase):
+    """Runs against DATABASE_URL in a throwaway schema built from local_postgres_schema.sql"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        import psycopg
+        from psycopg.conninfo import make_conninfo
+
+        cls.psycopg = psycopg
+        cls.schema = f"test_{uuid.uuid4().hex}"
+        cls.url = make_conninfo(os.environ['DATABASE_URL'], options=f"-c search_path={cls.schema}")
+        schema_sql = (settings.BASE_DIR.parent / 'migrations' / 'local_postgres_schema.sql').read_text()
+
+        with psycopg.connect(os.environ['DATABASE_URL'], autocommit=True) as conn:
+            conn.execute(f"CREATE SCHEMA {cls.schema}")
+        with psycopg.connect(cls.url, autocommit=True) as conn:
+            conn.execute(schema_sql)
+            conn.execute(
+                "INSERT INTO users (id, email, full_name, role) VALUES (%s, 'doctor@example.com', 'Dr. Who', 'doctor')",
+                (DOCTOR_ID,)
+            )
+            conn.execute(
+                "INSERT INTO staff_profiles (user_id, full_name) VALUES (%s, 'Dr. Who')", (DOCTOR_ID,)
+            )
+            for index, patient_id in enumerate(PATIENT_IDS):
+                conn.execute(
+                    "INSERT INTO users (id, email) VALUES (%s, %s)", (patient_id, f"patient{index}@example.com")
+                )
+                conn.execute(
+                    "INSERT INTO patients (user_id, full_name, phone) VALUES (%s, %s, '255700000000')",
+                    (patient_id, f"Patient {index}")
+                )
+            for patient, date_str, time_str, status in APPOINTMENTS:
+                conn.execute(
+                    "INSERT INTO appointments (id, patient_id, doctor_id, date, time, status) "
+                    "VALUES (%s, %s, %s, %s, %s, %s)",
+                    (str(uuid.uuid4()), PATIENT_IDS[patient], DOCTOR_ID, date_str, time_str, status)
+                )
+
+    @classmethod
+    def tearDownClass(cls):
+        with cls.psycopg.connect(os.environ['DATABASE_URL'], autocommit=True) as conn:
+            conn.execute(f"DROP SCHEMA {cls.schema} CASCADE")
+        super().tearDownClass()
+
+    def setUp(self):
+        with override_settings(DATA_STORE={'DATABASE_URL': self.url, 'POOL_MAX_SIZE': 2}):
+            self.store = PostgresDataStore()
+        self.addCleanup(self.store.close)
+
+    def _all_pages(self, user_id, is_doctor, limit, **filters):
+        pages = []
+        after = None
+        while True:
+            page = self.store.filtered_appointments(
+                "id, date, time, status", user_id, is_doctor, limit, after=after, **filters
+            )
+            if not page:
+                return pages
+            pages.append(page)
+            last = page[-1]
+            after = (last["date"], last["time"], last["id"])
+
+    def _keys(self, rows):
+        return [(row["date"], row["time"], row["id"]) for row in rows]
+
+    def test_pages_cover_every_appointment_once_in_order(self):
+        everything = self.store.filtered_appointments("id, date, time, status", DOCTOR_ID, True, 100)
+        pages = self._all_pages(DOCTOR_ID, True, 3)
+
+        rows = [row for page in pages for row in page]
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(self._keys(rows), self._keys(everything))
+        self.assertEqual(self._keys(rows), sorted(self._keys(rows)))
+        self.assertEqual(len({row["id"] for row in rows}), len(APPOINTMENTS))
+
+    def test_page_boundary_inside_a_time_slot(self):
+        first = self.store.filtered_appointments("id, date, time", DOCTOR_ID, True, 2)
+        last = first[-1]
+
+        second = self.store.filtered_appointments(
+            "id, date, time", DOCTOR_ID, True, 2, after=(last["date"], last["time"], last["id"])
+        )
+
+        # The third 09:00 appointment on the first day opens the next page
+        self.assertEqual((second[0]["date"], second[0]["time"]), ("2026-03-02", "09:00:00"))
+        self.assertGreater(second[0]["id"], last["id"])
+
+    def test_doctor_pages_embed_the_patient(self):
+        row = self.store.filtered_appointments("id", DOCTOR_ID, True, 1)[0]
+        self.assertEqual(set(row["patient"]), {"full_name", "phone"})
+
+    def test_patient_pages_respect_filters(self):
+        pages = self._all_pages(PATIENT_IDS[0], False, 1, status="scheduled", start_date="2026-03-02")
+
+        rows = [page[0] for page in pages]
+        self.assertEqual([row["date"] for row in rows], ["2026-03-02", "2026-03-03", "2026-03-04"])
+        self.assertTrue(all(row["doctor"] == {"full_name": "Dr. Who"} for row in rows))
+
+    def test_day_is_split_into_shards(self):
+        everything = self.store.appointments_on_date("2026-03-02")
+        shards = [self.store.appointments_on_date("2026-03-02", shard=shard, shard_count=3) for shard in range(3)]
+
+        self.assertEqual(
+            sorted(row["id"] for rows in shards for row in rows),
+            sorted(row["id"] for row in everything)
+        )
+        for shard, rows in enumerate(shards):
+            # The SQL and Python shard functions agree
+            self.assertTrue(all(appointment_shard(row["id"], 3) == shard for row in rows))
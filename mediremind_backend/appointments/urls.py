@@ -1,7 +1,8 @@
 from django.urls import path
+from . import views
 
 app_name = 'appointments'
 
 urlpatterns = [
-    # Add appointment URLs here
-] 
\ No newline at end of file
+    path('available-slots/', views.available_slots, name='available_slots'),
+]
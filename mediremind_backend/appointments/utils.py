@@ -1,6 +1,18 @@
-from datetime import datetime, time
-from supabase_client import admin_client
+from datetime import date, datetime, time
+from uuid import UUID
+from data_store import data_store
+from django.core.serializers.json import DjangoJSONEncoder
 from django.http import JsonResponse
+import base64
+import json
+from .availability import availability_index, WORKING_START, WORKING_END
+
+# Fields returned by appointment listings
+APPOINTMENT_LIST_FIELDS = "id, date, time, type, status, location_text, notes, patient_id, doctor_id"
+
+# Page sizes for appointment listings
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
 
 def validate_appointment_datetime(date_str, time_str):
     """Validate appointment date and time"""
@@ -17,31 +29,39 @@ def validate_appointment_datetime(date_str, time_str):
             return False, "Appointment must be in the future"
             
         # Check if within working hours (8 AM to 6 PM)
-        working_start = time(8, 0)
-        working_end = time(18, 0)
-        
-        if appointment_time < working_start or appointment_time > working_end:
+        if appointment_time < WORKING_START or appointment_time > WORKING_END:
             return False, "Appointments must be between 8 AM and 6 PM"
             
         return True, None
     except ValueError as e:
         return False, f"Invalid date/time format: {str(e)}"
 
+def check_slot_availability(doctor_id, patient_id, date_str, time_str, exclude_appointment_id=None):
+    """Check doctor and patient availability together in one query
+
+    Returns (valid, error_message, party) where party is 'doctor' or
+    'patient' when that side has an overlapping appointment.
+    """
+    try:
+        valid, party = availability_index.check_booking(
+            doctor_id, patient_id, date_str, time_str, exclude_appointment_id=exclude_appointment_id
+        )
+        if valid:
+            return True, None, None
+
+        if party == "doctor":
+            return False, "Doctor is already booked at this time", party
+        return False, "Patient already has an appointment at this time", party
+    except Exception as e:
+        return False, f"Error checking availability: {str(e)}", None
+
 def check_doctor_availability(doctor_id, date_str, time_str, exclude_appointment_id=None):
     """Check if doctor is available at the given time"""
     try:
-        query = admin_client.table("appointments").select("id").eq("doctor_id", doctor_id).eq("date", date_str).eq("time", time_str)
-        
-        # Exclude current appointment if updating
-        if exclude_appointment_id:
-            query = query.neq("id", exclude_appointment_id)
-            
-        # Only check non-cancelled appointments
-        query = query.not_.eq("status", "cancelled")
-        
-        result = query.execute()
-        
-        if result.data:
+        valid, _ = availability_index.check_booking(
+            doctor_id, None, date_str, time_str, exclude_appointment_id=exclude_appointment_id
+        )
+        if not valid:
             return False, "Doctor is already booked at this time"
             
         return True, None
@@ -51,18 +71,10 @@ def check_doctor_availability(doctor_id, date_str, time_str, exclude_appointment
 def check_patient_availability(patient_id, date_str, time_str, exclude_appointment_id=None):
     """Check if patient has any conflicting appointments"""
     try:
-        query = admin_client.table("appointments").select("id").eq("patient_id", patient_id).eq("date", date_str).eq("time", time_str)
-        
-        # Exclude current appointment if updating
-        if exclude_appointment_id:
-            query = query.neq("id", exclude_appointment_id)
-            
-        # Only check non-cancelled appointments
-        query = query.not_.eq("status", "cancelled")
-        
-        result = query.execute()
-        
-        if result.data:
+        valid, _ = availability_index.check_booking(
+            None, patient_id, date_str, time_str, exclude_appointment_id=exclude_appointment_id
+        )
+        if not valid:
             return False, "Patient already has an appointment at this time"
             
         return True, None
@@ -98,46 +110,57 @@ def validate_appointment_status(status_str, is_doctor=False):
         
     return True, None
 
-def get_filtered_appointments(user_id, is_doctor=False, **filters):
-    """Get filtered appointments for a user"""
+def encode_cursor(appointment):
+    """Encode an appointment's (date, time, id) sort key as an opaque cursor"""
+    key = [appointment["date"], appointment["time"], appointment["id"]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode a cursor from encode_cursor into a (date, time, id) tuple
+
+    Raises ValueError for malformed cursors. Each part is parsed, so only
+    a real date, time and UUID ever reach the keyset filter.
+    """
     try:
-        # Base query
-        query = admin_client.table("appointments").select(
-            "*",
-            "patient:patient_id(*)" if is_doctor else "doctor:doctor_id(*)"
+        key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        date_str, time_str, appointment_id = key
+        return (
+            date.fromisoformat(date_str).isoformat(),
+            time.fromisoformat(time_str).isoformat(),
+            str(UUID(appointment_id))
         )
-        
-        # Add user filter
-        if is_doctor:
-            query = query.eq("doctor_id", user_id)
-        else:
-            query = query.eq("patient_id", user_id)
-            
-        # Apply status filter
-        if filters.get('status'):
-            query = query.eq("status", filters['status'])
-            
-        # Apply date range filter
-        if filters.get('start_date'):
-            query = query.gte("date", filters['start_date'])
-        if filters.get('end_date'):
-            query = query.lte("date", filters['end_date'])
-            
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def parse_page_limit(value):
+    """Parse a ?limit= value, clamped to MAX_PAGE_SIZE. Raises ValueError."""
+    if value in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(value), MAX_PAGE_SIZE))
+
+def get_filtered_appointments(user_id, is_doctor=False, limit=DEFAULT_PAGE_SIZE, after=None, **filters):
+    """Get one page of filtered appointments for a user
+
+    Pages are ordered by (date, time, id) and continue after the `after`
+    key from decode_cursor. Only the fields the app displays are selected.
+    Returns (success, appointments or error message, next_cursor).
+    """
+    try:
         # Apply upcoming/past filter
         today = datetime.now().strftime('%Y-%m-%d')
         if filters.get('type') == 'upcoming':
-            query = query.gte("date", today)
+            filters['min_date'] = today
         elif filters.get('type') == 'past':
-            query = query.lt("date", today)
-            
-        # Apply sorting
-        query = query.order("date").order("time")
-        
-        result = query.execute()
+            filters['before_date'] = today
+
+        # Fetch one extra row to know whether another page exists
+        rows = data_store.filtered_appointments(
+            APPOINTMENT_LIST_FIELDS, user_id, is_doctor, limit + 1, after=after, **filters
+        )
         
         # Format the response
         appointments = []
-        for apt in result.data:
+        for apt in rows[:limit]:
             if is_doctor:
                 patient_info = apt.pop("patient", {})
                 apt["patient_name"] = patient_info.get("full_name") if patient_info else None
@@ -147,7 +170,39 @@ def get_filtered_appointments(user_id, is_doctor=False, **filters):
                 apt["doctor_name"] = doctor_info.get("full_name") if doctor_info else None
                 
             appointments.append(apt)
-            
-        return True, appointments
+
+        next_cursor = encode_cursor(appointments[-1]) if len(rows) > limit else None
+        return True, appointments, next_cursor
+    except Exception as e:
+        return False, f"Error fetching appointments: {str(e)}", None
+
+def iter_filtered_appointments(user_id, is_doctor=False, page_size=MAX_PAGE_SIZE, **filters):
+    """Yield every matching appointment, fetching one keyset page at a time
+
+    Raises RuntimeError if a page fails to load.
+    """
+    after = None
+    while True:
+        success, appointments, next_cursor = get_filtered_appointments(
+            user_id, is_doctor=is_doctor, limit=page_size, after=after, **filters
+        )
+        if not success:
+            raise RuntimeError(appointments)
+
+        yield from appointments
+
+        if not next_cursor:
+            return
+        after = decode_cursor(next_cursor)
+
+def stream_appointments_json(user_id, is_doctor=False, **filters):
+    """Stream the full appointment list as a JSON document, page by page"""
+    yield '{"message": "Appointments retrieved successfully", "appointments": ['
+    try:
+        for index, apt in enumerate(iter_filtered_appointments(user_id, is_doctor=is_doctor, **filters)):
+            yield (',' if index else '') + json.dumps(apt, cls=DjangoJSONEncoder)
+        yield ']}'
     except Exception as e:
-        return False, f"Error fetching appointments: {str(e)}" 
\ No newline at end of file
+        # Headers are already sent, so report the failure inside the document
+        print(f"Error streaming appointments: {str(e)}")
+        yield '], "error": "Failed to retrieve all appointments"}'
@@ -1,3 +1,85 @@
-from django.shortcuts import render
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from datetime import datetime, timedelta
+from authapp.decorators import auth_required
+from .availability import find_free_slots
 
-# Create your views here.
+# Keep a single free-slot search bounded
+MAX_SLOT_SEARCH_DOCTORS = 50
+MAX_SLOT_SEARCH_DAYS = 31
+
+@csrf_exempt
+@auth_required
+def available_slots(request):
+    """Endpoint to list open appointment slots for one or more doctors over a date range"""
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    # Accept ?doctor_id=a&doctor_id=b as well as ?doctor_ids=a,b
+    doctor_ids = request.GET.getlist('doctor_id')
+    if request.GET.get('doctor_ids'):
+        doctor_ids += request.GET['doctor_ids'].split(',')
+    doctor_ids = list(dict.fromkeys(doctor_id.strip() for doctor_id in doctor_ids if doctor_id.strip()))
+
+    if not doctor_ids:
+        return JsonResponse({
+            "error": "Missing doctor IDs",
+            "details": "Please provide doctor_id or doctor_ids"
+        }, status=400)
+
+    if len(doctor_ids) > MAX_SLOT_SEARCH_DOCTORS:
+        return JsonResponse({
+            "error": "Too many doctors",
+            "details": f"At most {MAX_SLOT_SEARCH_DOCTORS} doctors can be searched at once"
+        }, status=400)
+
+    try:
+        start_date = datetime.strptime(
+            request.GET.get('start_date') or datetime.now().strftime('%Y-%m-%d'), '%Y-%m-%d'
+        ).date()
+        end_date = datetime.strptime(
+            request.GET.get('end_date') or (start_date + timedelta(days=6)).strftime('%Y-%m-%d'), '%Y-%m-%d'
+        ).date()
+        slot_minutes = int(request.GET['slot_minutes']) if request.GET.get('slot_minutes') else None
+    except ValueError as e:
+        return JsonResponse({
+            "error": "Invalid parameters",
+            "details": str(e)
+        }, status=400)
+
+    if end_date < start_date:
+        return JsonResponse({
+            "error": "Invalid date range",
+            "details": "end_date must not be before start_date"
+        }, status=400)
+
+    if (end_date - start_date).days + 1 > MAX_SLOT_SEARCH_DAYS:
+        return JsonResponse({
+            "error": "Date range too long",
+            "details": f"At most {MAX_SLOT_SEARCH_DAYS} days can be searched at once"
+        }, status=400)
+
+    if slot_minutes is not None and not 5 <= slot_minutes <= 240:
+        return JsonResponse({
+            "error": "Invalid slot length",
+            "details": "slot_minutes must be between 5 and 240"
+        }, status=400)
+
+    try:
+        slots = find_free_slots(
+            doctor_ids, start_date.isoformat(), end_date.isoformat(), slot_minutes=slot_minutes
+        )
+
+        return JsonResponse({
+            "message": "Available slots retrieved successfully",
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "slots": slots
+        }, status=200)
+
+    except Exception as e:
+        print(f"Available slots error: {str(e)}")
+        return JsonResponse({
+            "error": "Failed to retrieve available slots",
+            "details": str(e)
+        }, status=500)
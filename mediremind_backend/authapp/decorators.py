@@ -0,0 +1,43 @@
+from functools import wraps
+from django.http import JsonResponse
+from .middleware import authenticate_request
+
+def auth_required(view=None, verify_remote=False):
+    """Require a valid bearer token; the user is available as request.app_user"""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            user, error_response = authenticate_request(request, verify_remote=verify_remote)
+            if error_response:
+                return error_response
+            return view_func(request, *args, **kwargs)
+        return wrapper
+
+    if view is not None:
+        return decorator(view)
+    return decorator
+
+def role_required(roles, message, verify_remote=False):
+    """Require a valid bearer token for a user whose profile role is in `roles`"""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            user, error_response = authenticate_request(request, verify_remote=verify_remote)
+            if error_response:
+                return error_response
+
+            # Claims carry the role, so only remotely verified users need their profile here
+            if user.role is None and not user.profile:
+                print(f"No profile found for user {user.id}")
+                return JsonResponse({"error": "User profile not found"}, status=404)
+
+            if user.role not in roles:
+                print(f"Invalid role for user {user.id}: {user.role}")
+                return JsonResponse({
+                    "error": message,
+                    "details": f"User role '{user.role}' is not authorized"
+                }, status=403)
+
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
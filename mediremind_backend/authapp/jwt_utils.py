@@ -0,0 +1,36 @@
+import jwt
+
+InvalidTokenError = jwt.InvalidTokenError
+
+class UnsupportedTokenError(InvalidTokenError):
+    """Raised for tokens signed with an algorithm other than HS256, e.g. asymmetric signing keys"""
+
+def decode_unverified_claims(token):
+    """Read the claims of a JWT without checking its signature
+
+    Only use this for hints such as the expiry time; never trust the
+    result for authentication.
+    """
+    try:
+        return jwt.decode(token, options={"verify_signature": False})
+    except InvalidTokenError:
+        return {}
+
+def verify_jwt(token, secret, audience=None, leeway=0):
+    """Verify an HS256 JWT's signature, expiry and audience and return its claims
+
+    Raises UnsupportedTokenError for other algorithms and InvalidTokenError
+    for anything else wrong with the token.
+    """
+    algorithm = jwt.get_unverified_header(token).get('alg')
+    if algorithm != 'HS256':
+        raise UnsupportedTokenError(f"Unsupported signing algorithm: {algorithm}")
+
+    return jwt.decode(
+        token,
+        secret,
+        algorithms=["HS256"],
+        audience=audience,
+        leeway=leeway,
+        options={"require": ["exp"], "verify_aud": audience is not None}
+    )
@@ -1,3 +1,96 @@
-from django.test import TestCase
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+import base64
+import json
+import jwt
+import time
+from providers import providers
+from .utils import get_authenticated_user
 
-# Create your tests here.
+SECRET = "test-jwt-secret-at-least-32-bytes-long"
+USER_ID = "00000000-0000-0000-0000-000000000001"
+
+def mint(secret=SECRET, **overrides):
+    """A locally minted access token shaped like Supabase's"""
+    claims = {
+        "sub": USER_ID,
+        "email": "doctor@example.com",
+        "aud": "authenticated",
+        "role": "authenticated",
+        "app_metadata": {"role": "doctor"},
+        "exp": int(time.time()) + 3600
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, secret, algorithm="HS256")
+
+@override_settings(
+    AUTH_LOCAL_JWT_VERIFICATION=True,
+    SUPABASE_JWT_SECRET=SECRET,
+    SUPABASE_JWT_AUDIENCE="authenticated"
+)
+class LocalJWTVerificationTests(SimpleTestCase):
+    def setUp(self):
+        self.supabase = self.enterContext(providers.override('supabase', mock.Mock()))
+        self.data_store = self.enterContext(providers.override('data_store', mock.Mock()))
+        self.data_store.get_user.return_value = {"id": USER_ID, "role": "doctor", "email": "doctor@example.com"}
+
+    def test_valid_token_uses_claims_without_round_trips(self):
+        user = get_authenticated_user(mint(jti="valid"))
+
+        self.assertEqual(user.id, USER_ID)
+        self.assertEqual(user.role, "doctor")
+        self.supabase.auth.get_user.assert_not_called()
+        self.data_store.get_user.assert_not_called()
+
+    def test_profile_is_loaded_on_first_use(self):
+        user = get_authenticated_user(mint(jti="profile"))
+
+        self.assertEqual(user.profile["email"], "doctor@example.com")
+        self.data_store.get_user.assert_called_once_with(USER_ID)
+
+    def test_user_role_claim_takes_precedence(self):
+        user = get_authenticated_user(mint(jti="user-role", user_role="patient"))
+        self.assertEqual(user.role, "patient")
+
+    def test_expired_token_is_rejected(self):
+        self.assertIsNone(get_authenticated_user(mint(exp=int(time.time()) - 10)))
+        self.supabase.auth.get_user.assert_not_called()
+
+    def test_bad_signature_is_rejected(self):
+        self.assertIsNone(get_authenticated_user(mint(secret="some-other-secret-at-least-32-bytes")))
+        self.supabase.auth.get_user.assert_not_called()
+
+    def test_wrong_audience_is_rejected(self):
+        self.assertIsNone(get_authenticated_user(mint(aud="anon")))
+        self.supabase.auth.get_user.assert_not_called()
+
+    def test_malformed_tokens_are_rejected(self):
+        # Correctly signed, but the payload is not a JSON object
+        list_payload = jwt.api_jws.encode(json.dumps(["not", "a", "dict"]).encode(), SECRET, algorithm="HS256")
+        for token in ("not-a-jwt", list_payload, "é.é.é"):
+            with self.subTest(token=token):
+                self.assertIsNone(get_authenticated_user(token))
+        self.supabase.auth.get_user.assert_not_called()
+
+    def test_token_without_exp_is_rejected(self):
+        claims = jwt.decode(mint(jti="no-exp"), SECRET, algorithms=["HS256"], audience="authenticated")
+        del claims["exp"]
+        self.assertIsNone(get_authenticated_user(jwt.encode(claims, SECRET, algorithm="HS256")))
+
+    def _expect_remote_check(self, token):
+        self.supabase.auth.get_user.return_value = mock.Mock(
+            user=mock.Mock(id=USER_ID, email="doctor@example.com")
+        )
+        user = get_authenticated_user(token)
+
+        self.supabase.auth.get_user.assert_called_once_with(token)
+        self.assertEqual(user.role, "doctor")
+        self.assertIsNone(user.claims)
+
+    def test_asymmetric_token_falls_back_to_remote_check(self):
+        header = base64.urlsafe_b64encode(json.dumps({"alg": "ES256"}).encode()).rstrip(b'=').decode()
+        token = ".".join([header] + mint(jti="es256").split(".")[1:])
+        self._expect_remote_check(token)
+
+    def test_missing_role_claim_falls_back_to_remote_check(self):
+        self._expect_remote_check(mint(jti="no-role", app_metadata={}))
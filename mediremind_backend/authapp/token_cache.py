@@ -0,0 +1,139 @@
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from .jwt_utils import decode_unverified_claims
+import hashlib
+import threading
+import time
+
+DEFAULT_TOKEN_CACHE_SETTINGS = {
+    'BACKEND': 'local',
+    'TTL': 300,
+    'MAX_ENTRIES': 10000
+}
+
+class LocalCacheBackend:
+    """In-process LRU backend"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (value, time.time() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+class DjangoCacheBackend:
+    """Shared backend on top of one of the Django CACHES (e.g. Redis or Memcached)"""
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, timeout):
+        self.cache.set(key, value, timeout=timeout)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+class TokenCache:
+    """Cache of verified access tokens, keyed by a hash of the token
+
+    Entries expire at the token's `exp` claim or after the TTL, whichever
+    comes first. A user's entries can be dropped together with
+    invalidate_user, e.g. after a profile update.
+    """
+
+    key_prefix = "authapp:token:"
+    invalidated_prefix = "authapp:user-invalidated:"
+
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+
+    def _key(self, token):
+        return self.key_prefix + hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def get(self, token):
+        """Return the cached user for a token, or None"""
+        if not token:
+            return None
+
+        entry = self.backend.get(self._key(token))
+        if not entry:
+            return None
+
+        user, cached_at, expires_at = entry
+        if expires_at <= time.time():
+            self.backend.delete(self._key(token))
+            return None
+
+        invalidated_at = self.backend.get(self.invalidated_prefix + str(user.id))
+        if invalidated_at and cached_at <= invalidated_at:
+            self.backend.delete(self._key(token))
+            return None
+
+        return user
+
+    def set(self, token, user):
+        """Cache a verified user until the token expires or the TTL runs out"""
+        now = time.time()
+        expires_at = now + self.ttl
+
+        exp = decode_unverified_claims(token).get('exp')
+        if isinstance(exp, (int, float)):
+            expires_at = min(expires_at, exp)
+
+        if expires_at <= now:
+            return
+
+        self.backend.set(self._key(token), (user, now, expires_at), timeout=expires_at - now)
+
+    def invalidate_token(self, token):
+        """Drop a single token, e.g. on logout"""
+        if token:
+            self.backend.delete(self._key(token))
+
+    def invalidate_user(self, user_id):
+        """Drop every cached token for a user"""
+        if user_id:
+            # Anything cached before this marker is stale; entries never outlive the TTL
+            self.backend.set(self.invalidated_prefix + str(user_id), time.time(), timeout=self.ttl)
+
+def create_token_cache():
+    """Build the token cache from settings.AUTH_TOKEN_CACHE"""
+    config = {**DEFAULT_TOKEN_CACHE_SETTINGS, **getattr(settings, 'AUTH_TOKEN_CACHE', {})}
+
+    if config['BACKEND'] == 'local':
+        backend = LocalCacheBackend(config['MAX_ENTRIES'])
+    else:
+        backend = DjangoCacheBackend(config['BACKEND'])
+
+    return TokenCache(backend, config['TTL'])
+
+# Create a singleton instance
+token_cache = create_token_cache()
+
+__all__ = ['token_cache']
@@ -1,19 +1,114 @@
+from django.conf import settings
 from supabase_client import supabase, admin_client
+from data_store import data_store
+from .token_cache import token_cache
+from .jwt_utils import verify_jwt, InvalidTokenError, UnsupportedTokenError
 
 class AuthenticatedUser:
-    """Class to represent an authenticated user with their profile data"""
-    def __init__(self, auth_user, profile_data):
+    """Class to represent an authenticated user with their profile data
+
+    Users verified from JWT claims start without a profile; the users row
+    is loaded the first time profile is read, so requests that only need
+    the id and role never touch the database.
+    """
+    __slots__ = ('id', 'email', '_profile', 'claims')
+
+    def __init__(self, auth_user, profile_data, claims=None):
         self.id = auth_user.id
         self.email = auth_user.email
-        self.profile = profile_data
+        self._profile = profile_data
+        self.claims = claims  # Set when the token was verified locally
+
+    @property
+    def profile(self):
+        if self._profile is None:
+            self._profile = data_store.get_user(self.id) or {}
+        return self._profile
+
+    @property
+    def role(self):
+        if self.claims:
+            return claims_role(self.claims)
+        return self.profile.get('role') if self.profile else None
+
+class ClaimsUser:
+    """Auth user built from locally verified JWT claims instead of auth.get_user"""
+    def __init__(self, claims):
+        self.id = claims.get('sub')
+        self.email = claims.get('email')
+
+def claims_role(claims):
+    """The app role in a Supabase access token
+
+    Set by a custom access token hook as user_role, or in app_metadata.
+    The top-level role claim is the Postgres role ('authenticated'), not ours.
+    """
+    return claims.get('user_role') or (claims.get('app_metadata') or {}).get('role')
+
+def verify_token_locally(access_token):
+    """Verify a Supabase access token in-process
+
+    Returns (claims, None) on success, (None, None) when the remote check
+    should be used instead, or (None, error) when the token is invalid.
+    """
+    if not getattr(settings, 'AUTH_LOCAL_JWT_VERIFICATION', False):
+        return None, None
+
+    secret = getattr(settings, 'SUPABASE_JWT_SECRET', None)
+    if not secret:
+        print("Local JWT verification enabled but SUPABASE_JWT_SECRET is not set")
+        return None, None
+
+    try:
+        claims = verify_jwt(
+            access_token,
+            secret,
+            audience=getattr(settings, 'SUPABASE_JWT_AUDIENCE', None),
+            leeway=getattr(settings, 'SUPABASE_JWT_LEEWAY', 0)
+        )
+    except UnsupportedTokenError:
+        # Asymmetric signing keys can't be checked with the shared secret
+        return None, None
+    except InvalidTokenError as e:
+        return None, str(e)
+
+    # Fall back to the remote check if the claims we rely on are missing
+    if not claims.get('sub') or not claims_role(claims):
+        return None, None
+
+    return claims, None
 
-def get_authenticated_user(access_token):
-    """Get authenticated user from Supabase token"""
+def get_authenticated_user(access_token, verify_remote=False):
+    """Get authenticated user from Supabase token
+
+    Verified tokens are cached (see authapp.token_cache), so repeat requests
+    with the same token skip both Supabase round trips. With
+    AUTH_LOCAL_JWT_VERIFICATION on, the token is verified in-process instead
+    of with auth.get_user; pass verify_remote=True for operations that must
+    notice a revoked session.
+    """
     if not access_token:
         print("No access token provided")
         return None
+
+    if not verify_remote:
+        cached_user = token_cache.get(access_token)
+        if cached_user:
+            return cached_user
         
     try:
+        claims, error = (None, None) if verify_remote else verify_token_locally(access_token)
+        if error:
+            print(f"Local token verification failed: {error}")
+            return None
+
+        if claims:
+            # The id and role come from the verified claims; the profile loads on first use
+            auth_user = AuthenticatedUser(ClaimsUser(claims), None, claims=claims)
+            token_cache.set(access_token, auth_user)
+            print(f"Successfully authenticated user from token claims: {auth_user.id} with role: {auth_user.role}")
+            return auth_user
+
         # Get user data from auth
         print(f"Attempting to get user data with token: {access_token[:10]}...")
         response = supabase.auth.get_user(access_token)
@@ -26,21 +121,24 @@ def get_authenticated_user(access_token):
             print("No user in auth response")
             return None
             
-        if not response.user.id:
+        user = response.user
+
+        if not user.id:
             print("No user ID in auth response")
             return None
 
         # Get full user data from database
-        print(f"Getting user data from database for ID: {response.user.id}")
-        user_data = admin_client.table("users").select("*").eq("id", response.user.id).single().execute()
+        print(f"Getting user data from database for ID: {user.id}")
+        user_data = data_store.get_user(user.id)
         
-        if not user_data.data:
-            print(f"No user data found in database for ID: {response.user.id}")
+        if not user_data:
+            print(f"No user data found in database for ID: {user.id}")
             return None
 
         # Create authenticated user instance with profile data
-        auth_user = AuthenticatedUser(response.user, user_data.data)
-        print(f"Successfully authenticated user: {auth_user.id} with role: {auth_user.profile.get('role')}")
+        auth_user = AuthenticatedUser(user, user_data)
+        token_cache.set(access_token, auth_user)
+        print(f"Successfully authenticated user: {auth_user.id} with role: {auth_user.role}")
         return auth_user
 
     except Exception as e:
@@ -54,11 +152,11 @@ def get_user_by_id(user_id):
         return None
         
     try:
-        response = admin_client.table("users").select("*").eq("id", user_id).single().execute()
-        if not response.data:
+        user_data = data_store.get_user(user_id)
+        if not user_data:
             print(f"No user found for ID: {user_id}")
             return None
-        return response.data
+        return user_data
     except Exception as e:
         print(f"Database error in get_user_by_id: {str(e)}")
         return None
@@ -2,6 +2,10 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
 from supabase_client import supabase, admin_client  # import both clients
+from data_store import data_store
+from .token_cache import token_cache
+from .decorators import auth_required
+from staff_profiles.directory import doctor_directory
 
 @csrf_exempt
 def register_user(request):
@@ -52,6 +56,7 @@ def register_user(request):
             else:
                 profile_data["position"] = role  # e.g., 'doctor', 'admin'
                 admin_client.table("staff_profiles").insert(profile_data).execute()
+                doctor_directory.invalidate()
 
             return JsonResponse({"message": "Registration successful"}, status=201)
 
@@ -130,8 +135,9 @@ def logout_user(request):
             # Extract the token
             token = auth_header.split(' ')[1]
 
-            # Sign out the user
+            # Sign out the user and forget the cached token
             supabase.auth.sign_out()
+            token_cache.invalidate_token(token)
             return JsonResponse({"message": "Logged out successfully"}, status=200)
 
         except Exception as e:
@@ -140,44 +146,30 @@ def logout_user(request):
     return JsonResponse({"error": "Method not allowed"}, status=405)
 
 @csrf_exempt
+@auth_required
 def whoami(request):
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return JsonResponse({"error": "Missing or invalid Authorization header"}, status=401)
-
-    token = auth_header.split(" ")[1]
+    user = request.app_user
 
     try:
-        # Get user data from auth
-        user_data = supabase.auth.get_user(token)
-        if not user_data or not user_data.user or not user_data.user.id:
-            return JsonResponse({"error": "Invalid or expired token"}, status=401)
-
-        user_id = user_data.user.id
-
-        # First get user role from users table
-        user_result = admin_client.table("users").select("role").eq("id", user_id).execute()
-        if not user_result.data:
-            return JsonResponse({"error": "User not found"}, status=404)
-
-        role = user_result.data[0]['role']
+        user_id = user.id
+        role = user.role
 
         # Get profile based on role
         if role == "patient":
-            profile_res = admin_client.table("patients").select("*").eq("user_id", user_id).execute()
-            if profile_res.data:
+            profile = data_store.get_profile("patients", user_id)
+            if profile:
                 return JsonResponse({
                     "role": "patient",
                     "user_id": user_id,
-                    "profile": profile_res.data[0]
+                    "profile": profile
                 })
         else:
-            profile_res = admin_client.table("staff_profiles").select("*").eq("user_id", user_id).execute()
-            if profile_res.data:
+            profile = data_store.get_profile("staff_profiles", user_id)
+            if profile:
                 return JsonResponse({
                     "role": role,
                     "user_id": user_id,
-                    "profile": profile_res.data[0]
+                    "profile": profile
                 })
 
         return JsonResponse({"error": "User profile not found"}, status=404)
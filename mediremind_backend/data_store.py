@@ -0,0 +1,391 @@
+# data_store.py
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from uuid import UUID
+from django.conf import settings
+from identity_map import current_identity_map
+from providers import providers
+from query_metrics import query_metrics
+from supabase_client import admin_client
+import time
+
+DEFAULT_DATA_STORE_SETTINGS = {
+    'BACKEND': 'supabase',
+    'DATABASE_URL': None,
+    'POOL_MIN_SIZE': 1,
+    'POOL_MAX_SIZE': 10,
+    'POOL_TIMEOUT': 5
+}
+
+# Profile tables, keyed by user_id
+PROFILE_TABLES = ('patients', 'staff_profiles')
+
+# Page size for bulk range queries over PostgREST
+RANGE_PAGE_SIZE = 1000
+
+# Contact details embedded in appointments loaded for notifications
+PARTY_COLUMNS = (
+    "patient:patient_id(user_id, full_name, phone, email)",
+    "doctor:doctor_id(user_id, full_name, email)"
+)
+
+def get_data_store_settings():
+    return {**DEFAULT_DATA_STORE_SETTINGS, **getattr(settings, 'DATA_STORE', {})}
+
+def _check_profile_table(table):
+    if table not in PROFILE_TABLES:
+        raise ValueError(f"Unknown profile table: {table}")
+
+class SupabaseDataStore:
+    """Hot read paths served through PostgREST with the admin client"""
+
+    def get_user(self, user_id):
+        result = admin_client.table("users").select("*").eq("id", user_id).execute()
+        return result.data[0] if result.data else None
+
+    def get_profile(self, table, user_id):
+        _check_profile_table(table)
+        result = admin_client.table(table).select("*").eq("user_id", user_id).execute()
+        return result.data[0] if result.data else None
+
+    def get_appointment(self, appointment_id, patient_id=None, doctor_id=None):
+        """One appointment, optionally only if it belongs to the given patient or doctor"""
+        query = admin_client.table("appointments").select("*").eq("id", appointment_id)
+        if patient_id:
+            query = query.eq("patient_id", patient_id)
+        if doctor_id:
+            query = query.eq("doctor_id", doctor_id)
+        result = query.execute()
+        return result.data[0] if result.data else None
+
+    def appointments_with_parties(self, appointment_ids):
+        """Appointments by ID with 'patient' and 'doctor' contact details embedded"""
+        result = admin_client.table("appointments").select(
+            "*", *PARTY_COLUMNS
+        ).in_("id", [str(appointment_id) for appointment_id in appointment_ids]).execute()
+        return result.data or []
+
+    def appointments_on_date(self, date_str, shard=None, shard_count=1, page_size=RANGE_PAGE_SIZE):
+        """Every appointment on a date with 'patient' and 'doctor' contact details embedded
+
+        With shard set, only the appointments the appointment_shard SQL
+        function puts in that shard are loaded.
+        """
+        appointments = []
+        start = 0
+
+        while True:
+            if shard is None or shard_count <= 1:
+                query = admin_client.table("appointments").select("*", *PARTY_COLUMNS).eq("date", date_str)
+            else:
+                query = admin_client.rpc("appointments_in_shard", {
+                    "run_date": date_str, "shard": shard, "shard_count": shard_count
+                }).select("*", *PARTY_COLUMNS)
+            result = query.order("id").range(start, start + page_size - 1).execute()
+
+            page = result.data or []
+            appointments.extend(page)
+
+            if len(page) < page_size:
+                return appointments
+            start += page_size
+
+    def day_bookings(self, date_str, doctor_id=None, patient_id=None):
+        """Non-cancelled appointments on a day for a doctor and/or patient
+
+        Raises ValueError unless the IDs are UUIDs, as they go into an or() filter.
+        """
+        filters = []
+        if doctor_id:
+            filters.append(f"doctor_id.eq.{UUID(str(doctor_id))}")
+        if patient_id:
+            filters.append(f"patient_id.eq.{UUID(str(patient_id))}")
+
+        result = admin_client.table("appointments").select("*").eq("date", date_str).or_(
+            ",".join(filters)
+        ).not_.eq("status", "cancelled").execute()
+        return result.data or []
+
+    def doctor_bookings(self, doctor_ids, start_date, end_date, page_size=RANGE_PAGE_SIZE):
+        """(id, doctor_id, date, time, duration_minutes) of non-cancelled bookings for doctors over a date range"""
+        bookings = []
+        start = 0
+
+        while True:
+            result = admin_client.table("appointments").select(
+                "id, doctor_id, date, time, duration_minutes"
+            ).in_("doctor_id", doctor_ids).gte("date", start_date).lte("date", end_date).not_.eq(
+                "status", "cancelled"
+            ).order("id").range(start, start + page_size - 1).execute()
+
+            page = result.data or []
+            bookings.extend(page)
+
+            if len(page) < page_size:
+                return bookings
+            start += page_size
+
+    def filtered_appointments(self, fields, user_id, is_doctor, limit, after=None, **filters):
+        """Up to limit rows of a user's appointments ordered by (date, time, id)
+
+        Each row embeds 'patient' (full_name, phone) for doctors or 'doctor'
+        (full_name) for patients. filters may hold status, start_date,
+        end_date, and min_date/before_date bounds.
+        """
+        query = admin_client.table("appointments").select(
+            fields,
+            "patient:patient_id(full_name, phone)" if is_doctor else "doctor:doctor_id(full_name)"
+        )
+        query = query.eq("doctor_id" if is_doctor else "patient_id", user_id)
+
+        if filters.get('status'):
+            query = query.eq("status", filters['status'])
+        for bound in ('start_date', 'min_date'):
+            if filters.get(bound):
+                query = query.gte("date", filters[bound])
+        if filters.get('end_date'):
+            query = query.lte("date", filters['end_date'])
+        if filters.get('before_date'):
+            query = query.lt("date", filters['before_date'])
+
+        # Continue after the previous page's last (date, time, id)
+        if after:
+            date_str, time_str, appointment_id = after
+            query = query.or_(
+                f'date.gt."{date_str}",'
+                f'and(date.eq."{date_str}",time.gt."{time_str}"),'
+                f'and(date.eq."{date_str}",time.eq."{time_str}",id.gt."{appointment_id}")'
+            )
+
+        result = query.order("date").order("time").order("id").limit(limit).execute()
+        return result.data or []
+
+def _jsonable(value):
+    """Convert a driver value to what PostgREST would have returned"""
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+# Appointments with the same embedded 'patient' and 'doctor' objects as PARTY_COLUMNS
+PARTIES_SQL = """
+    SELECT a.*,
+        CASE WHEN p.user_id IS NULL THEN NULL ELSE json_build_object(
+            'user_id', p.user_id, 'full_name', p.full_name, 'phone', p.phone, 'email', p.email
+        ) END AS patient,
+        CASE WHEN d.user_id IS NULL THEN NULL ELSE json_build_object(
+            'user_id', d.user_id, 'full_name', d.full_name, 'email', d.email
+        ) END AS doctor
+    FROM appointments a
+    LEFT JOIN patients p ON p.user_id = a.patient_id
+    LEFT JOIN staff_profiles d ON d.user_id = a.doctor_id
+"""
+
+class PostgresDataStore:
+    """Hot read paths served by a pooled, direct Postgres connection
+
+    Statements are prepared on first use on each pooled connection, so
+    repeat lookups skip parsing and planning. Use a session-mode
+    connection string: transaction-mode poolers drop prepared statements.
+    """
+
+    def __init__(self):
+        # Optional dependency, only needed for this backend
+        from psycopg.rows import dict_row
+        from psycopg_pool import ConnectionPool
+
+        config = get_data_store_settings()
+        if not config['DATABASE_URL']:
+            raise ValueError("DATA_STORE['DATABASE_URL'] is required for the postgres data store")
+
+        self.pool = ConnectionPool(
+            config['DATABASE_URL'],
+            min_size=config['POOL_MIN_SIZE'],
+            max_size=config['POOL_MAX_SIZE'],
+            timeout=config['POOL_TIMEOUT'],
+            kwargs={'row_factory': dict_row, 'autocommit': True},
+            open=True
+        )
+
+    def _fetch(self, table, sql, params):
+        """Run a prepared read and return rows as PostgREST-style dicts"""
+        started = time.perf_counter()
+        error = True
+        try:
+            with self.pool.connection() as conn:
+                rows = conn.execute(sql, params, prepare=True).fetchall()
+            error = False
+        finally:
+            query_metrics.observe(table, 'select', time.perf_counter() - started, error)
+        return [{key: _jsonable(value) for key, value in row.items()} for row in rows]
+
+    def _fetch_one(self, table, sql, params):
+        rows = self._fetch(table, sql, params)
+        return rows[0] if rows else None
+
+    def get_user(self, user_id):
+        return self._fetch_one("users", "SELECT * FROM users WHERE id = %s", (user_id,))
+
+    def get_profile(self, table, user_id):
+        _check_profile_table(table)
+        # table is one of PROFILE_TABLES, never user input
+        return self._fetch_one(table, f"SELECT * FROM {table} WHERE user_id = %s LIMIT 1", (user_id,))
+
+    def get_appointment(self, appointment_id, patient_id=None, doctor_id=None):
+        sql = "SELECT * FROM appointments WHERE id = %s"
+        params = [appointment_id]
+        if patient_id:
+            sql += " AND patient_id = %s"
+            params.append(patient_id)
+        if doctor_id:
+            sql += " AND doctor_id = %s"
+            params.append(doctor_id)
+        return self._fetch_one("appointments", sql, params)
+
+    def appointments_with_parties(self, appointment_ids):
+        return self._fetch("appointments", f"{PARTIES_SQL} WHERE a.id = ANY(%s::uuid[])", (
+            [str(appointment_id) for appointment_id in appointment_ids],
+        ))
+
+    def appointments_on_date(self, date_str, shard=None, shard_count=1):
+        if shard is None or shard_count <= 1:
+            return self._fetch("appointments", f"{PARTIES_SQL} WHERE a.date = %s ORDER BY a.id", (date_str,))
+        return self._fetch("appointments", (
+            f"{PARTIES_SQL} WHERE a.date = %s AND appointment_shard(a.id, %s) = %s ORDER BY a.id"
+        ), (date_str, shard_count, shard))
+
+    def day_bookings(self, date_str, doctor_id=None, patient_id=None):
+        parties = []
+        params = [date_str]
+        if doctor_id:
+            parties.append("doctor_id = %s")
+            params.append(doctor_id)
+        if patient_id:
+            parties.append("patient_id = %s")
+            params.append(patient_id)
+        return self._fetch("appointments", (
+            f"SELECT * FROM appointments WHERE date = %s AND ({' OR '.join(parties)}) "
+            "AND status <> 'cancelled'"
+        ), params)
+
+    def doctor_bookings(self, doctor_ids, start_date, end_date):
+        # One statement for the whole range; no paging needed without PostgREST's row cap
+        return self._fetch("appointments", """
+            SELECT id, doctor_id, date, time, duration_minutes FROM appointments
+            WHERE doctor_id = ANY(%s::uuid[]) AND date BETWEEN %s AND %s AND status <> 'cancelled'
+        """, ([str(doctor_id) for doctor_id in doctor_ids], start_date, end_date))
+
+    def filtered_appointments(self, fields, user_id, is_doctor, limit, after=None, **filters):
+        columns = ", ".join(f"a.{field.strip()}" for field in fields.split(","))
+        if is_doctor:
+            party = (
+                "CASE WHEN p.user_id IS NULL THEN NULL "
+                "ELSE json_build_object('full_name', p.full_name, 'phone', p.phone) END AS patient"
+            )
+            join = "LEFT JOIN patients p ON p.user_id = a.patient_id"
+            conditions = ["a.doctor_id = %s"]
+        else:
+            party = (
+                "CASE WHEN d.user_id IS NULL THEN NULL "
+                "ELSE json_build_object('full_name', d.full_name) END AS doctor"
+            )
+            join = "LEFT JOIN staff_profiles d ON d.user_id = a.doctor_id"
+            conditions = ["a.patient_id = %s"]
+        params = [user_id]
+
+        for name, condition in (
+            ('status', "a.status = %s"),
+            ('start_date', "a.date >= %s"),
+            ('min_date', "a.date >= %s"),
+            ('end_date', "a.date <= %s"),
+            ('before_date', "a.date < %s")
+        ):
+            if filters.get(name):
+                conditions.append(condition)
+                params.append(filters[name])
+
+        if after:
+            conditions.append("(a.date, a.time, a.id) > (%s, %s, %s)")
+            params.extend(after)
+
+        params.append(limit)
+        return self._fetch("appointments", (
+            f"SELECT {columns}, {party} FROM appointments a {join} "
+            f"WHERE {' AND '.join(conditions)} ORDER BY a.date, a.time, a.id LIMIT %s"
+        ), params)
+
+    def close(self):
+        self.pool.close()
+
+class IdentityMappedStore:
+    """Serves single-row reads from the request's identity map before the backend
+
+    Users, profiles and appointments are always read whole and remembered
+    for the rest of the request; pass fields to get just the columns needed.
+    Call forget() after writing to a row. Other reads go straight to the
+    backend.
+    """
+
+    def __init__(self, store):
+        self._store = store
+
+    def _read(self, table, pk, fields, load):
+        identity_map = current_identity_map()
+        if identity_map is None:
+            row = load()
+        else:
+            row = identity_map.get(table, pk)
+            if row is None:
+                row = load()
+                if row:
+                    identity_map.add(table, pk, row)
+        if row and fields:
+            return {field: row.get(field) for field in fields}
+        return row
+
+    def get_user(self, user_id, fields=None):
+        return self._read("users", user_id, fields, lambda: self._store.get_user(user_id))
+
+    def get_profile(self, table, user_id, fields=None):
+        _check_profile_table(table)
+        return self._read(table, user_id, fields, lambda: self._store.get_profile(table, user_id))
+
+    def get_appointment(self, appointment_id, patient_id=None, doctor_id=None):
+        appointment = self._read(
+            "appointments", appointment_id, None, lambda: self._store.get_appointment(appointment_id)
+        )
+        if not appointment:
+            return None
+        if patient_id and str(appointment["patient_id"]) != str(patient_id):
+            return None
+        if doctor_id and str(appointment["doctor_id"]) != str(doctor_id):
+            return None
+        return appointment
+
+    def forget(self, table, pk):
+        identity_map = current_identity_map()
+        if identity_map is not None:
+            identity_map.discard(table, pk)
+
+    def __getattr__(self, name):
+        return getattr(self._store, name)
+
+DATA_STORE_BACKENDS = {
+    'supabase': SupabaseDataStore,
+    'postgres': PostgresDataStore
+}
+
+def build_data_store():
+    """Build the data store selected by settings.DATA_STORE['BACKEND']"""
+    backend = get_data_store_settings()['BACKEND']
+    if backend not in DATA_STORE_BACKENDS:
+        raise ValueError(f"Unknown data store backend: {backend}")
+    return IdentityMappedStore(DATA_STORE_BACKENDS[backend]())
+
+# Create a singleton instance, built on first use
+data_store = providers.register('data_store', build_data_store)
+
+__all__ = ['data_store', 'SupabaseDataStore', 'PostgresDataStore', 'IdentityMappedStore', 'PROFILE_TABLES']
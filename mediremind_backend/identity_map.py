@@ -0,0 +1,68 @@
+# identity_map.py
+from contextvars import ContextVar
+import logging
+
+logger = logging.getLogger(__name__)
+
+_current_map = ContextVar('identity_map', default=None)
+
+class IdentityMap:
+    """Rows read while serving one request, keyed by (table, primary key)
+
+    Rows are stored whole, so a later read of a few columns is served from
+    an earlier select("*") of the same row.
+    """
+
+    def __init__(self):
+        self._rows = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, table, pk):
+        """A copy of the row, or None if it was not read yet"""
+        row = self._rows.get((table, str(pk)))
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return dict(row)
+
+    def add(self, table, pk, row):
+        self._rows[(table, str(pk))] = dict(row)
+
+    def discard(self, table, pk):
+        """Forget a row after writing to it"""
+        self._rows.pop((table, str(pk)), None)
+
+def current_identity_map():
+    """The identity map of the request being served, or None outside a request"""
+    return _current_map.get()
+
+class IdentityMapMiddleware:
+    """Give each request a fresh identity map
+
+    Code outside a request (management commands, the outbox worker) has no
+    map and always reads through, so long-running processes never serve
+    stale rows.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        identity_map = IdentityMap()
+        token = _current_map.set(identity_map)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_map.reset(token)
+
+        if identity_map.hits:
+            logger.debug(
+                f"{request.path} served {identity_map.hits} reads from the identity map "
+                f"({identity_map.misses} misses)"
+            )
+        return response
+
+__all__ = ['IdentityMap', 'IdentityMapMiddleware', 'current_identity_map']
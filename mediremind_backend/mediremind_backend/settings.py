@@ -12,9 +12,10 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
-from dotenv import load_dotenv
+from providers import load_environment
 
-load_dotenv()
+# Loads .env once for the whole process; provider clients rely on it too
+load_environment()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -54,11 +55,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'query_metrics.QueryMetricsMiddleware',
+    'identity_map.IdentityMapMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'authapp.middleware.SupabaseAuthMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -137,12 +141,59 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CORS_ALLOW_ALL_ORIGINS = True
 
+# Local JWT verification: check Supabase access tokens' signature, expiry and
+# audience in-process instead of calling auth.get_user on every request. The
+# user id comes from `sub` and the role from `user_role` (custom access token
+# hook) or `app_metadata.role`; tokens without a role, or signed with
+# asymmetric keys, fall back to auth.get_user.
+AUTH_LOCAL_JWT_VERIFICATION = os.getenv('AUTH_LOCAL_JWT_VERIFICATION', 'False').lower() == 'true'
+SUPABASE_JWT_SECRET = os.getenv('SUPABASE_JWT_SECRET')
+SUPABASE_JWT_AUDIENCE = os.getenv('SUPABASE_JWT_AUDIENCE', 'authenticated')
+SUPABASE_JWT_LEEWAY = int(os.getenv('SUPABASE_JWT_LEEWAY', 0))  # seconds of clock skew allowed on exp
+
+# Verified access token cache used by authapp.utils.get_authenticated_user.
+# Entries expire at the token's exp claim or after TTL seconds, whichever is first.
+AUTH_TOKEN_CACHE = {
+    'BACKEND': os.getenv('AUTH_TOKEN_CACHE_BACKEND', 'local'),  # 'local' or the alias of a shared entry in CACHES
+    'TTL': int(os.getenv('AUTH_TOKEN_CACHE_TTL', 300)),
+    'MAX_ENTRIES': int(os.getenv('AUTH_TOKEN_CACHE_MAX_ENTRIES', 10000)),
+}
+
+# Supabase query instrumentation. Metrics are served at /metrics/ in the
+# Prometheus text format to scrapers sending `Authorization: Bearer <token>`.
+# QUERY_METRICS_TOKEN is required: without it /metrics/ returns 404.
+QUERY_METRICS = {
+    'ENABLED': os.getenv('QUERY_METRICS_ENABLED', 'True').lower() == 'true',
+    'QUERY_BUDGET': int(os.getenv('QUERY_BUDGET', 15)),  # queries per request before an N+1 warning is logged
+    'TOKEN': os.getenv('QUERY_METRICS_TOKEN'),
+}
+
+# Data store for hot read paths (users, profiles, appointment lookups and listings).
+# 'supabase' goes through PostgREST; 'postgres' connects directly with a pool and
+# prepared statements. Use a session-mode connection string (port 5432 on Supabase):
+# transaction-mode poolers drop prepared statements between transactions.
+DATA_STORE = {
+    'BACKEND': os.getenv('DATA_STORE_BACKEND', 'supabase'),  # 'supabase' or 'postgres'
+    'DATABASE_URL': os.getenv('DATABASE_URL'),
+    'POOL_MIN_SIZE': int(os.getenv('DATA_STORE_POOL_MIN_SIZE', 1)),
+    'POOL_MAX_SIZE': int(os.getenv('DATA_STORE_POOL_MAX_SIZE', 10)),
+    'POOL_TIMEOUT': float(os.getenv('DATA_STORE_POOL_TIMEOUT', 5)),  # seconds to wait for a free connection
+}
+
+# Appointment availability
+APPOINTMENT_DURATION_MINUTES = int(os.getenv('APPOINTMENT_DURATION_MINUTES', 30))
+AVAILABILITY_INDEX_TTL = int(os.getenv('AVAILABILITY_INDEX_TTL', 60))  # seconds a cached day index stays valid
+
+# Doctor directory served by /staff/doctors/
+DOCTOR_DIRECTORY_TTL = int(os.getenv('DOCTOR_DIRECTORY_TTL', 300))  # seconds before the cached list is rebuilt
+
 # Web Push settings
 WEBPUSH_SETTINGS = {
     "VAPID_PUBLIC_KEY": os.getenv("VAPID_PUBLIC_KEY"),
     "VAPID_PRIVATE_KEY": os.getenv("VAPID_PRIVATE_KEY"),
     "VAPID_ADMIN_EMAIL": os.getenv("VAPID_ADMIN_EMAIL", "admin@mediremind.com")
 }
+PUSH_FANOUT_WORKERS = int(os.getenv('PUSH_FANOUT_WORKERS', 8))  # concurrent deliveries to one user's devices
 
 # Validate VAPID settings
 if not all([WEBPUSH_SETTINGS["VAPID_PUBLIC_KEY"], WEBPUSH_SETTINGS["VAPID_PRIVATE_KEY"]]):
@@ -153,6 +204,64 @@ TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_WHATSAPP_FROM = os.getenv("TWILIO_WHATSAPP_FROM")
 
+# Notification dispatcher settings: worker pool size and timeout (seconds) per channel
+NOTIFICATION_CHANNELS = {
+    'email': {
+        'workers': int(os.getenv('NOTIFY_EMAIL_WORKERS', 4)),
+        'timeout': float(os.getenv('NOTIFY_EMAIL_TIMEOUT', 15)),
+    },
+    'sms': {
+        'workers': int(os.getenv('NOTIFY_SMS_WORKERS', 4)),
+        'timeout': float(os.getenv('NOTIFY_SMS_TIMEOUT', 10)),
+    },
+    'whatsapp': {
+        'workers': int(os.getenv('NOTIFY_WHATSAPP_WORKERS', 4)),
+        'timeout': float(os.getenv('NOTIFY_WHATSAPP_TIMEOUT', 10)),
+    },
+    'push': {
+        'workers': int(os.getenv('NOTIFY_PUSH_WORKERS', 8)),
+        'timeout': float(os.getenv('NOTIFY_PUSH_TIMEOUT', 10)),
+    },
+}
+
+# Async provider clients (notifications.async_clients)
+NOTIFICATION_ASYNC = {
+    'CONCURRENCY': int(os.getenv('NOTIFY_ASYNC_CONCURRENCY', 100)),  # sends in flight at once, all channels
+    'MAX_CONNECTIONS': int(os.getenv('NOTIFY_ASYNC_MAX_CONNECTIONS', 100)),
+    'TIMEOUT': float(os.getenv('NOTIFY_ASYNC_TIMEOUT', 10)),
+}
+
+# Notification outbox settings. The worker (manage.py process_notifications)
+# retries failed jobs with exponential backoff before moving them to 'dead'.
+NOTIFICATION_OUTBOX = {
+    'BACKEND': os.getenv('NOTIFICATION_OUTBOX_BACKEND', 'database'),  # 'database' (local SQLite) or 'supabase'
+    'MAX_ATTEMPTS': int(os.getenv('NOTIFICATION_OUTBOX_MAX_ATTEMPTS', 5)),
+    'BACKOFF_BASE': int(os.getenv('NOTIFICATION_OUTBOX_BACKOFF_BASE', 30)),  # seconds
+    'BACKOFF_MAX': int(os.getenv('NOTIFICATION_OUTBOX_BACKOFF_MAX', 3600)),  # seconds
+    'LEASE_SECONDS': int(os.getenv('NOTIFICATION_OUTBOX_LEASE_SECONDS', 300)),
+}
+
+# Sharded reminder runs (python manage.py send_reminders --shards N)
+REMINDER_SCHEDULER = {
+    'BACKEND': os.getenv('REMINDER_SCHEDULER_BACKEND', 'database'),  # 'database' (local SQLite) or 'supabase' across machines
+    'SHARDS': int(os.getenv('REMINDER_SHARDS', 1)),
+    'LEASE_SECONDS': int(os.getenv('REMINDER_SHARD_LEASE_SECONDS', 900)),
+}
+
+# Ledger of delivered reminders, checked so reruns don't send them twice
+NOTIFICATION_LEDGER = {
+    'BACKEND': os.getenv('NOTIFICATION_LEDGER_BACKEND', 'database'),  # 'database' (local SQLite) or 'supabase'
+    'CHUNK_SIZE': int(os.getenv('NOTIFICATION_LEDGER_CHUNK_SIZE', 500)),  # Appointment IDs per lookup query
+}
+
+# Appointment contexts shared by every notification path (notifications.hydration).
+# Cached contexts are reused for TTL seconds, or until the appointment's updated_at changes.
+NOTIFICATION_HYDRATION = {
+    'TTL': int(os.getenv('NOTIFICATION_HYDRATION_TTL', 30)),  # seconds; 0 disables the cache
+    'MAX_ENTRIES': int(os.getenv('NOTIFICATION_HYDRATION_MAX_ENTRIES', 5000)),
+    'CHUNK_SIZE': int(os.getenv('NOTIFICATION_HYDRATION_CHUNK_SIZE', 200)),  # Appointment IDs per joined query
+}
+
 # Email settings
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
@@ -161,6 +270,14 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'noreply@mediremind.com')
+EMAIL_TIMEOUT = int(os.getenv('EMAIL_TIMEOUT', 15))  # seconds, so a hung SMTP server cannot block a worker
+
+# Pooled SMTP connections used by notifications.email_client
+EMAIL_POOL = {
+    'SIZE': int(os.getenv('EMAIL_POOL_SIZE', 4)),  # open connections at most
+    'MAX_IDLE': int(os.getenv('EMAIL_POOL_MAX_IDLE', 60)),  # seconds before an idle connection is closed
+    'BATCH_SIZE': int(os.getenv('EMAIL_BATCH_SIZE', 100)),  # messages per connection in send_batch
+}
 
 # Validate email settings
 if not all([EMAIL_HOST_USER, EMAIL_HOST_PASSWORD]):
@@ -0,0 +1,152 @@
+from unittest import mock
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from providers import ProviderRegistry
+from query_metrics import Histogram, InstrumentedQuery, QueryMetrics, QueryMetricsMiddleware, metrics
+
+class ProviderRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = ProviderRegistry()
+        self.builds = []
+        self.client = self.registry.register('client', lambda: self.builds.append(1) or "real")
+
+    def test_client_is_built_once_on_first_use(self):
+        self.assertEqual(self.builds, [])
+        self.assertEqual(str(self.client), "real")
+        self.assertEqual(self.client.upper(), "REAL")
+        self.assertEqual(self.builds, [1])
+
+    def test_override_does_not_build_the_client(self):
+        with self.registry.override('client', "fake"):
+            self.assertEqual(str(self.client), "fake")
+            self.assertEqual(self.registry.get('client'), "fake")
+
+        self.assertEqual(self.builds, [])
+        self.assertEqual(str(self.client), "real")
+
+    def test_override_restores_a_built_client(self):
+        str(self.client)
+        with self.registry.override('client', "fake"):
+            self.assertEqual(str(self.client), "fake")
+
+        self.assertEqual(str(self.client), "real")
+        self.assertEqual(self.builds, [1])
+
+    def test_unknown_provider(self):
+        with self.assertRaises(KeyError):
+            with self.registry.override('missing', "fake"):
+                pass
+
+class HistogramTests(SimpleTestCase):
+    def test_buckets_are_cumulative_with_inclusive_bounds(self):
+        histogram = Histogram((0.01, 0.1, 1))
+        for value in (0.003, 0.01, 0.05, 20):
+            histogram.observe(value)
+
+        self.assertEqual(list(histogram.cumulative()), [(0.01, 2), (0.1, 3), (1, 3)])
+        self.assertEqual(histogram.count, 4)
+        self.assertAlmostEqual(histogram.sum, 20.063)
+
+class QueryMetricsRenderTests(SimpleTestCase):
+    def setUp(self):
+        self.metrics = QueryMetrics()
+
+    def test_latency_histogram_lines(self):
+        self.metrics.observe("appointments", "select", 0.02)
+        self.metrics.observe("appointments", "select", 3, error=True)
+        lines = self.metrics.render().splitlines()
+
+        labels = 'table="appointments",operation="select",view="background"'
+        self.assertIn(f'supabase_query_duration_seconds_bucket{{{labels},le="0.01"}} 0', lines)
+        self.assertIn(f'supabase_query_duration_seconds_bucket{{{labels},le="0.025"}} 1', lines)
+        self.assertIn(f'supabase_query_duration_seconds_bucket{{{labels},le="5"}} 2', lines)
+        self.assertIn(f'supabase_query_duration_seconds_bucket{{{labels},le="+Inf"}} 2', lines)
+        self.assertIn(f'supabase_query_duration_seconds_count{{{labels}}} 2', lines)
+        self.assertIn(f'supabase_query_errors_total{{{labels}}} 1', lines)
+
+    def test_queries_per_request_histogram(self):
+        self.metrics.observe_request("patients.views.search", 12)
+        lines = self.metrics.render().splitlines()
+
+        self.assertIn('supabase_queries_per_request_bucket{view="patients.views.search",le="10"} 0', lines)
+        self.assertIn('supabase_queries_per_request_bucket{view="patients.views.search",le="15"} 1', lines)
+        self.assertIn('supabase_queries_per_request_sum{view="patients.views.search"} 12', lines)
+
+    def test_label_values_are_escaped(self):
+        self.metrics.observe('odd"table\\name\nx', "select", 0.001)
+        self.assertIn('table="odd\\"table\\\\name\\nx"', self.metrics.render())
+
+class InstrumentedQueryTests(SimpleTestCase):
+    def setUp(self):
+        self.metrics = self.enterContext(mock.patch('query_metrics.query_metrics', QueryMetrics()))
+
+    def test_chained_builders_are_timed_on_execute(self):
+        builder = mock.Mock()
+        builder.eq.return_value = builder
+        query = InstrumentedQuery(builder, "patients", "select").eq("user_id", "u1")
+
+        self.assertIsInstance(query, InstrumentedQuery)
+        self.assertIs(query.execute(), builder.execute.return_value)
+        self.assertIn('table="patients",operation="select"', self.metrics.render())
+
+    def test_failed_query_counts_as_an_error(self):
+        builder = mock.Mock()
+        builder.execute.side_effect = RuntimeError("boom")
+
+        with self.assertRaises(RuntimeError):
+            InstrumentedQuery(builder, "patients", "select").execute()
+        self.assertIn('supabase_query_errors_total{table="patients"', self.metrics.render())
+
+@override_settings(QUERY_METRICS={'QUERY_BUDGET': 2})
+class QueryMetricsMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.metrics = self.enterContext(mock.patch('query_metrics.query_metrics', QueryMetrics()))
+        self.request = RequestFactory().get('/api/patients/')
+
+    def serve(self, query_count):
+        def view(request):
+            for _ in range(query_count):
+                self.metrics.observe("patients", "select", 0.01)
+            return HttpResponse()
+
+        def handler(request):
+            # Django resolves the view and calls process_view inside get_response
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = QueryMetricsMiddleware(handler)
+        return middleware(self.request)
+
+    def test_queries_are_counted_per_view(self):
+        response = self.serve(2)
+
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+        self.assertIn(f'view="{__name__}.view",le="2"}} 1', self.metrics.render())
+
+    def test_request_over_budget_is_logged(self):
+        with self.assertLogs('query_metrics', 'WARNING') as logs:
+            self.serve(3)
+        self.assertIn("made 3 Supabase queries, over the budget of 2; repeated: patients.select x3", logs.output[0])
+
+    def test_request_within_budget_is_not_logged(self):
+        with self.assertNoLogs('query_metrics', 'WARNING'):
+            self.serve(2)
+
+class MetricsEndpointTests(SimpleTestCase):
+    def get(self, method='get', **headers):
+        return metrics(getattr(RequestFactory(), method)('/metrics/', headers=headers))
+
+    @override_settings(QUERY_METRICS={'TOKEN': None})
+    def test_missing_token_hides_the_endpoint(self):
+        self.assertEqual(self.get(authorization="Bearer anything").status_code, 404)
+
+    @override_settings(QUERY_METRICS={'TOKEN': 's3cret'})
+    def test_token_is_required(self):
+        self.assertEqual(self.get().status_code, 401)
+        self.assertEqual(self.get(authorization="Bearer wrong").status_code, 401)
+        self.assertEqual(self.get('post', authorization="Bearer s3cret").status_code, 405)
+
+        response = self.get(authorization="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith("text/plain; version=0.0.4"))
+        self.assertIn(b"# TYPE supabase_query_duration_seconds histogram", response.content)
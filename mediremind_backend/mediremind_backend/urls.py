@@ -16,6 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from query_metrics import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -24,4 +25,5 @@ urlpatterns = [
     path('staff/', include('staff_profiles.urls')),
     path('appointments/', include('appointments.urls')),
     path('notifications/', include('notifications.urls')),
+    path('metrics/', metrics, name='metrics'),
 ]
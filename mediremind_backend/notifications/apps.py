@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class NotificationsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'notifications'
+
+    def ready(self):
+        # Compile every notification template once at startup
+        from .message_templates import message_templates
+        message_templates.compile()
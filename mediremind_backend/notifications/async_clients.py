@@ -0,0 +1,413 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import weakref
+from contextlib import asynccontextmanager
+
+import aiosmtplib
+import httpx
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.utils.html import strip_tags
+from pywebpush import WebPusher
+
+from .beem_client import beem_client, RETRY_STATUS_CODES
+from .email_client import EmailClient
+from .push_notifications import push_notifications
+from .message_templates import message_templates
+from .twilio_client import twilio_client, TEMPLATE_EVENTS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ASYNC_SETTINGS = {
+    'CONCURRENCY': 100,
+    'MAX_CONNECTIONS': 100,
+    'TIMEOUT': 10
+}
+
+def get_async_settings():
+    return {**DEFAULT_ASYNC_SETTINGS, **getattr(settings, 'NOTIFICATION_ASYNC', {})}
+
+def error_message(e):
+    """httpx exceptions often have an empty str(); fall back to the type name"""
+    return str(e) or type(e).__name__
+
+class AsyncTransport:
+    """Shared HTTP client and global concurrency limit for one event loop
+
+    Every async provider client sends through the same httpx.AsyncClient,
+    and every send (SMTP included) holds one slot of the semaphore, so a
+    reminder run can await thousands of sends without more than CONCURRENCY
+    of them in flight.
+    """
+
+    def __init__(self, concurrency, max_connections, timeout):
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    @asynccontextmanager
+    async def slot(self):
+        async with self.semaphore:
+            yield
+
+    async def request(self, method, url, **kwargs):
+        async with self.semaphore:
+            return await self.client.request(method, url, **kwargs)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+# httpx clients and semaphores are bound to the loop they were created on
+_transports = weakref.WeakKeyDictionary()
+
+def get_transport():
+    """Return the AsyncTransport for the running event loop, creating it on first use"""
+    loop = asyncio.get_running_loop()
+    transport = _transports.get(loop)
+    if transport is None:
+        config = get_async_settings()
+        transport = _transports[loop] = AsyncTransport(
+            config['CONCURRENCY'], config['MAX_CONNECTIONS'], config['TIMEOUT']
+        )
+    return transport
+
+async def close_transport():
+    """Close the running loop's transport, e.g. at the end of a batch job"""
+    transport = _transports.pop(asyncio.get_running_loop(), None)
+    if transport:
+        await transport.aclose()
+
+def run_async(coroutine):
+    """Run a coroutine to completion from sync code and close the transport afterwards"""
+    async def runner():
+        try:
+            return await coroutine
+        finally:
+            await close_transport()
+    return asyncio.run(runner())
+
+class AsyncBeemClient:
+    """Async variant of BeemClient, sharing its configuration, payloads and metrics"""
+
+    def __init__(self, client=None):
+        self.client = client or beem_client
+
+    async def _post(self, endpoint, url, payload):
+        """POST to Beem with the same retry rules as BeemClient._post"""
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                response = await get_transport().request(
+                    "POST", url, json=payload, auth=(self.client.api_key, self.client.secret_key)
+                )
+            except httpx.HTTPError as e:
+                if not isinstance(e, httpx.ConnectError) or attempt >= self.client.max_retries:
+                    self.client.metrics.record(endpoint, time.monotonic() - started, False, attempt)
+                    raise
+                await asyncio.sleep(self.client._backoff(attempt))
+                attempt += 1
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES and attempt < self.client.max_retries:
+                await asyncio.sleep(self.client._backoff(attempt, response))
+                attempt += 1
+                continue
+
+            self.client.metrics.record(endpoint, time.monotonic() - started, response.status_code == 200, attempt)
+            return response
+
+    async def send_sms(self, recipient, message):
+        """Send SMS using Beem Africa API"""
+        try:
+            response = await self._post("sms", self.client.sms_url, self.client._sms_payload(message, [recipient]))
+
+            if response.status_code != 200:
+                print(f"SMS sending failed: {response.text}")
+                return False, response.text
+
+            return True, "SMS sent successfully"
+
+        except Exception as e:
+            print(f"Error sending SMS: {error_message(e)}")
+            return False, error_message(e)
+
+    async def send_bulk_sms(self, messages, chunk_size=None):
+        """Async BeemClient.send_bulk_sms; requests are sent concurrently"""
+        chunk_size = chunk_size or self.client.sms_chunk_size
+
+        groups = {}
+        for key, recipient, text in messages:
+            groups.setdefault(text, []).append((key, recipient))
+
+        chunks = [
+            (text, entries[start:start + chunk_size])
+            for text, entries in groups.items()
+            for start in range(0, len(entries), chunk_size)
+        ]
+        outcomes = await asyncio.gather(*(
+            self._send_sms_chunk(text, [recipient for _, recipient in chunk]) for text, chunk in chunks
+        ))
+
+        results = {}
+        for (_, chunk), outcome in zip(chunks, outcomes):
+            for key, _ in chunk:
+                results[key] = outcome
+        return results
+
+    async def _send_sms_chunk(self, message, recipients):
+        try:
+            response = await self._post("sms_bulk", self.client.sms_url, self.client._sms_payload(message, recipients))
+
+            if response.status_code != 200:
+                print(f"Bulk SMS sending failed for {len(recipients)} recipients: {response.text}")
+                return False, response.text
+
+            return True, f"SMS submitted in request {response.json().get('request_id')}"
+
+        except Exception as e:
+            print(f"Error sending bulk SMS: {error_message(e)}")
+            return False, error_message(e)
+
+    async def send_whatsapp(self, recipient, template_name, language_code="en", template_params=None):
+        """Send WhatsApp message using Beem Africa API"""
+        try:
+            if not self.client.whatsapp_template_namespace:
+                raise ValueError("WhatsApp template namespace not configured")
+
+            payload = {
+                "namespace": self.client.whatsapp_template_namespace,
+                "template_name": template_name,
+                "language": {"code": language_code},
+                "to": recipient
+            }
+            if template_params:
+                payload["parameters"] = template_params
+
+            response = await self._post("whatsapp", self.client.whatsapp_url, payload)
+
+            if response.status_code != 200:
+                print(f"WhatsApp message sending failed: {response.text}")
+                return False, response.text
+
+            return True, "WhatsApp message sent successfully"
+
+        except Exception as e:
+            print(f"Error sending WhatsApp message: {error_message(e)}")
+            return False, error_message(e)
+
+class AsyncTwilioClient:
+    """Async variant of TwilioClient, calling the Twilio REST API directly"""
+
+    def __init__(self, client=None):
+        self.client = client or twilio_client
+        self.base_url = os.getenv("TWILIO_API_URL", "https://api.twilio.com")
+
+    @property
+    def messages_url(self):
+        # A property so importing this module doesn't build the Twilio client
+        return f"{self.base_url}/2010-04-01/Accounts/{self.client.account_sid}/Messages.json"
+
+    async def send_whatsapp(self, to_number, message):
+        """Send WhatsApp message via Twilio"""
+        try:
+            response = await get_transport().request(
+                "POST",
+                self.messages_url,
+                data={
+                    "From": self.client.format_whatsapp_number(self.client.whatsapp_from),
+                    "To": self.client.format_whatsapp_number(to_number),
+                    "Body": message
+                },
+                auth=(self.client.account_sid, self.client.auth_token)
+            )
+
+            if response.status_code >= 400:
+                print(f"Error sending WhatsApp message: {response.text}")
+                return False, response.text
+
+            return True, f"Message sent successfully. SID: {response.json().get('sid')}"
+
+        except Exception as e:
+            print(f"Error sending WhatsApp message: {error_message(e)}")
+            return False, error_message(e)
+
+    async def send_template_message(self, to_number, template_name, template_data):
+        """Send a template-based WhatsApp message"""
+        if template_name not in TEMPLATE_EVENTS:
+            return False, f"Template {template_name} not found"
+
+        # Missing fields render as "Unknown", as in TwilioClient.send_template_message
+        message = message_templates.render(TEMPLATE_EVENTS[template_name], template_data, ['whatsapp'])['whatsapp']['text']
+        return await self.send_whatsapp(to_number, message)
+
+class AsyncPushNotificationHandler:
+    """Async variant of PushNotificationHandler
+
+    Payloads are encrypted with pywebpush, signed with the handler's cached
+    VAPID headers and posted through the shared transport.
+    """
+
+    def __init__(self, handler=None):
+        self.handler = handler or push_notifications
+
+    async def deliver(self, subscription_info, body):
+        """Async PushNotificationHandler.deliver: returns (success, message, expired)"""
+        try:
+            self.handler.validate_subscription(subscription_info)
+
+            encrypted = WebPusher(subscription_info).encode(body.encode('utf-8'), "aes128gcm")["body"]
+            headers = {
+                **self.handler.vapid_headers.headers_for(subscription_info["endpoint"]),
+                "Content-Encoding": "aes128gcm",
+                "TTL": "0"
+            }
+
+            response = await get_transport().request("POST", subscription_info["endpoint"], content=encrypted, headers=headers)
+
+            if response.status_code >= 400:
+                # 410 means the subscription has expired or been unsubscribed
+                return False, f"Push service returned {response.status_code}: {response.text}", response.status_code == 410
+
+            return True, "Push notification sent successfully", False
+
+        except ValueError as e:
+            print(f"Validation error: {str(e)}")
+            return False, error_message(e), False
+        except Exception as e:
+            print(f"Error sending push notification: {error_message(e)}")
+            return False, error_message(e), False
+
+    async def send_push_notification(self, subscription_info, title, message, url=None, data=None):
+        """Send a push notification to a subscription"""
+        return await self.send_to_subscriptions([subscription_info], title, message, url=url, data=data)
+
+    async def send_to_subscriptions(self, subscriptions, title, message, url=None, data=None):
+        """Send push notification to an already loaded list of subscriptions
+
+        The payload is serialized once; expired subscriptions are deleted in one batch.
+        """
+        if not subscriptions:
+            return False, "No push subscriptions found for user"
+
+        body = json.dumps(self.handler.build_payload(title, message, url=url, data=data))
+        results = await asyncio.gather(*(self.deliver(subscription, body) for subscription in subscriptions))
+
+        expired = [subscription["endpoint"] for subscription, (_, _, gone) in zip(subscriptions, results) if gone]
+        if expired:
+            await asyncio.to_thread(self.handler.delete_subscriptions, expired)
+
+        if any(success for success, _, _ in results):
+            return True, "Push notification sent successfully to at least one subscription"
+        return False, "; ".join(message for _, message, _ in results)
+
+    async def send_to_user(self, user_id, title, message, url=None, data=None):
+        """Send push notification to all user's subscriptions"""
+        if not user_id:
+            return False, "User ID is required"
+
+        subscriptions = await asyncio.to_thread(self.handler.get_user_subscriptions, user_id)
+        return await self.send_to_subscriptions(subscriptions, title, message, url=url, data=data)
+
+    async def send_appointment_reminder_push(self, user_id, appointment_data, subscriptions=None):
+        """Send appointment reminder push notification"""
+        if not user_id or not appointment_data:
+            return False, "User ID and appointment data are required"
+
+        reminder = self.handler.build_appointment_reminder(appointment_data)
+        if subscriptions is not None:
+            return await self.send_to_subscriptions(subscriptions, **reminder)
+        return await self.send_to_user(user_id, **reminder)
+
+    async def send_appointment_update_push(self, user_id, appointment_data, update_type):
+        """Send appointment update push notification"""
+        if not user_id or not appointment_data or not update_type:
+            return False, "User ID, appointment data, and update type are required"
+
+        update = self.handler.build_appointment_update(appointment_data, update_type)
+        if not update:
+            return False, "Invalid update type"
+        return await self.send_to_user(user_id, **update)
+
+class AsyncEmailClient:
+    """Async variant of EmailClient, sending over SMTP with aiosmtplib"""
+
+    async def send_email(self, subject, message, recipient_list, html_message=None):
+        """Send an email to the specified recipients"""
+        try:
+            if not all([settings.EMAIL_HOST_USER, settings.EMAIL_HOST_PASSWORD]):
+                logger.warning("Email settings not configured")
+                return False, "Email settings not configured"
+
+            if not recipient_list:
+                return False, "No recipients specified"
+
+            if not html_message:
+                html_message = f"<p>{message}</p>"
+
+            email = EmailMultiAlternatives(
+                subject=subject,
+                body=strip_tags(html_message),
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=recipient_list
+            )
+            email.attach_alternative(html_message, "text/html")
+
+            async with get_transport().slot():
+                await aiosmtplib.send(
+                    email.message(),
+                    hostname=settings.EMAIL_HOST,
+                    port=settings.EMAIL_PORT,
+                    username=settings.EMAIL_HOST_USER,
+                    password=settings.EMAIL_HOST_PASSWORD,
+                    start_tls=settings.EMAIL_USE_TLS,
+                    timeout=get_async_settings()['TIMEOUT']
+                )
+            return True, "Email sent successfully"
+
+        except Exception as e:
+            logger.error(f"Error sending email: {error_message(e)}")
+            return False, error_message(e)
+
+    async def send_appointment_confirmation_email(self, appointment_data, recipient_email, is_patient=True):
+        """Send appointment confirmation email"""
+        try:
+            subject, html_message = EmailClient.build_confirmation_email(appointment_data, is_patient)
+        except Exception as e:
+            logger.error(f"Error sending appointment confirmation email: {str(e)}")
+            return False, error_message(e)
+
+        return await self.send_email(subject, strip_tags(html_message), [recipient_email], html_message=html_message)
+
+    async def send_appointment_update_email(self, appointment_data, update_type, recipient_email, is_patient=True):
+        """Send appointment update email"""
+        try:
+            subject, html_message = EmailClient.build_update_email(appointment_data, update_type, is_patient)
+        except ValueError as e:
+            return False, error_message(e)
+        except Exception as e:
+            logger.error(f"Error sending appointment update email: {str(e)}")
+            return False, error_message(e)
+
+        return await self.send_email(subject, strip_tags(html_message), [recipient_email], html_message=html_message)
+
+# Create singleton instances
+async_beem_client = AsyncBeemClient()
+async_twilio_client = AsyncTwilioClient()
+async_push_notifications = AsyncPushNotificationHandler()
+async_email_client = AsyncEmailClient()
+
+__all__ = [
+    'async_beem_client',
+    'async_twilio_client',
+    'async_push_notifications',
+    'async_email_client',
+    'get_transport',
+    'close_transport',
+    'run_async'
+]
@@ -1,12 +1,72 @@
 import os
+import random
+import threading
+import time
 import requests
+from collections import deque
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from providers import providers
 
-load_dotenv()
+# Responses worth retrying: rate limiting and server-side errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+def _percentile_ms(sorted_latencies, fraction):
+    if not sorted_latencies:
+        return None
+    index = min(len(sorted_latencies) - 1, int(len(sorted_latencies) * fraction))
+    return round(sorted_latencies[index] * 1000, 1)
+
+class RequestMetrics:
+    """Thread-safe latency and outcome counters for each Beem endpoint"""
+
+    def __init__(self, window=500):
+        self.window = window
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, elapsed, success, retries=0):
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {
+                "requests": 0,
+                "errors": 0,
+                "retries": 0,
+                "latencies": deque(maxlen=self.window)
+            })
+            stats["requests"] += 1
+            stats["retries"] += retries
+            if not success:
+                stats["errors"] += 1
+            stats["latencies"].append(elapsed)
+
+    def snapshot(self):
+        """Return per-endpoint counts and latency percentiles in milliseconds"""
+        with self._lock:
+            endpoints = {name: dict(stats, latencies=sorted(stats["latencies"])) for name, stats in self._endpoints.items()}
+
+        return {
+            name: {
+                "requests": stats["requests"],
+                "errors": stats["errors"],
+                "retries": stats["retries"],
+                "p50_ms": _percentile_ms(stats["latencies"], 0.5),
+                "p95_ms": _percentile_ms(stats["latencies"], 0.95),
+                "max_ms": _percentile_ms(stats["latencies"], 1)
+            }
+            for name, stats in endpoints.items()
+        }
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
 
 class BeemClient:
-    """Client for interacting with Beem Africa's SMS and WhatsApp APIs"""
+    """Client for interacting with Beem Africa's SMS and WhatsApp APIs
+
+    Requests go through one pooled keep-alive session with connect/read
+    timeouts. Rate-limited (429) and 5xx responses, and connections that
+    could not be opened, are retried with jittered exponential backoff.
+    """
     
     def __init__(self):
         self.api_key = os.getenv("BEEM_API_KEY")
@@ -15,29 +75,86 @@ class BeemClient:
         self.whatsapp_template_namespace = os.getenv("BEEM_WHATSAPP_NAMESPACE")
         
         # API endpoints
-        self.sms_url = "https://apisms.beem.africa/v1/send"
-        self.whatsapp_url = "https://api.beem.africa/v1/whatsapp/send-template"
+        self.sms_url = os.getenv("BEEM_SMS_URL", "https://apisms.beem.africa/v1/send")
+        self.whatsapp_url = os.getenv("BEEM_WHATSAPP_URL", "https://api.beem.africa/v1/whatsapp/send-template")
+
+        # Transport settings
+        self.pool_size = int(os.getenv("BEEM_POOL_SIZE", 10))
+        self.timeout = (float(os.getenv("BEEM_CONNECT_TIMEOUT", 3)), float(os.getenv("BEEM_READ_TIMEOUT", 10)))
+        self.max_retries = int(os.getenv("BEEM_MAX_RETRIES", 3))
+        self.backoff_base = float(os.getenv("BEEM_BACKOFF_BASE", 0.5))
+        self.backoff_max = float(os.getenv("BEEM_BACKOFF_MAX", 8))
+        self.sms_chunk_size = int(os.getenv("BEEM_SMS_CHUNK_SIZE", 100))  # recipients per bulk request
         
         if not all([self.api_key, self.secret_key]):
             raise ValueError("Beem API credentials not found in environment variables")
+
+        self.metrics = RequestMetrics()
+        self.session = self._create_session()
+
+    def _create_session(self):
+        session = requests.Session()
+        session.auth = (self.api_key, self.secret_key)
+        session.headers.update({"Content-Type": "application/json"})
+        # Retries are handled in _post so they can be jittered and counted
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_size, max_retries=0)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _backoff(self, attempt, response=None):
+        """Seconds to wait before retry number `attempt` (full jitter)"""
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _post(self, endpoint, url, payload):
+        """POST to Beem with retries, recording latency under `endpoint`
+
+        Only connection errors are retried, not read timeouts, because Beem
+        may already have accepted the message. Returns the final response or
+        raises the last error.
+        """
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                if not isinstance(e, requests.exceptions.ConnectionError) or attempt >= self.max_retries:
+                    self.metrics.record(endpoint, time.monotonic() - started, False, attempt)
+                    raise
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                time.sleep(self._backoff(attempt, response))
+                attempt += 1
+                continue
+
+            self.metrics.record(endpoint, time.monotonic() - started, response.status_code == 200, attempt)
+            return response
     
+    def _sms_payload(self, message, recipients):
+        return {
+            "source_addr": self.sender_id,
+            "schedule_time": "",
+            "encoding": "0",
+            "message": message,
+            "recipients": [
+                {"recipient_id": index, "dest_addr": recipient}
+                for index, recipient in enumerate(recipients, start=1)
+            ]
+        }
+
     def send_sms(self, recipient, message):
         """Send SMS using Beem Africa API"""
         try:
-            payload = {
-                "source_addr": self.sender_id,
-                "schedule_time": "",
-                "encoding": "0",
-                "message": message,
-                "recipients": [{"recipient_id": 1, "dest_addr": recipient}]
-            }
+            payload = self._sms_payload(message, [recipient])
             
-            response = requests.post(
-                self.sms_url,
-                json=payload,
-                auth=(self.api_key, self.secret_key),
-                headers={"Content-Type": "application/json"}
-            )
+            response = self._post("sms", self.sms_url, payload)
             
             if response.status_code != 200:
                 print(f"SMS sending failed: {response.text}")
@@ -48,6 +165,50 @@ class BeemClient:
         except Exception as e:
             print(f"Error sending SMS: {str(e)}")
             return False, str(e)
+
+    def send_bulk_sms(self, messages, chunk_size=None):
+        """Send many SMS, sharing a request between recipients of the same text
+
+        `messages` is an iterable of (key, recipient, text). Beem's send API
+        takes one message text per request, so only messages with identical
+        text are sent together, in requests of up to `chunk_size` recipients
+        (BEEM_SMS_CHUNK_SIZE by default). Personalised texts, such as
+        appointment reminders, still cost one request each.
+
+        Returns a dict mapping each key to a (success, message) tuple. Beem
+        reports one outcome per request, not per recipient, so every
+        recipient in a multi-recipient request shares it.
+        """
+        chunk_size = chunk_size or self.sms_chunk_size
+
+        groups = {}
+        for key, recipient, text in messages:
+            groups.setdefault(text, []).append((key, recipient))
+
+        results = {}
+        for text, entries in groups.items():
+            for start in range(0, len(entries), chunk_size):
+                chunk = entries[start:start + chunk_size]
+                outcome = self._send_sms_chunk(text, [recipient for _, recipient in chunk])
+                for key, _ in chunk:
+                    results[key] = outcome
+        return results
+
+    def _send_sms_chunk(self, message, recipients):
+        """Send one multi-recipient SMS request, returning (success, message)"""
+        try:
+            response = self._post("sms_bulk", self.sms_url, self._sms_payload(message, recipients))
+
+            if response.status_code != 200:
+                print(f"Bulk SMS sending failed for {len(recipients)} recipients: {response.text}")
+                return False, response.text
+
+            request_id = response.json().get("request_id")
+            return True, f"SMS submitted in request {request_id}"
+
+        except Exception as e:
+            print(f"Error sending bulk SMS: {str(e)}")
+            return False, str(e)
     
     def send_whatsapp(self, recipient, template_name, language_code="en", template_params=None):
         """Send WhatsApp message using Beem Africa API"""
@@ -66,12 +227,7 @@ class BeemClient:
             if template_params:
                 payload["parameters"] = template_params
             
-            response = requests.post(
-                self.whatsapp_url,
-                json=payload,
-                auth=(self.api_key, self.secret_key),
-                headers={"Content-Type": "application/json"}
-            )
+            response = self._post("whatsapp", self.whatsapp_url, payload)
             
             if response.status_code != 200:
                 print(f"WhatsApp message sending failed: {response.text}")
@@ -83,7 +239,11 @@ class BeemClient:
             print(f"Error sending WhatsApp message: {str(e)}")
             return False, str(e)
 
-# Create a singleton instance
-beem_client = BeemClient()
+    def close(self):
+        """Close pooled connections"""
+        self.session.close()
+
+# Create a singleton instance, built on first use
+beem_client = providers.register('beem', BeemClient)
 
-__all__ = ['beem_client'] 
\ No newline at end of file
+__all__ = ['beem_client', 'BeemClient']
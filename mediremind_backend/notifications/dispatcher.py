@@ -0,0 +1,112 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from django.conf import settings
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Used for any channel missing from settings.NOTIFICATION_CHANNELS
+DEFAULT_CHANNEL_CONFIG = {
+    'workers': 4,
+    'timeout': 10
+}
+
+class DispatchResult:
+    """Aggregated outcome of one dispatch across all channels"""
+
+    def __init__(self, results):
+        self.results = results
+
+    @property
+    def success(self):
+        return all(result["success"] for result in self.results)
+
+    @property
+    def failures(self):
+        return [result for result in self.results if not result["success"]]
+
+    def summary(self):
+        sent = len(self.results) - len(self.failures)
+        return f"{sent}/{len(self.results)} notifications sent"
+
+class NotificationDispatcher:
+    """Runs notification channels concurrently on one bounded thread pool per channel"""
+
+    def __init__(self, channel_config=None):
+        self.channel_config = channel_config or getattr(settings, 'NOTIFICATION_CHANNELS', {})
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _get_config(self, channel):
+        return {**DEFAULT_CHANNEL_CONFIG, **self.channel_config.get(channel, {})}
+
+    def _get_pool(self, channel):
+        """Create the worker pool for a channel on first use"""
+        pool = self._pools.get(channel)
+        if pool:
+            return pool
+
+        with self._lock:
+            if channel not in self._pools:
+                self._pools[channel] = ThreadPoolExecutor(
+                    max_workers=self._get_config(channel)['workers'],
+                    thread_name_prefix=f"notify-{channel}"
+                )
+            return self._pools[channel]
+
+    def dispatch(self, tasks):
+        """Run (channel, label, func, kwargs) tasks concurrently and wait for all of them
+
+        Each func must return a (success, message) tuple. A task that has not
+        finished within its channel's timeout is reported as failed; its worker
+        thread is left to finish in the background.
+        """
+        submitted = []
+        for channel, label, func, kwargs in tasks:
+            started = time.monotonic()
+            future = self._get_pool(channel).submit(self._run_timed, func, kwargs)
+            submitted.append((channel, label, future, started))
+
+        results = []
+        for channel, label, future, started in submitted:
+            timeout = self._get_config(channel)['timeout']
+            remaining = max(0, started + timeout - time.monotonic())
+            try:
+                success, message, elapsed = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                future.cancel()
+                success, message, elapsed = False, f"Timed out after {timeout}s", timeout
+
+            results.append({
+                "channel": channel,
+                "label": label,
+                "success": success,
+                "message": message,
+                "elapsed": elapsed
+            })
+
+        return DispatchResult(results)
+
+    @staticmethod
+    def _run_timed(func, kwargs):
+        """Run one task in a worker thread, timing it and capturing any error"""
+        started = time.monotonic()
+        try:
+            success, message = func(**kwargs)
+        except Exception as e:
+            logger.exception("Notification task raised")
+            success, message = False, str(e)
+        return success, message, time.monotonic() - started
+
+    def shutdown(self, wait=True):
+        """Stop all channel pools"""
+        with self._lock:
+            for pool in self._pools.values():
+                pool.shutdown(wait=wait)
+            self._pools = {}
+
+# Create a singleton instance
+notification_dispatcher = NotificationDispatcher()
+
+__all__ = ['notification_dispatcher', 'NotificationDispatcher', 'DispatchResult']
@@ -1,13 +1,121 @@
-from django.core.mail import send_mail
+from contextlib import contextmanager
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.conf import settings
-from django.template.loader import render_to_string
 from django.utils.html import strip_tags
+from smtplib import SMTPServerDisconnected
+from .message_templates import message_templates
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_EMAIL_POOL_SETTINGS = {
+    'SIZE': 4,
+    'MAX_IDLE': 60,
+    'BATCH_SIZE': 100
+}
+
+def get_email_pool_settings():
+    return {**DEFAULT_EMAIL_POOL_SETTINGS, **getattr(settings, 'EMAIL_POOL', {})}
+
+class EmailConnectionPool:
+    """Thread-safe pool of open, authenticated email backend connections
+
+    At most SIZE connections are open at once. A connection goes back to the
+    pool after each send and is closed once it has been idle for MAX_IDLE
+    seconds, before the SMTP server is likely to drop it.
+    """
+
+    def __init__(self, size=None, max_idle=None):
+        config = get_email_pool_settings()
+        self.size = size or config['SIZE']
+        self.max_idle = max_idle if max_idle is not None else config['MAX_IDLE']
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.size)
+
+    def _take_idle(self):
+        """Pop the most recently used idle connection, closing any that went stale"""
+        now = time.monotonic()
+        with self._lock:
+            stale = [connection for connection, last_used in self._idle if now - last_used > self.max_idle]
+            self._idle = [(connection, last_used) for connection, last_used in self._idle if now - last_used <= self.max_idle]
+            connection = self._idle.pop()[0] if self._idle else None
+        for old in stale:
+            old.close()
+        return connection
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; it is discarded instead of returned if the send fails"""
+        with self._slots:
+            connection = self._take_idle()
+            if connection is None:
+                connection = get_connection(fail_silently=False)
+                connection.open()
+
+            try:
+                yield connection
+            except Exception:
+                connection.close()
+                raise
+
+            with self._lock:
+                self._idle.append((connection, time.monotonic()))
+
+    def send_messages(self, messages):
+        """Send messages one at a time over a pooled connection
+
+        If the server drops the connection, sending resumes on a fresh one
+        from the first message that did not go out, so nobody is emailed
+        twice. It gives up if a fresh connection is dropped before sending
+        anything. Returns the number sent; an exception raised instead has a
+        `sent` attribute with the number that went out before it.
+        """
+        sent = 0
+        resumed_at = None
+        while sent < len(messages):
+            try:
+                with self.connection() as connection:
+                    while sent < len(messages):
+                        connection.send_messages([messages[sent]])
+                        sent += 1
+            except SMTPServerDisconnected as e:
+                if resumed_at == sent:
+                    e.sent = sent
+                    raise
+                # The server closed the connection; carry on with the rest on a fresh one
+                resumed_at = sent
+            except Exception as e:
+                e.sent = sent
+                raise
+        return sent
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            connection.close()
+
 class EmailClient:
     """Client for handling email notifications"""
+
+    @staticmethod
+    def build_message(subject, message, recipient_list, html_message=None):
+        """Build a multipart plain text and HTML email"""
+        # If no HTML message provided, create a simple HTML version
+        if not html_message:
+            html_message = f"<p>{message}</p>"
+
+        email = EmailMultiAlternatives(
+            subject=subject,
+            body=strip_tags(html_message),  # Plain text version
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=recipient_list
+        )
+        email.attach_alternative(html_message, "text/html")
+        return email
     
     @staticmethod
     def send_email(subject, message, recipient_list, html_message=None):
@@ -20,39 +128,67 @@ class EmailClient:
             if not recipient_list:
                 return False, "No recipients specified"
 
-            # If no HTML message provided, create a simple HTML version
-            if not html_message:
-                html_message = f"<p>{message}</p>"
-
-            send_mail(
-                subject=subject,
-                message=strip_tags(html_message),  # Plain text version
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=recipient_list,
-                html_message=html_message,
-                fail_silently=False,
-            )
+            email_connection_pool.send_messages([
+                EmailClient.build_message(subject, message, recipient_list, html_message)
+            ])
             return True, "Email sent successfully"
 
         except Exception as e:
             logger.error(f"Error sending email: {str(e)}")
             return False, str(e)
 
+    @staticmethod
+    def send_batch(messages, batch_size=None):
+        """Send (key, EmailMultiAlternatives) pairs, each batch over one connection
+
+        Returns {key: (success, message)} like BeemClient.send_bulk_sms; when
+        a batch fails, the messages sent before the error still succeed.
+        """
+        if not messages:
+            return {}
+        if not all([settings.EMAIL_HOST_USER, settings.EMAIL_HOST_PASSWORD]):
+            logger.warning("Email settings not configured")
+            return {key: (False, "Email settings not configured") for key, _ in messages}
+
+        batch_size = batch_size or get_email_pool_settings()['BATCH_SIZE']
+        results = {}
+        for start in range(0, len(messages), batch_size):
+            batch = messages[start:start + batch_size]
+            try:
+                email_connection_pool.send_messages([email for _, email in batch])
+                results.update((key, (True, "Email sent successfully")) for key, _ in batch)
+            except Exception as e:
+                sent = getattr(e, 'sent', 0)
+                logger.error(f"Error sending batch of {len(batch)} emails after {sent} were sent: {str(e)}")
+                results.update((key, (True, "Email sent successfully")) for key, _ in batch[:sent])
+                results.update((key, (False, str(e))) for key, _ in batch[sent:])
+        return results
+
+    @staticmethod
+    def build_confirmation_email(appointment_data, is_patient=True):
+        """Render the subject and HTML body of an appointment confirmation email"""
+        channel = 'email_patient' if is_patient else 'email_doctor'
+        email = message_templates.render('confirmation', appointment_data, [channel])[channel]
+        return email['subject'], email['html']
+
+    @staticmethod
+    def build_update_email(appointment_data, update_type, is_patient=True):
+        """Render the subject and HTML body of an appointment update email
+
+        Raises ValueError for an unknown update type.
+        """
+        if update_type not in ('reschedule', 'cancellation'):
+            raise ValueError(f"Invalid update type: {update_type}")
+
+        channel = 'email_patient' if is_patient else 'email_doctor'
+        email = message_templates.render(update_type, appointment_data, [channel])[channel]
+        return email['subject'], email['html']
+
     @staticmethod
     def send_appointment_confirmation_email(appointment_data, recipient_email, is_patient=True):
         """Send appointment confirmation email"""
         try:
-            if is_patient:
-                subject = "Appointment Confirmation - MediRemind"
-                template = "notifications/email/appointment_confirmation_patient.html"
-            else:
-                subject = "New Appointment Request - MediRemind"
-                template = "notifications/email/appointment_confirmation_doctor.html"
-
-            html_message = render_to_string(template, {
-                'appointment': appointment_data,
-                'recipient_name': appointment_data.get('patient_name' if is_patient else 'doctor_name'),
-            })
+            subject, html_message = EmailClient.build_confirmation_email(appointment_data, is_patient)
 
             return EmailClient.send_email(
                 subject=subject,
@@ -69,27 +205,7 @@ class EmailClient:
     def send_appointment_update_email(appointment_data, update_type, recipient_email, is_patient=True):
         """Send appointment update email"""
         try:
-            templates = {
-                'reschedule': {
-                    'patient': "notifications/email/appointment_reschedule_patient.html",
-                    'doctor': "notifications/email/appointment_reschedule_doctor.html"
-                },
-                'cancellation': {
-                    'patient': "notifications/email/appointment_cancellation_patient.html",
-                    'doctor': "notifications/email/appointment_cancellation_doctor.html"
-                }
-            }
-
-            if update_type not in templates:
-                return False, f"Invalid update type: {update_type}"
-
-            template = templates[update_type]['patient' if is_patient else 'doctor']
-            subject = f"Appointment {update_type.title()} - MediRemind"
-
-            html_message = render_to_string(template, {
-                'appointment': appointment_data,
-                'recipient_name': appointment_data.get('patient_name' if is_patient else 'doctor_name'),
-            })
+            subject, html_message = EmailClient.build_update_email(appointment_data, update_type, is_patient)
 
             return EmailClient.send_email(
                 subject=subject,
@@ -98,9 +214,12 @@ class EmailClient:
                 html_message=html_message
             )
 
+        except ValueError as e:
+            return False, str(e)
         except Exception as e:
             logger.error(f"Error sending appointment update email: {str(e)}")
             return False, str(e)
 
-# Create a singleton instance
+# Create singleton instances
+email_connection_pool = EmailConnectionPool()
 email_client = EmailClient() 
\ No newline at end of file
@@ -0,0 +1,187 @@
+from collections.abc import Mapping
+from dataclasses import dataclass, fields
+from datetime import datetime
+from django.conf import settings
+from authapp.token_cache import LocalCacheBackend
+from data_store import data_store
+import time
+
+DEFAULT_HYDRATION_SETTINGS = {
+    'TTL': 30,
+    'MAX_ENTRIES': 5000,
+    'CHUNK_SIZE': 200
+}
+
+def get_hydration_settings():
+    return {**DEFAULT_HYDRATION_SETTINGS, **getattr(settings, 'NOTIFICATION_HYDRATION', {})}
+
+def format_appointment_time(date_str, time_str):
+    """Format appointment date and time for messages"""
+    try:
+        date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        # Postgres returns HH:MM:SS
+        time = datetime.strptime(time_str[:5], '%H:%M').time()
+        dt = datetime.combine(date, time)
+        return dt.strftime('%A, %B %d at %I:%M %p')
+    except (TypeError, ValueError):
+        return f"{date_str} at {time_str}"
+
+@dataclass(frozen=True)
+class NotificationContext(Mapping):
+    """Everything a notification about one appointment needs
+
+    Immutable, so one context can be shared by every channel and cached.
+    It also reads like the appointment data dicts the templates, ledger
+    and push clients take: context["doctor_name"], context.get("id").
+    """
+    id: str
+    patient_id: str
+    doctor_id: str
+    date: str
+    time: str
+    appointment_time: str  # Formatted for messages
+    type: str
+    status: str
+    location: str
+    notes: str
+    preferred_channel: str
+    patient_name: str
+    patient_phone: str
+    patient_email: str
+    doctor_name: str
+    doctor_email: str
+    updated_at: str
+
+    @classmethod
+    def from_row(cls, appointment):
+        """Build from an appointment row with 'patient' and 'doctor' embedded"""
+        patient = appointment.get("patient") or {}
+        doctor = appointment.get("doctor") or {}
+
+        return cls(
+            id=str(appointment["id"]),
+            patient_id=appointment["patient_id"],
+            doctor_id=appointment["doctor_id"],
+            date=appointment["date"],
+            time=appointment["time"],
+            appointment_time=format_appointment_time(appointment["date"], appointment["time"]),
+            type=appointment.get("type", "consultation"),
+            status=appointment.get("status", "scheduled"),
+            location=appointment.get("location_text", "Main Hospital"),
+            notes=appointment.get("notes"),
+            preferred_channel=appointment.get("preferred_channel"),  # None: push only
+            patient_name=patient.get("full_name"),
+            patient_phone=patient.get("phone"),
+            patient_email=patient.get("email"),
+            doctor_name=doctor.get("full_name"),
+            doctor_email=doctor.get("email"),
+            updated_at=appointment.get("updated_at")
+        )
+
+    def __getitem__(self, key):
+        if key not in FIELD_NAMES:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(FIELD_NAMES)
+
+    def __len__(self):
+        return len(FIELD_NAMES)
+
+FIELD_NAMES = tuple(field.name for field in fields(NotificationContext))
+
+class AppointmentHydrator:
+    """Loads NotificationContexts for one appointment or thousands
+
+    Misses are loaded with one joined query per CHUNK_SIZE appointments.
+    Contexts are cached for TTL seconds; a context built from a row with
+    the same updated_at as the cached one is reused as is. Pass updated_at
+    to hydrate when the caller knows the appointment changed, so an older
+    cached context is never used for it.
+
+    Profile edits don't touch appointments.updated_at, so call
+    invalidate_user after changing a patient's or doctor's name, phone or
+    email. The cache is per process; other processes see the change once
+    their contexts expire.
+    """
+
+    def __init__(self):
+        config = get_hydration_settings()
+        self.ttl = config['TTL']
+        self.chunk_size = config['CHUNK_SIZE']
+        self.cache = LocalCacheBackend(config['MAX_ENTRIES'])
+        # When each user's profile last changed; kept apart so contexts never evict them
+        self.invalidated = LocalCacheBackend(config['MAX_ENTRIES'])
+
+    def _cached(self, appointment_id):
+        """The cached context, unless a party's profile changed since it was cached"""
+        entry = self.cache.get(str(appointment_id))
+        if not entry:
+            return None
+
+        context, cached_at = entry
+        for user_id in (context.patient_id, context.doctor_id):
+            invalidated_at = self.invalidated.get(str(user_id))
+            if invalidated_at and cached_at <= invalidated_at:
+                self.cache.delete(str(appointment_id))
+                return None
+        return context
+
+    def _store(self, appointment):
+        cached = self._cached(appointment["id"])
+        if cached and cached.updated_at == appointment.get("updated_at"):
+            context = cached
+        else:
+            context = NotificationContext.from_row(appointment)
+        if self.ttl:
+            self.cache.set(context.id, (context, time.time()), self.ttl)
+        return context
+
+    def hydrate(self, appointment_id, updated_at=None):
+        """The context for one appointment, or None if it does not exist"""
+        cached = self._cached(appointment_id)
+        if cached and (updated_at is None or cached.updated_at == updated_at):
+            return cached
+        return self.hydrate_many([appointment_id], use_cache=False).get(str(appointment_id))
+
+    def hydrate_many(self, appointment_ids, use_cache=True):
+        """{appointment_id: context} for the appointments that exist"""
+        contexts = {}
+        missing = []
+        for appointment_id in dict.fromkeys(str(appointment_id) for appointment_id in appointment_ids):
+            cached = self._cached(appointment_id) if use_cache else None
+            if cached:
+                contexts[appointment_id] = cached
+            else:
+                missing.append(appointment_id)
+
+        for start in range(0, len(missing), self.chunk_size):
+            for appointment in data_store.appointments_with_parties(missing[start:start + self.chunk_size]):
+                context = self._store(appointment)
+                contexts[context.id] = context
+        return contexts
+
+    def hydrate_date(self, date_str, shard=None, shard_count=1):
+        """Contexts for every appointment on a date, or one shard of them, in appointment ID order"""
+        return [
+            self._store(appointment)
+            for appointment in data_store.appointments_on_date(date_str, shard=shard, shard_count=shard_count)
+        ]
+
+    def invalidate(self, appointment_id):
+        self.cache.delete(str(appointment_id))
+
+    def invalidate_user(self, user_id):
+        """Drop cached contexts of every appointment a user is party to"""
+        if user_id and self.ttl:
+            # Anything cached before this marker is stale; contexts never outlive the TTL
+            self.invalidated.set(str(user_id), time.time(), self.ttl)
+
+# Create a singleton instance
+appointment_hydrator = AppointmentHydrator()
+
+__all__ = [
+    'appointment_hydrator', 'AppointmentHydrator', 'NotificationContext',
+    'format_appointment_time'
+]
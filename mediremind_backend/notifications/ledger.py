@@ -0,0 +1,114 @@
+from django.conf import settings
+from supabase_client import admin_client
+from .models import NotificationLedgerEntry
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEDGER_SETTINGS = {
+    'BACKEND': 'database',
+    'CHUNK_SIZE': 500
+}
+
+def get_ledger_settings():
+    return {**DEFAULT_LEDGER_SETTINGS, **getattr(settings, 'NOTIFICATION_LEDGER', {})}
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+# Appointment fields besides the slot whose change warrants a new notification
+NOTIFIED_FIELDS = ('doctor_id', 'location')
+
+def notification_key(appointment_data, channel):
+    """Ledger key (appointment_id, channel, window) for one appointment's notification
+
+    The window is the appointment's date and time plus a digest of
+    NOTIFIED_FIELDS, so an appointment is notified again when it moves to a
+    new slot, doctor or location, but not for edits the patient never sees.
+    """
+    digest = hashlib.sha1(
+        json.dumps([str(appointment_data.get(field)) for field in NOTIFIED_FIELDS]).encode('utf-8')
+    ).hexdigest()[:12]
+    return (str(appointment_data["id"]), channel, f"{appointment_data['date']} {appointment_data['time']} {digest}")
+
+class DatabaseLedger:
+    """Ledger stored in the local Django database (SQLite by default)"""
+
+    def sent_keys(self, kind, appointment_ids):
+        keys = set()
+        for chunk in _chunks(appointment_ids, get_ledger_settings()['CHUNK_SIZE']):
+            keys.update(NotificationLedgerEntry.objects.filter(
+                kind=kind, appointment_id__in=chunk
+            ).values_list('appointment_id', 'channel', 'send_window'))
+        return keys
+
+    def record(self, kind, keys):
+        NotificationLedgerEntry.objects.bulk_create([
+            NotificationLedgerEntry(appointment_id=appointment_id, channel=channel, kind=kind, send_window=window)
+            for appointment_id, channel, window in keys
+        ], batch_size=get_ledger_settings()['CHUNK_SIZE'], ignore_conflicts=True)
+
+class SupabaseLedger:
+    """Ledger stored in the Supabase notification_ledger table"""
+
+    table = "notification_ledger"
+
+    def sent_keys(self, kind, appointment_ids):
+        keys = set()
+        for chunk in _chunks(appointment_ids, get_ledger_settings()['CHUNK_SIZE']):
+            result = admin_client.table(self.table).select(
+                "appointment_id, channel, send_window"
+            ).eq("kind", kind).in_("appointment_id", chunk).execute()
+            keys.update((row['appointment_id'], row['channel'], row['send_window']) for row in result.data or [])
+        return keys
+
+    def record(self, kind, keys):
+        rows = [
+            {'appointment_id': appointment_id, 'channel': channel, 'kind': kind, 'send_window': window}
+            for appointment_id, channel, window in keys
+        ]
+        for chunk in _chunks(rows, get_ledger_settings()['CHUNK_SIZE']):
+            admin_client.table(self.table).upsert(
+                chunk, on_conflict="appointment_id,channel,kind,send_window", ignore_duplicates=True
+            ).execute()
+
+LEDGER_BACKENDS = {
+    'database': DatabaseLedger,
+    'supabase': SupabaseLedger
+}
+
+def get_ledger():
+    """Return the ledger backend selected by settings.NOTIFICATION_LEDGER['BACKEND']"""
+    backend = get_ledger_settings()['BACKEND']
+    if backend not in LEDGER_BACKENDS:
+        raise ValueError(f"Unknown notification ledger backend: {backend}")
+    return LEDGER_BACKENDS[backend]()
+
+def sent_notifications(kind, appointments_data):
+    """Keys of the notifications of this kind already sent for these appointments
+
+    One bulk lookup (per CHUNK_SIZE appointments) for the whole run.
+    """
+    appointment_ids = list(dict.fromkeys(str(appointment_data["id"]) for appointment_data in appointments_data))
+    if not appointment_ids:
+        return set()
+    return get_ledger().sent_keys(kind, appointment_ids)
+
+def record_notifications(kind, keys):
+    """Record delivered notifications; a failure is logged rather than raised
+
+    The notifications already went out, so failing the caller here would
+    only make it retry and send them again.
+    """
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return
+    try:
+        get_ledger().record(kind, keys)
+    except Exception as e:
+        logger.error(f"Error recording {len(keys)} {kind} notifications in the ledger: {str(e)}")
+
+__all__ = ['notification_key', 'sent_notifications', 'record_notifications', 'get_ledger']
@@ -0,0 +1,36 @@
+import time
+from django.core.management.base import BaseCommand
+from notifications.outbox import process_outbox
+
+class Command(BaseCommand):
+    help = 'Deliver queued notification jobs from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Number of jobs to claim per batch')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox instead of exiting when it is empty')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to wait between polls in --loop mode')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Processing notification outbox...')
+
+        while True:
+            try:
+                stats = process_outbox(batch_size=options['batch_size'])
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Failed to process outbox: {str(e)}'))
+                if not options['loop']:
+                    return
+                time.sleep(options['interval'])
+                continue
+
+            if stats['claimed']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Processed {stats['claimed']} jobs: {stats['sent']} sent, "
+                    f"{stats['retried']} will retry, {stats['dead']} dead"
+                ))
+
+            if stats['claimed'] < options['batch_size']:
+                if not options['loop']:
+                    self.stdout.write('Outbox drained')
+                    return
+                time.sleep(options['interval'])
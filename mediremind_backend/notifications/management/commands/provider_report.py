@@ -0,0 +1,41 @@
+import time
+from importlib import import_module
+from django.core.management.base import BaseCommand
+from providers import providers
+
+DEFAULT_MODULES = [
+    'notifications.utils',
+    'appointments.views',
+    'patients.views',
+    'staff_profiles.views',
+    'authapp.views'
+]
+
+class Command(BaseCommand):
+    help = 'Report how long key modules take to import and which providers they built'
+    # System checks load the URLconf, which would import every module before we time it
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', action='append', help='Module to time (repeatable); defaults to the app views')
+        parser.add_argument('--build', action='store_true', help='Also build every registered provider and time it')
+
+    def handle(self, *args, **options):
+        # Modules share dependencies, so each time only covers what earlier ones didn't import
+        for module in options['module'] or DEFAULT_MODULES:
+            started = time.perf_counter()
+            import_module(module)
+            self.stdout.write(f"import {module}: {(time.perf_counter() - started) * 1000:.1f}ms")
+
+        for name, built, _ in providers.report():
+            if options['build'] and not built:
+                try:
+                    providers.get(name)
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f"provider {name}: failed to build: {str(e)}"))
+
+        for name, built, seconds in providers.report():
+            if built:
+                self.stdout.write(f"provider {name}: built in {seconds * 1000:.1f}ms")
+            else:
+                self.stdout.write(f"provider {name}: not built")
@@ -1,15 +1,66 @@
 from django.core.management.base import BaseCommand
-from notifications.utils import send_upcoming_appointment_reminders
+from notifications.async_clients import run_async
+from notifications.scheduler import run_reminder_shards
+from notifications.utils import send_upcoming_appointment_reminders, send_upcoming_appointment_reminders_async
 
 class Command(BaseCommand):
     help = 'Send reminders for upcoming appointments'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--async',
+            action='store_true',
+            dest='use_async',
+            help='Send with the asyncio provider clients instead of one request at a time'
+        )
+        parser.add_argument(
+            '--shards',
+            type=int,
+            help='Split the run into this many shards and lease each one, so several workers can run at once'
+        )
+        parser.add_argument(
+            '--shard',
+            type=int,
+            action='append',
+            help='Only try these shards (repeatable); defaults to every shard'
+        )
+        parser.add_argument('--date', help='Appointment date to remind (YYYY-MM-DD); defaults to tomorrow')
+        parser.add_argument('--owner', help='Worker name recorded on shard leases; defaults to host:pid')
+
     def handle(self, *args, **options):
         self.stdout.write('Sending reminders for upcoming appointments...')
-        
-        success, message = send_upcoming_appointment_reminders()
-        
+
+        if options['shards'] or options['shard']:
+            self.handle_shards(options)
+            return
+
+        if options['use_async']:
+            success, message = run_async(send_upcoming_appointment_reminders_async(options['date']))
+        else:
+            success, message = send_upcoming_appointment_reminders(options['date'])
+
         if success:
             self.stdout.write(self.style.SUCCESS(f'Successfully sent reminders: {message}'))
         else:
-            self.stdout.write(self.style.ERROR(f'Failed to send reminders: {message}')) 
\ No newline at end of file
+            self.stdout.write(self.style.ERROR(f'Failed to send reminders: {message}'))
+
+    def handle_shards(self, options):
+        try:
+            results = run_reminder_shards(
+                date_str=options['date'],
+                shard_count=options['shards'],
+                shards=options['shard'],
+                owner=options['owner'],
+                use_async=options['use_async']
+            )
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Failed to send reminders: {str(e)}'))
+            return
+
+        for result in results:
+            if result['status'] == 'sent':
+                self.stdout.write(self.style.SUCCESS(f"Shard {result['shard']}: {result['message']}"))
+            elif result['status'] == 'failed':
+                self.stdout.write(self.style.ERROR(f"Shard {result['shard']} failed: {result['message']}"))
+            else:
+                self.stdout.write(f"Shard {result['shard']}: skipped, {result['status']}")
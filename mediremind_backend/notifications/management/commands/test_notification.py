@@ -1,5 +1,4 @@
 from django.core.management.base import BaseCommand
-from notifications.beem_client import beem_client
 
 class Command(BaseCommand):
     help = 'Test Beem Africa notification sending'
@@ -10,6 +9,10 @@ class Command(BaseCommand):
                           help='Channel to use (sms or whatsapp)')
 
     def handle(self, *args, **options):
+        # Imported here: test discovery loads this module, and touching the
+        # lazy client at import time would demand Beem credentials
+        from notifications.beem_client import beem_client
+
         phone = options['phone']
         channel = options['channel']
         
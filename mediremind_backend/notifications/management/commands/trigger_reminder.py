@@ -6,13 +6,14 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('appointment_id', type=str, help='ID of the appointment to send reminder for')
+        parser.add_argument('--force', action='store_true', help='Send even if the reminder was already sent')
 
     def handle(self, *args, **options):
         appointment_id = options['appointment_id']
         
         self.stdout.write(f'Triggering reminder for appointment {appointment_id}...')
         
-        success, message = trigger_manual_reminder(appointment_id)
+        success, message = trigger_manual_reminder(appointment_id, force=options['force'])
         
         if success:
             self.stdout.write(self.style.SUCCESS(f'Successfully sent reminder: {message}'))
@@ -0,0 +1,249 @@
+from string import Formatter
+from django.template.loader import get_template
+from django.utils.html import strip_tags
+import threading
+
+# Every notification message, per event and channel. Text, title and subject
+# are str.format templates over the appointment data dict (flat field names
+# only); html names a Django template rendered with the appointment and the
+# recipient's name.
+MESSAGE_TEMPLATES = {
+    'confirmation': {
+        'sms': {
+            'text': "Your appointment with Dr. {doctor_name} has been confirmed for {date} at {time}."
+        },
+        'whatsapp': {
+            'text': (
+                "✅ Your {type} appointment has been confirmed!\n\n"
+                "📅 Date & Time: {appointment_time}\n"
+                "👨‍⚕️ Doctor: Dr. {doctor_name}\n"
+                "📍 Location: {location}\n\n"
+                "We'll send you a reminder 24 hours before your appointment."
+            )
+        },
+        'push': {
+            'title': "Appointment Confirmed",
+            'text': "Your appointment with Dr. {doctor_name} on {appointment_time} has been confirmed."
+        },
+        'email_patient': {
+            'subject': "Appointment Confirmation - MediRemind",
+            'html': "notifications/email/appointment_confirmation_patient.html"
+        },
+        'email_doctor': {
+            'subject': "New Appointment Request - MediRemind",
+            'html': "notifications/email/appointment_confirmation_doctor.html"
+        }
+    },
+    'reschedule': {
+        'sms': {
+            'text': "Your appointment with Dr. {doctor_name} has been rescheduled for {date} at {time}."
+        },
+        'whatsapp': {
+            'text': (
+                "📅 Your appointment has been rescheduled:\n\n"
+                "New Date & Time: {appointment_time}\n"
+                "Doctor: Dr. {doctor_name}\n"
+                "Location: {location}\n\n"
+                "Please reply:\n"
+                "1️⃣ to confirm new time\n"
+                "2️⃣ if this time doesn't work"
+            )
+        },
+        'push': {
+            'title': "Appointment Rescheduled",
+            'text': "Your appointment with Dr. {doctor_name} has been rescheduled to {appointment_time}."
+        },
+        'email_patient': {
+            'subject': "Appointment Reschedule - MediRemind",
+            'html': "notifications/email/appointment_reschedule_patient.html"
+        },
+        'email_doctor': {
+            'subject': "Appointment Reschedule - MediRemind",
+            'html': "notifications/email/appointment_reschedule_doctor.html"
+        }
+    },
+    'cancellation': {
+        'sms': {
+            'text': "Your appointment with Dr. {doctor_name} for {date} at {time} has been cancelled."
+        },
+        'whatsapp': {
+            'text': (
+                "❌ Your appointment with Dr. {doctor_name} scheduled for {appointment_time} "
+                "has been cancelled.\n\n"
+                "Please contact us to reschedule."
+            )
+        },
+        'push': {
+            'title': "Appointment Cancelled",
+            'text': "Your appointment with Dr. {doctor_name} on {appointment_time} has been cancelled."
+        },
+        'email_patient': {
+            'subject': "Appointment Cancellation - MediRemind",
+            'html': "notifications/email/appointment_cancellation_patient.html"
+        },
+        'email_doctor': {
+            'subject': "Appointment Cancellation - MediRemind",
+            'html': "notifications/email/appointment_cancellation_doctor.html"
+        }
+    },
+    'reminder': {
+        'sms': {
+            'text': "MediRemind: reminder of your appointment with Dr. {doctor_name} on {appointment_time} at {location}."
+        },
+        'whatsapp': {
+            'text': (
+                "🏥 Reminder: You have an appointment at {location} with Dr. {doctor_name} "
+                "on {appointment_time}.\n\n"
+                "Please reply with:\n"
+                "1️⃣ to confirm\n"
+                "2️⃣ to reschedule\n"
+                "3️⃣ to cancel"
+            )
+        },
+        'push': {
+            'title': "Upcoming Appointment Reminder",
+            'text': "You have an appointment with Dr. {doctor_name} on {appointment_time} at {location}"
+        },
+        'email_patient': {
+            'subject': "Appointment Reminder - MediRemind",
+            'text': (
+                "Hello {patient_name}, this is a reminder of your {type} appointment "
+                "with Dr. {doctor_name} on {appointment_time} at {location}."
+            )
+        }
+    }
+}
+
+# Fields the templates show only when set, so None stays empty instead of 'Unknown'
+OPTIONAL_FIELDS = ('notes',)
+
+class MessageContext(dict):
+    """Appointment data for rendering; fields that are missing or None render as 'Unknown'"""
+
+    def __init__(self, appointment_data):
+        super().__init__(
+            (key, ('' if key in OPTIONAL_FIELDS else "Unknown") if value is None else value)
+            for key, value in appointment_data.items()
+        )
+
+    def __missing__(self, key):
+        return "Unknown"
+
+class TextTemplate:
+    """A str.format template parsed once into literal text and field segments"""
+
+    def __init__(self, source):
+        self.source = source
+        self.segments = [
+            (literal, field, format_spec, conversion)
+            for literal, field, format_spec, conversion in Formatter().parse(source)
+        ]
+        self.fields = tuple(dict.fromkeys(field for _, field, _, _ in self.segments if field))
+
+    def render(self, context):
+        parts = []
+        for literal, field, format_spec, conversion in self.segments:
+            parts.append(literal)
+            if field is not None:
+                value = context[field]
+                if conversion == 'r':
+                    value = repr(value)
+                elif conversion == 's':
+                    value = str(value)
+                parts.append(format(value, format_spec or ''))
+        return ''.join(parts)
+
+class CompiledMessage:
+    """One event/channel message with its templates compiled"""
+
+    def __init__(self, definition, recipient=None):
+        self.title = TextTemplate(definition['title']) if 'title' in definition else None
+        self.subject = TextTemplate(definition['subject']) if 'subject' in definition else None
+        self.text = TextTemplate(definition['text']) if 'text' in definition else None
+        self.html = get_template(definition['html']) if 'html' in definition else None
+        self.recipient = recipient
+
+        # Text-only messages depend on just these fields, which lets
+        # render_many render each distinct combination once
+        self.fields = None if self.html else tuple(dict.fromkeys(
+            field for template in (self.title, self.subject, self.text) if template for field in template.fields
+        ))
+
+    def render(self, context):
+        """Render to a dict with 'text' and, where defined, 'title', 'subject' and 'html'"""
+        rendered = {}
+        if self.title:
+            rendered['title'] = self.title.render(context)
+        if self.subject:
+            rendered['subject'] = self.subject.render(context)
+        if self.html:
+            rendered['html'] = self.html.render({
+                'appointment': dict(context),
+                'recipient_name': context.get(f"{self.recipient}_name")
+            })
+        rendered['text'] = self.text.render(context) if self.text else strip_tags(rendered['html'])
+        return rendered
+
+class TemplateRegistry:
+    """Compiles MESSAGE_TEMPLATES once and renders messages for any channel"""
+
+    def __init__(self, definitions=None):
+        self.definitions = definitions or MESSAGE_TEMPLATES
+        self._compiled = None
+        self._lock = threading.Lock()
+
+    def compile(self):
+        """Compile every template; called once from NotificationsConfig.ready()"""
+        with self._lock:
+            if self._compiled is None:
+                self._compiled = {
+                    (event, channel): CompiledMessage(
+                        definition,
+                        recipient=channel.split('_', 1)[1] if channel.startswith('email_') else None
+                    )
+                    for event, channels in self.definitions.items()
+                    for channel, definition in channels.items()
+                }
+        return self._compiled
+
+    def get(self, event, channel):
+        """Return the compiled message, raising ValueError if there is none"""
+        compiled = self._compiled or self.compile()
+        try:
+            return compiled[(event, channel)]
+        except KeyError:
+            raise ValueError(f"No {channel} template for {event} notifications")
+
+    def render(self, event, appointment_data, channels):
+        """Render one appointment's message for several channels in one pass
+
+        Returns {channel: rendered message}.
+        """
+        context = MessageContext(appointment_data)
+        return {channel: self.get(event, channel).render(context) for channel in channels}
+
+    def render_many(self, event, channel, appointments):
+        """Render one channel's message for many appointments
+
+        Text-only messages are rendered once per distinct combination of the
+        fields they use, so a template that ignores per-patient fields is
+        rendered once for the whole batch. Returns a list in input order.
+        """
+        message = self.get(event, channel)
+        contexts = [MessageContext(appointment_data) for appointment_data in appointments]
+        if message.fields is None:
+            return [message.render(context) for context in contexts]
+
+        rendered = {}
+        results = []
+        for context in contexts:
+            key = tuple(context[field] for field in message.fields)
+            if key not in rendered:
+                rendered[key] = message.render(context)
+            results.append(rendered[key])
+        return results
+
+# Create a singleton instance
+message_templates = TemplateRegistry()
+
+__all__ = ['message_templates', 'TemplateRegistry', 'MESSAGE_TEMPLATES']
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_reminder_shard_run'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('appointment_id', models.CharField(max_length=255)),
+                ('channel', models.CharField(max_length=20)),
+                ('kind', models.CharField(max_length=50)),
+                ('send_window', models.CharField(max_length=64)),
+                ('sent_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('appointment_id', 'channel', 'kind', 'send_window')},
+            },
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 class PushSubscription(models.Model):
     """Model to store web push subscriptions"""
@@ -25,4 +26,72 @@ class PushSubscription(models.Model):
                 'p256dh': self.p256dh,
                 'auth': self.auth
             }
-        } 
\ No newline at end of file
+        } 
+
+class NotificationJob(models.Model):
+    """Outbox record for a notification waiting to be delivered by the worker"""
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_SENT = 'sent'
+    STATUS_DEAD = 'dead'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_PROCESSING, 'Processing'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_DEAD, 'Dead'),
+    ]
+
+    kind = models.CharField(max_length=50)  # 'confirmation' or 'update'
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)  # Set while a worker holds the job
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'])
+        ]
+
+    def to_job(self):
+        """Convert to the plain job dict shared by all outbox backends"""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'payload': self.payload,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'locked_at': self.locked_at
+        }
+
+class ReminderShardRun(models.Model):
+    """Lease and completion record for one shard of a day's reminder run"""
+    run_date = models.DateField()  # Appointment date being reminded
+    shard = models.PositiveIntegerField()
+    shard_count = models.PositiveIntegerField()
+    owner = models.CharField(max_length=255, blank=True, default='')  # Worker holding the lease
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)  # Set once the shard's reminders went out
+    summary = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('run_date', 'shard', 'shard_count')
+
+class NotificationLedgerEntry(models.Model):
+    """Record of a notification that was delivered, so reruns don't send it again"""
+    appointment_id = models.CharField(max_length=255)
+    channel = models.CharField(max_length=20)  # 'push', 'sms' or 'email'
+    kind = models.CharField(max_length=50)  # 'reminder'
+    send_window = models.CharField(max_length=64)  # Appointment date, time and doctor/location digest it was for
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # Also serves the bulk lookup by appointment_id
+        unique_together = ('appointment_id', 'channel', 'kind', 'send_window')
@@ -0,0 +1,251 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from supabase_client import admin_client
+from .models import NotificationJob
+from .dispatcher import notification_dispatcher
+from .utils import confirmation_tasks, update_tasks
+from .hydration import appointment_hydrator
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTBOX_SETTINGS = {
+    'BACKEND': 'database',
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_BASE': 30,
+    'BACKOFF_MAX': 3600,
+    'LEASE_SECONDS': 300
+}
+
+def get_outbox_settings():
+    return {**DEFAULT_OUTBOX_SETTINGS, **getattr(settings, 'NOTIFICATION_OUTBOX', {})}
+
+def backoff_delay(attempts):
+    """Exponential backoff in seconds after the given number of failed attempts"""
+    config = get_outbox_settings()
+    return min(config['BACKOFF_BASE'] * (2 ** max(attempts - 1, 0)), config['BACKOFF_MAX'])
+
+def _due_filter(now, stale_before):
+    """Pending jobs that are due, or processing jobs whose worker lease expired"""
+    return (
+        Q(status=NotificationJob.STATUS_PENDING, next_attempt_at__lte=now) |
+        Q(status=NotificationJob.STATUS_PROCESSING, locked_at__lt=stale_before)
+    )
+
+class DatabaseOutbox:
+    """Outbox stored in the local Django database (SQLite by default)"""
+
+    def enqueue(self, kind, payload):
+        job = NotificationJob.objects.create(
+            kind=kind,
+            payload=payload,
+            max_attempts=get_outbox_settings()['MAX_ATTEMPTS']
+        )
+        return job.id
+
+    def claim_due(self, limit):
+        """Claim up to `limit` due jobs, including jobs whose worker lease expired"""
+        now = timezone.now()
+        stale_before = now - timedelta(seconds=get_outbox_settings()['LEASE_SECONDS'])
+
+        candidates = NotificationJob.objects.filter(
+            _due_filter(now, stale_before)
+        ).order_by('next_attempt_at')[:limit]
+
+        claimed = []
+        for job in candidates:
+            # Conditional update so two workers never claim the same job
+            updated = NotificationJob.objects.filter(
+                pk=job.pk, status=job.status, locked_at=job.locked_at
+            ).update(status=NotificationJob.STATUS_PROCESSING, locked_at=now)
+            if updated:
+                job.status = NotificationJob.STATUS_PROCESSING
+                job.locked_at = now
+                claimed.append(job.to_job())
+        return claimed
+
+    def mark_sent(self, job, payload):
+        NotificationJob.objects.filter(pk=job['id']).update(
+            status=NotificationJob.STATUS_SENT,
+            payload=payload,
+            attempts=job['attempts'] + 1,
+            locked_at=None,
+            last_error=''
+        )
+
+    def mark_failed(self, job, error, payload):
+        attempts = job['attempts'] + 1
+        update = {
+            'payload': payload,
+            'attempts': attempts,
+            'locked_at': None,
+            'last_error': error
+        }
+        if attempts >= job['max_attempts']:
+            update['status'] = NotificationJob.STATUS_DEAD
+        else:
+            update['status'] = NotificationJob.STATUS_PENDING
+            update['next_attempt_at'] = timezone.now() + timedelta(seconds=backoff_delay(attempts))
+        NotificationJob.objects.filter(pk=job['id']).update(**update)
+        return update['status']
+
+class SupabaseOutbox:
+    """Outbox stored in the Supabase notification_jobs table"""
+
+    table = "notification_jobs"
+
+    def enqueue(self, kind, payload):
+        now = timezone.now().isoformat()
+        result = admin_client.table(self.table).insert({
+            'kind': kind,
+            'payload': payload,
+            'status': NotificationJob.STATUS_PENDING,
+            'attempts': 0,
+            'max_attempts': get_outbox_settings()['MAX_ATTEMPTS'],
+            'next_attempt_at': now,
+            'created_at': now,
+            'updated_at': now
+        }).execute()
+        return result.data[0]['id'] if result.data else None
+
+    def claim_due(self, limit):
+        """Claim up to `limit` due jobs, including jobs whose worker lease expired"""
+        now = timezone.now()
+        stale_before = now - timedelta(seconds=get_outbox_settings()['LEASE_SECONDS'])
+
+        due = admin_client.table(self.table).select("*").eq(
+            "status", NotificationJob.STATUS_PENDING
+        ).lte("next_attempt_at", now.isoformat()).order("next_attempt_at").limit(limit).execute()
+        stale = admin_client.table(self.table).select("*").eq(
+            "status", NotificationJob.STATUS_PROCESSING
+        ).lt("locked_at", stale_before.isoformat()).limit(limit).execute()
+
+        claimed = []
+        for row in ((due.data or []) + (stale.data or []))[:limit]:
+            # Conditional update so two workers never claim the same job
+            query = admin_client.table(self.table).update({
+                'status': NotificationJob.STATUS_PROCESSING,
+                'locked_at': now.isoformat(),
+                'updated_at': now.isoformat()
+            }).eq("id", row['id']).eq("status", row['status'])
+            if row.get('locked_at'):
+                query = query.eq("locked_at", row['locked_at'])
+            result = query.execute()
+            if result.data:
+                claimed.append(result.data[0])
+        return claimed
+
+    def mark_sent(self, job, payload):
+        admin_client.table(self.table).update({
+            'status': NotificationJob.STATUS_SENT,
+            'payload': payload,
+            'attempts': job['attempts'] + 1,
+            'locked_at': None,
+            'last_error': '',
+            'updated_at': timezone.now().isoformat()
+        }).eq("id", job['id']).execute()
+
+    def mark_failed(self, job, error, payload):
+        attempts = job['attempts'] + 1
+        update = {
+            'payload': payload,
+            'attempts': attempts,
+            'locked_at': None,
+            'last_error': error,
+            'updated_at': timezone.now().isoformat()
+        }
+        if attempts >= job['max_attempts']:
+            update['status'] = NotificationJob.STATUS_DEAD
+        else:
+            update['status'] = NotificationJob.STATUS_PENDING
+            update['next_attempt_at'] = (timezone.now() + timedelta(seconds=backoff_delay(attempts))).isoformat()
+        admin_client.table(self.table).update(update).eq("id", job['id']).execute()
+        return update['status']
+
+OUTBOX_BACKENDS = {
+    'database': DatabaseOutbox,
+    'supabase': SupabaseOutbox
+}
+
+def get_outbox():
+    """Return the outbox backend selected by settings.NOTIFICATION_OUTBOX['BACKEND']"""
+    backend = get_outbox_settings()['BACKEND']
+    if backend not in OUTBOX_BACKENDS:
+        raise ValueError(f"Unknown notification outbox backend: {backend}")
+    return OUTBOX_BACKENDS[backend]()
+
+def enqueue_notification(kind, **payload):
+    """Queue a notification job for the outbox worker instead of sending it inline"""
+    try:
+        job_id = get_outbox().enqueue(kind, payload)
+        return True, f"Notification job {job_id} queued"
+    except Exception as e:
+        logger.error(f"Error queueing {kind} notification: {str(e)}")
+        return False, str(e)
+
+def build_job_tasks(job, appointment_data):
+    """Build the dispatcher tasks for a job"""
+    payload = job['payload']
+    if job['kind'] == 'confirmation':
+        return confirmation_tasks(appointment_data, payload.get('patient_email'), payload.get('doctor_email'))
+    if job['kind'] == 'update':
+        return update_tasks(
+            appointment_data, payload['update_type'], payload.get('patient_email'), payload.get('doctor_email')
+        )
+    raise ValueError(f"Unknown notification job kind: {job['kind']}")
+
+def deliver_job(job):
+    """Deliver one job, skipping channels that already succeeded on an earlier attempt
+
+    Returns (success, message, payload) where payload records the delivered channels.
+    """
+    payload = dict(job['payload'])
+    appointment_data = appointment_hydrator.hydrate(payload.get('appointment_id'), payload.get('updated_at'))
+    if not appointment_data:
+        return False, "Appointment not found", payload
+
+    delivered = set(payload.get('delivered', []))
+    tasks = [task for task in build_job_tasks(job, appointment_data) if task[1] not in delivered]
+
+    result = notification_dispatcher.dispatch(tasks)
+    delivered.update(item['label'] for item in result.results if item['success'])
+    payload['delivered'] = sorted(delivered)
+
+    if result.failures:
+        errors = "; ".join(f"{item['label']}: {item['message']}" for item in result.failures)
+        return False, errors, payload
+    return True, result.summary(), payload
+
+def process_outbox(batch_size=50):
+    """Claim and deliver one batch of due jobs
+
+    Returns a dict with counts of claimed, sent, retried and dead jobs.
+    """
+    outbox = get_outbox()
+    stats = {'claimed': 0, 'sent': 0, 'retried': 0, 'dead': 0}
+
+    for job in outbox.claim_due(batch_size):
+        stats['claimed'] += 1
+        try:
+            success, message, payload = deliver_job(job)
+        except Exception as e:
+            success, message, payload = False, str(e), job['payload']
+
+        if success:
+            outbox.mark_sent(job, payload)
+            stats['sent'] += 1
+            continue
+
+        status = outbox.mark_failed(job, message, payload)
+        if status == NotificationJob.STATUS_DEAD:
+            logger.error(f"Notification job {job['id']} moved to dead-letter: {message}")
+            stats['dead'] += 1
+        else:
+            logger.warning(f"Notification job {job['id']} failed, will retry: {message}")
+            stats['retried'] += 1
+
+    return stats
+
+__all__ = ['enqueue_notification', 'process_outbox', 'get_outbox']
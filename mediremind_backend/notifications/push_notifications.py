@@ -1,11 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
+from py_vapid import Vapid
 from pywebpush import webpush, WebPushException
+from urllib.parse import urlparse
 import json
+import os
+import threading
+import time
 from pathlib import Path
 from supabase_client import admin_client
+from providers import providers
+from .message_templates import message_templates
 import base64
 from io import BytesIO
 
+# Signed VAPID tokens are valid this long and are re-signed this long before they expire
+VAPID_TOKEN_LIFETIME = 12 * 60 * 60
+VAPID_REFRESH_MARGIN = 5 * 60
+
+class VapidHeaderCache:
+    """Signed VAPID Authorization headers, one per push service origin
+
+    The audience is derived from each subscription's endpoint (FCM, Mozilla
+    autopush, Apple, ...), and the signed header is reused until shortly
+    before it expires, so a bulk run signs once per push service.
+    """
+
+    def __init__(self, private_key, subject, lifetime=VAPID_TOKEN_LIFETIME, refresh_margin=VAPID_REFRESH_MARGIN):
+        self.private_key = private_key
+        self.subject = subject
+        self.lifetime = lifetime
+        self.refresh_margin = refresh_margin
+        self._vapid = None
+        self._headers = {}
+        self._lock = threading.Lock()
+
+    def _get_vapid(self):
+        if self._vapid is None:
+            if os.path.isfile(self.private_key):
+                self._vapid = Vapid.from_file(private_key_file=self.private_key)
+            else:
+                self._vapid = Vapid.from_string(private_key=self.private_key)
+        return self._vapid
+
+    def headers_for(self, endpoint):
+        """Return the VAPID headers for a subscription endpoint"""
+        url = urlparse(endpoint)
+        audience = f"{url.scheme}://{url.netloc}"
+
+        entry = self._headers.get(audience)
+        if entry and entry[1] - self.refresh_margin > time.time():
+            return dict(entry[0])
+
+        with self._lock:
+            entry = self._headers.get(audience)
+            if not entry or entry[1] - self.refresh_margin <= time.time():
+                expires = int(time.time()) + self.lifetime
+                headers = self._get_vapid().sign({"sub": self.subject, "aud": audience, "exp": expires})
+                entry = self._headers[audience] = (headers, expires)
+        return dict(entry[0])
+
 class PushNotificationHandler:
     """Handler for web push notifications"""
     
@@ -14,64 +68,96 @@ class PushNotificationHandler:
         self.vapid_private_key = settings.WEBPUSH_SETTINGS.get('VAPID_PRIVATE_KEY')
         self.vapid_public_key = settings.WEBPUSH_SETTINGS.get('VAPID_PUBLIC_KEY')
         self.vapid_claims = {
-            "sub": f"mailto:{settings.WEBPUSH_SETTINGS.get('VAPID_ADMIN_EMAIL', 'admin@mediremind.com')}",
-            "aud": "https://fcm.googleapis.com"  # Required for Chrome/Firefox
+            "sub": f"mailto:{settings.WEBPUSH_SETTINGS.get('VAPID_ADMIN_EMAIL', 'admin@mediremind.com')}"
         }
         
         if not self.vapid_private_key or not self.vapid_public_key:
             raise ValueError("VAPID keys not properly configured in settings")
+
+        self.vapid_headers = VapidHeaderCache(self.vapid_private_key, self.vapid_claims["sub"])
+
+        self._pool = None
+        self._pool_lock = threading.Lock()
     
-    def send_push_notification(self, subscription_info, title, message, url=None, data=None):
-        """Send a push notification to a subscription"""
-        try:
-            if not subscription_info or not isinstance(subscription_info, dict):
-                raise ValueError("Invalid subscription info format")
-
-            if not subscription_info.get('endpoint') or not subscription_info.get('keys', {}).get('p256dh') or not subscription_info.get('keys', {}).get('auth'):
-                raise ValueError("Missing required subscription fields")
-
-            payload = {
-                "notification": {  # Standard notification format
-                    "title": title,
-                    "body": message,
-                    "icon": "/icon.png",  # Add your icon path
-                    "badge": "/badge.png",  # Add your badge path
-                    "vibrate": [100, 50, 100],
-                    "data": {
-                        "url": url,
-                        **data
-                    } if data else {"url": url}
-                }
+    def build_payload(self, title, message, url=None, data=None):
+        """Build the notification payload sent to the service worker"""
+        return {
+            "notification": {  # Standard notification format
+                "title": title,
+                "body": message,
+                "icon": "/icon.png",  # Add your icon path
+                "badge": "/badge.png",  # Add your badge path
+                "vibrate": [100, 50, 100],
+                "data": {
+                    "url": url,
+                    **data
+                } if data else {"url": url}
             }
-            
-            print(f"Sending push notification with payload: {payload}")
-            print(f"Using subscription: {subscription_info}")
-            
-            response = webpush(
+        }
+
+    def validate_subscription(self, subscription_info):
+        """Raise ValueError unless subscription_info has an endpoint and both keys"""
+        if not subscription_info or not isinstance(subscription_info, dict):
+            raise ValueError("Invalid subscription info format")
+
+        if not subscription_info.get('endpoint') or not subscription_info.get('keys', {}).get('p256dh') or not subscription_info.get('keys', {}).get('auth'):
+            raise ValueError("Missing required subscription fields")
+
+    def deliver(self, subscription_info, body):
+        """Send an already serialized payload to one subscription
+
+        Returns (success, message, expired) where expired is True when the
+        push service reported the subscription gone (410).
+        """
+        try:
+            self.validate_subscription(subscription_info)
+
+            # VAPID headers come from the cache, so webpush does no signing itself
+            webpush(
                 subscription_info=subscription_info,
-                data=json.dumps(payload),
-                vapid_private_key=self.vapid_private_key,
-                vapid_claims=self.vapid_claims
+                data=body,
+                headers=self.vapid_headers.headers_for(subscription_info["endpoint"])
             )
-            
-            print(f"Push notification sent successfully: {response}")
-            return True, "Push notification sent successfully"
+            return True, "Push notification sent successfully", False
             
         except WebPushException as e:
             print(f"WebPush error: {str(e)}")
-            if e.response and e.response.status_code == 410:
-                # Subscription has expired or been unsubscribed
-                try:
-                    admin_client.table("push_subscriptions").delete().eq("endpoint", subscription_info["endpoint"]).execute()
-                except Exception as del_e:
-                    print(f"Error deleting expired subscription: {str(del_e)}")
-            return False, str(e)
+            # 410 means the subscription has expired or been unsubscribed
+            return False, str(e), bool(e.response is not None and e.response.status_code == 410)
         except ValueError as e:
             print(f"Validation error: {str(e)}")
-            return False, str(e)
+            return False, str(e), False
         except Exception as e:
             print(f"Error sending push notification: {str(e)}")
-            return False, str(e)
+            return False, str(e), False
+
+    def send_push_notification(self, subscription_info, title, message, url=None, data=None):
+        """Send a push notification to a subscription"""
+        body = json.dumps(self.build_payload(title, message, url=url, data=data))
+        success, result, expired = self.deliver(subscription_info, body)
+        if expired:
+            self.delete_subscriptions([subscription_info["endpoint"]])
+        return success, result
+
+    def delete_subscriptions(self, endpoints):
+        """Remove expired subscriptions in one query"""
+        if not endpoints:
+            return
+        try:
+            admin_client.table("push_subscriptions").delete().in_("endpoint", list(endpoints)).execute()
+        except Exception as e:
+            print(f"Error deleting expired subscriptions: {str(e)}")
+
+    def _get_pool(self):
+        """Create the fan-out pool on first use"""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=getattr(settings, 'PUSH_FANOUT_WORKERS', 8),
+                        thread_name_prefix="push-fanout"
+                    )
+        return self._pool
     
     def get_user_subscriptions(self, user_id):
         """Get all push subscriptions for a user from Supabase"""
@@ -102,6 +188,35 @@ class PushNotificationHandler:
             print(f"Error getting user subscriptions: {str(e)}")
             return []
     
+    def get_subscriptions_for_users(self, user_ids, chunk_size=200):
+        """Get push subscriptions for many users at once, keyed by user ID"""
+        subscriptions_by_user = {}
+        user_ids = [user_id for user_id in dict.fromkeys(user_ids) if user_id]
+        if not user_ids:
+            return subscriptions_by_user
+
+        try:
+            # Chunk the in_ filter so the PostgREST URL stays a reasonable length
+            for start in range(0, len(user_ids), chunk_size):
+                chunk = user_ids[start:start + chunk_size]
+                result = admin_client.table("push_subscriptions").select(
+                    "user_id, endpoint, p256dh, auth"
+                ).in_("user_id", chunk).execute()
+
+                for sub in result.data or []:
+                    subscriptions_by_user.setdefault(sub['user_id'], []).append({
+                        'endpoint': sub['endpoint'],
+                        'keys': {
+                            'p256dh': sub['p256dh'],
+                            'auth': sub['auth']
+                        }
+                    })
+
+            return subscriptions_by_user
+        except Exception as e:
+            print(f"Error getting subscriptions for users: {str(e)}")
+            return subscriptions_by_user
+
     def send_to_user(self, user_id, title, message, url=None, data=None):
         """Send push notification to all user's subscriptions"""
         try:
@@ -112,86 +227,94 @@ class PushNotificationHandler:
             if not subscriptions:
                 return False, "No push subscriptions found for user"
 
-            success = False
-            errors = []
-            for subscription in subscriptions:
-                # Try sending to each subscription
-                push_success, push_message = self.send_push_notification(
-                    subscription_info=subscription,
-                    title=title,
-                    message=message,
-                    url=url,
-                    data=data
-                )
-                if push_success:
-                    success = True
-                else:
-                    errors.append(push_message)
-
-            if success:
-                return True, "Push notification sent successfully to at least one subscription"
+            return self.send_to_subscriptions(subscriptions, title, message, url=url, data=data)
+        except Exception as e:
+            return False, str(e)
+
+    def send_to_subscriptions(self, subscriptions, title, message, url=None, data=None):
+        """Send push notification to an already loaded list of subscriptions
+
+        The payload is serialized once and delivered to all subscriptions
+        concurrently on a pool of PUSH_FANOUT_WORKERS threads. Subscriptions
+        the push service reports as gone are deleted in one batch afterwards.
+        """
+        try:
+            if not subscriptions:
+                return False, "No push subscriptions found for user"
+
+            body = json.dumps(self.build_payload(title, message, url=url, data=data))
+            if len(subscriptions) == 1:
+                results = [self.deliver(subscriptions[0], body)]
             else:
-                error_msg = "; ".join(errors) if errors else "Failed to send to all subscriptions"
-                return False, error_msg
+                results = list(self._get_pool().map(lambda subscription: self.deliver(subscription, body), subscriptions))
+
+            self.delete_subscriptions([
+                subscription["endpoint"]
+                for subscription, (_, _, expired) in zip(subscriptions, results) if expired
+            ])
+
+            if any(success for success, _, _ in results):
+                return True, "Push notification sent successfully to at least one subscription"
+
+            errors = [message for success, message, _ in results if not success]
+            error_msg = "; ".join(errors) if errors else "Failed to send to all subscriptions"
+            return False, error_msg
         except Exception as e:
             return False, str(e)
     
-    def send_appointment_reminder_push(self, user_id, appointment_data):
-        """Send appointment reminder push notification"""
+    def build_appointment_reminder(self, appointment_data):
+        """Build the title, message, url and data for an appointment reminder"""
+        reminder = message_templates.render('reminder', appointment_data, ['push'])['push']
+        return {
+            "title": reminder['title'],
+            "message": reminder['text'],
+            "url": "/appointments",  # Frontend URL for appointments page
+            "data": {"appointment_id": appointment_data.get("id")}
+        }
+
+    def send_appointment_reminder_push(self, user_id, appointment_data, subscriptions=None):
+        """Send appointment reminder push notification
+
+        Pass preloaded subscriptions to skip the per-user subscription lookup.
+        """
         if not user_id or not appointment_data:
             return False, "User ID and appointment data are required"
-            
-        title = "Upcoming Appointment Reminder"
-        message = (
-            f"You have an appointment with Dr. {appointment_data.get('doctor_name', 'Unknown')} "
-            f"on {appointment_data.get('appointment_time', 'Unknown')} at {appointment_data.get('location', 'Unknown')}"
-        )
-        url = "/appointments"  # Frontend URL for appointments page
-        
-        return self.send_to_user(
-            user_id=user_id,
-            title=title,
-            message=message,
-            url=url,
-            data={"appointment_id": appointment_data.get("id")}
-        )
+
+        reminder = self.build_appointment_reminder(appointment_data)
+
+        if subscriptions is not None:
+            return self.send_to_subscriptions(subscriptions, **reminder)
+
+        return self.send_to_user(user_id=user_id, **reminder)
     
+    def build_appointment_update(self, appointment_data, update_type):
+        """Build the title, message, url and data for an appointment update
+
+        Returns None for an unknown update type.
+        """
+        if update_type not in ('confirmation', 'reschedule', 'cancellation'):
+            return None
+
+        update = message_templates.render(update_type, appointment_data, ['push'])['push']
+        return {
+            "title": update['title'],
+            "message": update['text'],
+            "url": f"/appointments/{appointment_data.get('id')}",
+            "data": {"appointment_id": appointment_data.get("id")}
+        }
+
     def send_appointment_update_push(self, user_id, appointment_data, update_type):
         """Send appointment update push notification"""
         if not user_id or not appointment_data or not update_type:
             return False, "User ID, appointment data, and update type are required"
 
-        if update_type == "confirmation":
-            title = "Appointment Confirmed"
-            message = (
-                f"Your appointment with Dr. {appointment_data.get('doctor_name', 'Unknown')} "
-                f"on {appointment_data.get('appointment_time', 'Unknown')} has been confirmed."
-            )
-        elif update_type == "cancellation":
-            title = "Appointment Cancelled"
-            message = (
-                f"Your appointment with Dr. {appointment_data.get('doctor_name', 'Unknown')} "
-                f"on {appointment_data.get('appointment_time', 'Unknown')} has been cancelled."
-            )
-        elif update_type == "reschedule":
-            title = "Appointment Rescheduled"
-            message = (
-                f"Your appointment with Dr. {appointment_data.get('doctor_name', 'Unknown')} "
-                f"has been rescheduled to {appointment_data.get('appointment_time', 'Unknown')}."
-            )
-        else:
+        update = self.build_appointment_update(appointment_data, update_type)
+        if not update:
             return False, "Invalid update type"
         
-        url = f"/appointments/{appointment_data.get('id')}"
-        
-        return self.send_to_user(
-            user_id=user_id,
-            title=title,
-            message=message,
-            url=url,
-            data={"appointment_id": appointment_data.get("id")}
-        )
-
-push_notifications = PushNotificationHandler()
+        return self.send_to_user(user_id=user_id, **update)
+
+# Create a singleton instance, built on first use
+push_notifications = providers.register('push', PushNotificationHandler)
 
 __all__ = ['push_notifications'] 
\ No newline at end of file
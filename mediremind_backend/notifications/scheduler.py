@@ -0,0 +1,174 @@
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from supabase_client import admin_client
+from .models import ReminderShardRun
+from .async_clients import run_async
+from .utils import send_upcoming_appointment_reminders, send_upcoming_appointment_reminders_async
+import logging
+import os
+import socket
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCHEDULER_SETTINGS = {
+    'BACKEND': 'database',
+    'SHARDS': 1,
+    'LEASE_SECONDS': 900
+}
+
+# Outcomes of trying to take a shard lease
+LEASE_ACQUIRED = 'acquired'
+LEASE_HELD = 'held'  # Another worker is running the shard
+LEASE_COMPLETED = 'completed'  # The shard's reminders already went out
+
+def get_scheduler_settings():
+    return {**DEFAULT_SCHEDULER_SETTINGS, **getattr(settings, 'REMINDER_SCHEDULER', {})}
+
+def default_owner():
+    """Identify this worker in lease records"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class DatabaseShardLeases:
+    """Shard leases stored in the local Django database (SQLite by default)
+
+    Only workers sharing the database file are coordinated, so use the
+    supabase backend when workers run on separate machines.
+    """
+
+    def acquire(self, run_date, shard, shard_count, owner):
+        now = timezone.now()
+        run, _ = ReminderShardRun.objects.get_or_create(run_date=run_date, shard=shard, shard_count=shard_count)
+        if run.completed_at:
+            return LEASE_COMPLETED
+
+        # Conditional update so two workers never hold the same shard
+        updated = ReminderShardRun.objects.filter(pk=run.pk, completed_at__isnull=True).filter(
+            Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now)
+        ).update(
+            owner=owner,
+            lease_expires_at=now + timedelta(seconds=get_scheduler_settings()['LEASE_SECONDS'])
+        )
+        return LEASE_ACQUIRED if updated else LEASE_HELD
+
+    def complete(self, run_date, shard, shard_count, owner, summary):
+        return bool(ReminderShardRun.objects.filter(
+            run_date=run_date, shard=shard, shard_count=shard_count, owner=owner
+        ).update(completed_at=timezone.now(), lease_expires_at=None, summary=summary))
+
+    def release(self, run_date, shard, shard_count, owner):
+        ReminderShardRun.objects.filter(
+            run_date=run_date, shard=shard, shard_count=shard_count, owner=owner, completed_at__isnull=True
+        ).update(lease_expires_at=None)
+
+class SupabaseShardLeases:
+    """Shard leases stored in the Supabase reminder_shard_runs table"""
+
+    table = "reminder_shard_runs"
+
+    def _filter(self, query, run_date, shard, shard_count):
+        return query.eq("run_date", run_date).eq("shard", shard).eq("shard_count", shard_count)
+
+    def acquire(self, run_date, shard, shard_count, owner):
+        now = timezone.now()
+
+        # Create the row if this is the first worker to reach the shard
+        admin_client.table(self.table).upsert({
+            'run_date': run_date,
+            'shard': shard,
+            'shard_count': shard_count
+        }, on_conflict="run_date,shard,shard_count", ignore_duplicates=True).execute()
+
+        # Conditional update so two workers never hold the same shard
+        result = self._filter(admin_client.table(self.table).update({
+            'owner': owner,
+            'lease_expires_at': (now + timedelta(seconds=get_scheduler_settings()['LEASE_SECONDS'])).isoformat(),
+            'updated_at': now.isoformat()
+        }), run_date, shard, shard_count).is_("completed_at", "null").or_(
+            f"lease_expires_at.is.null,lease_expires_at.lt.{now.isoformat()}"
+        ).execute()
+        if result.data:
+            return LEASE_ACQUIRED
+
+        run = self._filter(
+            admin_client.table(self.table).select("completed_at"), run_date, shard, shard_count
+        ).execute()
+        return LEASE_COMPLETED if run.data and run.data[0].get('completed_at') else LEASE_HELD
+
+    def complete(self, run_date, shard, shard_count, owner, summary):
+        now = timezone.now().isoformat()
+        result = self._filter(admin_client.table(self.table).update({
+            'completed_at': now,
+            'lease_expires_at': None,
+            'summary': summary,
+            'updated_at': now
+        }), run_date, shard, shard_count).eq("owner", owner).execute()
+        return bool(result.data)
+
+    def release(self, run_date, shard, shard_count, owner):
+        self._filter(admin_client.table(self.table).update({
+            'lease_expires_at': None,
+            'updated_at': timezone.now().isoformat()
+        }), run_date, shard, shard_count).eq("owner", owner).is_("completed_at", "null").execute()
+
+LEASE_BACKENDS = {
+    'database': DatabaseShardLeases,
+    'supabase': SupabaseShardLeases
+}
+
+def get_shard_leases():
+    """Return the lease backend selected by settings.REMINDER_SCHEDULER['BACKEND']"""
+    backend = get_scheduler_settings()['BACKEND']
+    if backend not in LEASE_BACKENDS:
+        raise ValueError(f"Unknown reminder scheduler backend: {backend}")
+    return LEASE_BACKENDS[backend]()
+
+def run_reminder_shards(date_str=None, shard_count=None, shards=None, owner=None, use_async=False):
+    """Send a day's reminders shard by shard, holding a lease on each shard
+
+    Appointments are split into shard_count shards by a hash of their ID.
+    Any number of workers can call this at once: each shard is sent by
+    whichever worker leases it first, and shards that already completed are
+    skipped, so overlapping or repeated runs don't double-send. A shard
+    whose run fails is released for another worker to retry.
+
+    Returns one dict per shard with 'shard', 'status' and 'message'.
+    """
+    shard_count = shard_count or get_scheduler_settings()['SHARDS']
+    date_str = date_str or (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+    owner = owner or default_owner()
+    leases = get_shard_leases()
+
+    results = []
+    for shard in (shards if shards is not None else range(shard_count)):
+        if not 0 <= shard < shard_count:
+            raise ValueError(f"Shard {shard} is out of range for {shard_count} shards")
+
+        status = leases.acquire(date_str, shard, shard_count, owner)
+        if status != LEASE_ACQUIRED:
+            results.append({'shard': shard, 'status': status, 'message': ''})
+            continue
+
+        try:
+            if use_async:
+                success, message = run_async(send_upcoming_appointment_reminders_async(date_str, shard, shard_count))
+            else:
+                success, message = send_upcoming_appointment_reminders(date_str, shard, shard_count)
+        except Exception as e:
+            success, message = False, str(e)
+
+        if not success:
+            leases.release(date_str, shard, shard_count, owner)
+            logger.error(f"Reminder shard {shard}/{shard_count} for {date_str} failed: {message}")
+            results.append({'shard': shard, 'status': 'failed', 'message': message})
+            continue
+
+        if not leases.complete(date_str, shard, shard_count, owner, message):
+            # The lease expired mid-run and another worker took the shard over
+            logger.warning(f"Reminder shard {shard}/{shard_count} for {date_str} finished after its lease expired")
+        results.append({'shard': shard, 'status': 'sent', 'message': message})
+
+    return results
+
+__all__ = ['run_reminder_shards', 'get_shard_leases', 'LEASE_ACQUIRED', 'LEASE_HELD', 'LEASE_COMPLETED']
@@ -0,0 +1,382 @@
+from unittest import mock
+from django.core import mail
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from datetime import date, timedelta
+from smtplib import SMTPServerDisconnected
+import dataclasses
+import http.server
+import json
+import os
+import threading
+import time
+from providers import providers
+from .beem_client import BeemClient
+from .email_client import EmailClient, EmailConnectionPool
+from .hydration import AppointmentHydrator, NotificationContext
+from .ledger import notification_key, record_notifications, sent_notifications
+from .message_templates import TemplateRegistry
+from .models import ReminderShardRun
+from .scheduler import DatabaseShardLeases, LEASE_ACQUIRED, LEASE_COMPLETED, LEASE_HELD
+
+class StubBeemHandler(http.server.BaseHTTPRequestHandler):
+    """Answers each POST with the next status code in server.statuses"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        server = self.server
+        server.requests += 1
+        status = server.statuses.pop(0) if server.statuses else 200
+
+        body = json.dumps({"successful": status == 200, "request_id": server.requests}).encode()
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '0')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class BeemClientRetryTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StubBeemHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.requests = 0
+        self.server.statuses = []
+        url = f"http://127.0.0.1:{self.server.server_address[1]}/v1/send"
+        environment = mock.patch.dict(os.environ, {
+            "BEEM_API_KEY": "key",
+            "BEEM_SECRET_KEY": "secret",
+            "BEEM_SMS_URL": url,
+            "BEEM_MAX_RETRIES": "2",
+            "BEEM_BACKOFF_BASE": "0.001"
+        })
+        environment.start()
+        self.addCleanup(environment.stop)
+        self.client = BeemClient()
+
+    def test_server_error_is_retried(self):
+        self.server.statuses = [503]
+
+        success, _ = self.client.send_sms("255700000001", "hello")
+
+        self.assertTrue(success)
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(self.client.metrics.snapshot()["sms"]["retries"], 1)
+
+    def test_rate_limit_is_retried(self):
+        self.server.statuses = [429, 429]
+
+        success, _ = self.client.send_sms("255700000001", "hello")
+
+        self.assertTrue(success)
+        self.assertEqual(self.server.requests, 3)
+
+    def test_gives_up_after_max_retries(self):
+        self.server.statuses = [500, 502, 504, 200]
+
+        success, _ = self.client.send_sms("255700000001", "hello")
+
+        self.assertFalse(success)
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(self.client.metrics.snapshot()["sms"]["errors"], 1)
+
+    def test_client_error_is_not_retried(self):
+        self.server.statuses = [400]
+
+        success, _ = self.client.send_sms("255700000001", "hello")
+
+        self.assertFalse(success)
+        self.assertEqual(self.server.requests, 1)
+
+    def test_bulk_sms_shares_requests_only_for_identical_text(self):
+        results = self.client.send_bulk_sms([
+            ("a1", "255700000001", "Clinic closed tomorrow"),
+            ("a2", "255700000002", "Clinic closed tomorrow"),
+            ("a3", "255700000003", "Your appointment with Dr. Juma is at 09:00")
+        ])
+
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(set(results), {"a1", "a2", "a3"})
+        self.assertEqual(results["a1"], results["a2"])
+
+    def test_bulk_sms_failure_is_shared_by_the_request(self):
+        self.server.statuses = [400]
+
+        results = self.client.send_bulk_sms([
+            ("a1", "255700000001", "Clinic closed tomorrow"),
+            ("a2", "255700000002", "Clinic closed tomorrow")
+        ])
+
+        self.assertEqual([success for success, _ in results.values()], [False, False])
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class EmailConnectionPoolTests(SimpleTestCase):
+    def test_connection_is_reused(self):
+        pool = EmailConnectionPool(size=2, max_idle=60)
+
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+
+        self.assertIs(first, second)
+        self.assertEqual(len(pool._idle), 1)
+
+    def test_idle_connection_is_replaced(self):
+        pool = EmailConnectionPool(size=2, max_idle=60)
+        with pool.connection() as first:
+            pass
+
+        with mock.patch('notifications.email_client.time.monotonic', return_value=time.monotonic() + 61):
+            with pool.connection() as second:
+                pass
+
+        self.assertIsNot(first, second)
+        self.assertEqual(len(pool._idle), 1)
+
+    def test_failed_connection_is_discarded(self):
+        pool = EmailConnectionPool(size=2, max_idle=60)
+
+        with self.assertRaises(RuntimeError):
+            with pool.connection():
+                raise RuntimeError("send failed")
+
+        self.assertEqual(pool._idle, [])
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    EMAIL_HOST_USER='mediremind',
+    EMAIL_HOST_PASSWORD='password'
+)
+class EmailBatchTests(SimpleTestCase):
+    def setUp(self):
+        self.pool = EmailConnectionPool(size=1, max_idle=60)
+        patcher = mock.patch('notifications.email_client.email_connection_pool', self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _messages(self, count):
+        return [
+            (f"appointment-{index}", EmailClient.build_message("Reminder", "See you", [f"patient{index}@example.com"]))
+            for index in range(count)
+        ]
+
+    def test_batch_results_are_keyed_by_message(self):
+        results = EmailClient.send_batch(self._messages(5), batch_size=2)
+
+        self.assertEqual(set(results), {f"appointment-{index}" for index in range(5)})
+        self.assertTrue(all(success for success, _ in results.values()))
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(len(self.pool._idle), 1)
+
+    def test_failed_batch_fails_only_its_messages(self):
+        send_messages = self.pool.send_messages
+        calls = []
+
+        def fail_second_batch(messages):
+            calls.append(messages)
+            if len(calls) == 2:
+                raise ConnectionError("SMTP down")
+            return send_messages(messages)
+
+        with mock.patch.object(self.pool, 'send_messages', side_effect=fail_second_batch):
+            results = EmailClient.send_batch(self._messages(5), batch_size=2)
+
+        failed = {key for key, (success, _) in results.items() if not success}
+        self.assertEqual(failed, {"appointment-2", "appointment-3"})
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_empty_batch(self):
+        self.assertEqual(EmailClient.send_batch([]), {})
+
+    def _drop_connections_after(self, *limits):
+        """Make each new connection drop after sending the given number of messages"""
+        limits = list(limits)
+
+        def get_connection(**kwargs):
+            connection = mail.get_connection(**kwargs)
+            limit = limits.pop(0) if limits else None
+            send_messages = connection.send_messages
+
+            def flaky_send_messages(messages):
+                if limit is not None and len(mail.outbox) >= limit:
+                    raise SMTPServerDisconnected("Connection unexpectedly closed")
+                return send_messages(messages)
+
+            connection.send_messages = flaky_send_messages
+            return connection
+
+        return self.enterContext(mock.patch('notifications.email_client.get_connection', side_effect=get_connection))
+
+    def test_dropped_connection_resumes_with_unsent_messages(self):
+        get_connection = self._drop_connections_after(2)
+        results = EmailClient.send_batch(self._messages(5), batch_size=5)
+
+        self.assertTrue(all(success for success, _ in results.values()))
+        self.assertEqual([email.to[0] for email in mail.outbox], [f"patient{index}@example.com" for index in range(5)])
+        self.assertEqual(get_connection.call_count, 2)
+        self.assertEqual(len(self.pool._idle), 1)
+
+    def test_connection_dropped_again_after_progress_resumes_again(self):
+        self._drop_connections_after(1, 3)
+        self.assertEqual(self.pool.send_messages([email for _, email in self._messages(4)]), 4)
+        self.assertEqual(len(mail.outbox), 4)
+
+    def test_fresh_connection_dropped_without_progress_fails_unsent_messages(self):
+        self._drop_connections_after(2, 2)
+        results = EmailClient.send_batch(self._messages(4), batch_size=4)
+
+        failed = {key for key, (success, _) in results.items() if not success}
+        self.assertEqual(failed, {"appointment-2", "appointment-3"})
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(self.pool._idle, [])
+
+class DatabaseShardLeaseTests(TestCase):
+    def setUp(self):
+        self.leases = DatabaseShardLeases()
+        self.shard = (date(2026, 1, 5), 0, 2)
+
+    def test_free_shard_is_acquired(self):
+        self.assertEqual(self.leases.acquire(*self.shard, "worker-a"), LEASE_ACQUIRED)
+
+        run = ReminderShardRun.objects.get()
+        self.assertEqual(run.owner, "worker-a")
+        self.assertGreater(run.lease_expires_at, timezone.now())
+
+    def test_leased_shard_is_held(self):
+        self.leases.acquire(*self.shard, "worker-a")
+
+        self.assertEqual(self.leases.acquire(*self.shard, "worker-b"), LEASE_HELD)
+        self.assertEqual(ReminderShardRun.objects.get().owner, "worker-a")
+
+    def test_completed_shard_is_not_rerun(self):
+        self.leases.acquire(*self.shard, "worker-a")
+        self.assertTrue(self.leases.complete(*self.shard, "worker-a", "5 sent"))
+
+        self.assertEqual(self.leases.acquire(*self.shard, "worker-b"), LEASE_COMPLETED)
+        self.assertEqual(self.leases.acquire(*self.shard, "worker-a"), LEASE_COMPLETED)
+
+    def test_expired_lease_is_taken_over(self):
+        self.leases.acquire(*self.shard, "worker-a")
+        ReminderShardRun.objects.update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(self.leases.acquire(*self.shard, "worker-b"), LEASE_ACQUIRED)
+        self.assertEqual(ReminderShardRun.objects.get().owner, "worker-b")
+        # The worker that lost its lease can no longer complete the shard
+        self.assertFalse(self.leases.complete(*self.shard, "worker-a", "5 sent"))
+
+    def test_released_shard_can_be_acquired(self):
+        self.leases.acquire(*self.shard, "worker-a")
+        self.leases.release(*self.shard, "worker-a")
+
+        self.assertEqual(self.leases.acquire(*self.shard, "worker-b"), LEASE_ACQUIRED)
+
+    def test_shards_are_leased_independently(self):
+        self.leases.acquire(*self.shard, "worker-a")
+        self.assertEqual(self.leases.acquire(date(2026, 1, 5), 1, 2, "worker-b"), LEASE_ACQUIRED)
+
+PATIENT_ID = "00000000-0000-0000-0000-000000000011"
+DOCTOR_ID = "00000000-0000-0000-0000-000000000001"
+OTHER_DOCTOR_ID = "00000000-0000-0000-0000-000000000002"
+
+def appointment_row(patient_phone, updated_at="2026-03-01T08:00:00+00:00"):
+    return {
+        "id": "a1", "patient_id": PATIENT_ID, "doctor_id": DOCTOR_ID,
+        "date": "2026-03-02", "time": "09:00:00", "updated_at": updated_at,
+        "patient": {"full_name": "Ana Mushi", "phone": patient_phone, "email": "ana@example.com"},
+        "doctor": {"full_name": "Juma", "email": "juma@example.com"}
+    }
+
+class AppointmentHydratorTests(SimpleTestCase):
+    def setUp(self):
+        self.data_store = self.enterContext(providers.override('data_store', mock.Mock()))
+        self.data_store.appointments_with_parties.return_value = [appointment_row("255700000001")]
+        self.hydrator = AppointmentHydrator()
+
+    def test_context_is_cached(self):
+        self.hydrator.hydrate("a1")
+        self.assertEqual(self.hydrator.hydrate("a1")["patient_phone"], "255700000001")
+        self.data_store.appointments_with_parties.assert_called_once()
+
+    def test_profile_change_drops_cached_contexts(self):
+        self.hydrator.hydrate("a1")
+        self.data_store.appointments_with_parties.return_value = [appointment_row("255700000002")]
+
+        for user_id in (PATIENT_ID, DOCTOR_ID):
+            with self.subTest(user_id=user_id):
+                self.hydrator.invalidate_user(user_id)
+                self.assertEqual(self.hydrator.hydrate("a1")["patient_phone"], "255700000002")
+
+    def test_profile_change_rebuilds_contexts_for_unchanged_rows(self):
+        self.data_store.appointments_on_date.return_value = [appointment_row("255700000001")]
+        self.hydrator.hydrate_date("2026-03-02")
+
+        # Same appointments.updated_at, new profile
+        self.data_store.appointments_on_date.return_value = [appointment_row("255700000002")]
+        self.hydrator.invalidate_user(PATIENT_ID)
+
+        self.assertEqual(self.hydrator.hydrate_date("2026-03-02")[0]["patient_phone"], "255700000002")
+
+class MessageTemplateTests(SimpleTestCase):
+    def setUp(self):
+        self.templates = TemplateRegistry()
+        self.appointment = {
+            "patient_name": "Ana Mushi", "doctor_name": None, "appointment_time": "Monday, March 02 at 09:00 AM",
+            "date": "2026-03-02", "time": "09:00", "type": "consultation", "notes": None
+        }
+
+    def test_missing_and_none_fields_render_as_unknown(self):
+        text = self.templates.render('reminder', self.appointment, ['push'])['push']['text']
+        self.assertEqual(text, "You have an appointment with Dr. Unknown on Monday, March 02 at 09:00 AM at Unknown")
+
+    def test_render_many_matches_render(self):
+        rendered = self.templates.render_many('reminder', 'sms', [self.appointment, dict(self.appointment, doctor_name="Juma")])
+        self.assertIn("Dr. Unknown", rendered[0]['text'])
+        self.assertIn("Dr. Juma", rendered[1]['text'])
+
+    def test_empty_notes_are_left_out_of_emails(self):
+        html = self.templates.render('confirmation', self.appointment, ['email_patient'])['email_patient']['html']
+        self.assertIn("Unknown", html)
+        self.assertNotIn("Notes:", html)
+        self.assertNotIn("None", html)
+
+class NotificationLedgerTests(TestCase):
+    def setUp(self):
+        self.context = NotificationContext.from_row(appointment_row("255700000001"))
+
+    def notified(self, context):
+        return notification_key(context, 'sms') in sent_notifications('reminder', [context])
+
+    def test_sent_notification_is_not_repeated(self):
+        record_notifications('reminder', [notification_key(self.context, 'sms')])
+
+        self.assertTrue(self.notified(self.context))
+        self.assertFalse(notification_key(self.context, 'push') in sent_notifications('reminder', [self.context]))
+
+    def test_changes_the_patient_sees_are_notified_again(self):
+        record_notifications('reminder', [notification_key(self.context, 'sms')])
+
+        for change in ({"time": "10:00:00"}, {"date": "2026-03-03"}, {"doctor_id": OTHER_DOCTOR_ID}, {"location": "Annex"}):
+            with self.subTest(change=change):
+                self.assertFalse(self.notified(dataclasses.replace(self.context, **change)))
+
+    def test_other_edits_are_not_notified_again(self):
+        record_notifications('reminder', [notification_key(self.context, 'sms')])
+
+        changed = dataclasses.replace(self.context, notes="Bring lab results", updated_at="2026-03-01T09:00:00+00:00")
+        self.assertTrue(self.notified(changed))
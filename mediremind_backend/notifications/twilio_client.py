@@ -1,10 +1,16 @@
 import os
-from twilio.rest import Client
-from dotenv import load_dotenv
 from datetime import datetime
 import pytz
+from providers import providers
+from .message_templates import MESSAGE_TEMPLATES, message_templates
 
-load_dotenv()
+# WhatsApp template names and the notification events they come from
+TEMPLATE_EVENTS = {
+    'appointment_reminder': 'reminder',
+    'appointment_confirmation': 'confirmation',
+    'appointment_cancelled': 'cancellation',
+    'appointment_rescheduled': 'reschedule'
+}
 
 class TwilioClient:
     """Client for handling WhatsApp messaging via Twilio"""
@@ -16,7 +22,9 @@ class TwilioClient:
         
         if not all([self.account_sid, self.auth_token, self.whatsapp_from]):
             raise ValueError("Twilio credentials not found in environment variables")
-            
+
+        # twilio.rest is slow to import, so only pay for it once a client is built
+        from twilio.rest import Client
         self.client = Client(self.account_sid, self.auth_token)
     
     def format_whatsapp_number(self, phone_number):
@@ -50,58 +58,27 @@ class TwilioClient:
     def send_template_message(self, to_number, template_name, template_data):
         """Send a template-based WhatsApp message"""
         try:
-            # Get the template message based on the template name
-            message_template = self.get_message_template(template_name)
-            if not message_template:
+            # Get the compiled template based on the template name
+            if template_name not in TEMPLATE_EVENTS:
                 return False, f"Template {template_name} not found"
             
-            # Format the message with template data
-            message = message_template.format(**template_data)
+            # Format the message with template data; missing fields render as "Unknown"
+            message = message_templates.render(TEMPLATE_EVENTS[template_name], template_data, ['whatsapp'])['whatsapp']['text']
             
             # Send the formatted message
             return self.send_whatsapp(to_number, message)
             
-        except KeyError as e:
-            return False, f"Missing template data: {str(e)}"
         except Exception as e:
             return False, f"Error sending template message: {str(e)}"
     
     def get_message_template(self, template_name):
         """Get message template by name"""
-        templates = {
-            'appointment_reminder': (
-                "🏥 Reminder: You have an appointment at {location} with Dr. {doctor_name} "
-                "on {appointment_time}.\n\n"
-                "Please reply with:\n"
-                "1️⃣ to confirm\n"
-                "2️⃣ to reschedule\n"
-                "3️⃣ to cancel"
-            ),
-            'appointment_confirmation': (
-                "✅ Your {appointment_type} appointment has been confirmed!\n\n"
-                "📅 Date & Time: {appointment_time}\n"
-                "👨‍⚕️ Doctor: Dr. {doctor_name}\n"
-                "📍 Location: {location}\n\n"
-                "We'll send you a reminder 24 hours before your appointment."
-            ),
-            'appointment_cancelled': (
-                "❌ Your appointment with Dr. {doctor_name} scheduled for {appointment_time} "
-                "has been cancelled.\n\n"
-                "Please contact us to reschedule."
-            ),
-            'appointment_rescheduled': (
-                "📅 Your appointment has been rescheduled:\n\n"
-                "New Date & Time: {appointment_time}\n"
-                "Doctor: Dr. {doctor_name}\n"
-                "Location: {location}\n\n"
-                "Please reply:\n"
-                "1️⃣ to confirm new time\n"
-                "2️⃣ if this time doesn't work"
-            )
-        }
-        return templates.get(template_name)
+        event = TEMPLATE_EVENTS.get(template_name)
+        if not event:
+            return None
+        return MESSAGE_TEMPLATES[event]['whatsapp']['text']
 
-# Create a singleton instance
-twilio_client = TwilioClient()
+# Create a singleton instance, built on first use
+twilio_client = providers.register('twilio', TwilioClient)
 
 __all__ = ['twilio_client'] 
\ No newline at end of file
@@ -1,114 +1,22 @@
 from datetime import datetime, timedelta
-from supabase_client import admin_client
 from .twilio_client import twilio_client
 from .push_notifications import push_notifications
 from .models import PushSubscription
 import pytz
 from .email_client import email_client
 from .beem_client import beem_client
-from .push_notifications import send_push_notification
+from .dispatcher import notification_dispatcher
+from .async_clients import async_beem_client, async_push_notifications
+from .message_templates import message_templates
+from .ledger import notification_key, sent_notifications, record_notifications
+from .hydration import appointment_hydrator
+import asyncio
+import hashlib
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
-def format_appointment_time(date_str, time_str):
-    """Format appointment date and time for messages"""
-    try:
-        date = datetime.strptime(date_str, '%Y-%m-%d').date()
-        time = datetime.strptime(time_str, '%H:%M').time()
-        dt = datetime.combine(date, time)
-        return dt.strftime('%A, %B %d at %I:%M %p')
-    except ValueError:
-        return f"{date_str} at {time_str}"
-
-def get_appointment_details(appointment_id):
-    """Get full appointment details including patient and doctor info"""
-    try:
-        result = admin_client.table("appointments").select(
-            "*",
-            "patient:patient_id(*)",
-            "doctor:doctor_id(*)"
-        ).eq("id", appointment_id).single().execute()
-        
-        if not result.data:
-            return None
-            
-        appointment = result.data
-        patient = appointment.get("patient", {})
-        doctor = appointment.get("doctor", {})
-        
-        formatted_time = format_appointment_time(appointment["date"], appointment["time"])
-        
-        return {
-            "id": appointment["id"],
-            "date": appointment["date"],
-            "time": appointment["time"],
-            "appointment_time": formatted_time,  # Formatted for messages
-            "type": appointment["type"],
-            "status": appointment["status"],
-            "location": appointment.get("location_text", "Main Hospital"),
-            "patient_name": patient.get("full_name"),
-            "patient_phone": patient.get("phone"),
-            "doctor_name": doctor.get("full_name"),
-            "patient_id": patient.get("user_id"),  # For push notifications
-            "doctor_id": doctor.get("user_id")  # For push notifications
-        }
-    except Exception as e:
-        print(f"Error getting appointment details: {str(e)}")
-        return None
-
-def get_appointment_data(appointment_id):
-    """Get formatted appointment data for notifications"""
-    try:
-        # Get the appointment details
-        result = admin_client.table("appointments").select(
-            "*"
-        ).eq("id", appointment_id).single().execute()
-        
-        if not result.data:
-            return None, "Appointment not found"
-            
-        appointment = result.data
-        
-        # Get doctor details from users table via staff_profiles
-        doctor_result = admin_client.table("staff_profiles").select(
-            "user_id",
-            "users!inner(full_name)"
-        ).eq("user_id", appointment["doctor_id"]).single().execute()
-        
-        # Get patient details from users table via patients
-        patient_result = admin_client.table("patients").select(
-            "user_id",
-            "users!inner(full_name, phone)"
-        ).eq("user_id", appointment["patient_id"]).single().execute()
-        
-        if not doctor_result.data or not patient_result.data:
-            return None, "Could not find doctor or patient details"
-            
-        doctor_data = doctor_result.data.get("users", {})
-        patient_data = patient_result.data.get("users", {})
-        
-        formatted_data = {
-            "id": appointment["id"],
-            "doctor_name": doctor_data.get("full_name", "Unknown Doctor"),
-            "patient_name": patient_data.get("full_name", "Unknown Patient"),
-            "patient_phone": patient_data.get("phone"),
-            "patient_id": appointment["patient_id"],
-            "doctor_id": appointment["doctor_id"],
-            "appointment_time": f"{appointment['date']} {appointment['time']}",
-            "location": appointment.get("location_text", "Main Hospital"),
-            "type": appointment.get("type", "consultation"),
-            "status": appointment.get("status", "scheduled")
-        }
-        
-        if not formatted_data["patient_id"]:
-            return None, "Patient ID not found"
-            
-        return formatted_data, None
-    except Exception as e:
-        print(f"Error in get_appointment_data: {str(e)}")  # Add debug logging
-        return None, str(e)
-
 def send_push_to_user(user_id, title, message, url=None, data=None):
     """Helper function to send push notification to all user's subscriptions"""
     try:
@@ -135,11 +43,15 @@ def send_push_to_user(user_id, title, message, url=None, data=None):
         return False, str(e)
 
 def send_appointment_reminder(appointment_id):
-    """Send appointment reminder notification"""
+    """Send appointment reminder notification, unless the ledger shows it was already sent"""
     try:
-        appointment_data, error = get_appointment_data(appointment_id)
-        if error:
-            return False, error
+        appointment_data = appointment_hydrator.hydrate(appointment_id)
+        if not appointment_data:
+            return False, "Appointment not found"
+
+        key = notification_key(appointment_data, 'push')
+        if key in sent_notifications('reminder', [appointment_data]):
+            return True, "Reminder already sent"
             
         # Send push notification to patient
         success, message = push_notifications.send_appointment_reminder_push(
@@ -149,131 +61,129 @@ def send_appointment_reminder(appointment_id):
         
         if not success:
             return False, f"Failed to send push notification: {message}"
-            
+
+        record_notifications('reminder', [key])
         return True, "Reminder sent successfully"
     except Exception as e:
         return False, str(e)
 
+def provider_call(provider, method):
+    """Defer building a lazy provider until the task runs
+
+    Building it in the dispatcher's worker means a provider with missing
+    credentials fails only its own channel.
+    """
+    return lambda **kwargs: getattr(provider, method)(**kwargs)
+
+def notification_tasks(event, appointment_data, patient_email, doctor_email):
+    """Build the dispatcher tasks for an appointment event
+
+    Every channel's message is rendered from the template registry in one
+    pass before dispatch.
+    """
+    channels = ['push']
+    if patient_email:
+        channels.append('email_patient')
+    if doctor_email:
+        channels.append('email_doctor')
+    if appointment_data.get('patient_phone'):
+        channels.extend(['sms', 'whatsapp'])
+    messages = message_templates.render(event, appointment_data, channels)
+
+    tasks = []
+    for label, channel, email in (("patient email", 'email_patient', patient_email), ("doctor email", 'email_doctor', doctor_email)):
+        if email:
+            tasks.append(("email", label, email_client.send_email, {
+                "subject": messages[channel]['subject'],
+                "message": messages[channel]['text'],
+                "recipient_list": [email],
+                "html_message": messages[channel]['html']
+            }))
+
+    # Send SMS and WhatsApp message to patient if phone number is available
+    if appointment_data.get('patient_phone'):
+        tasks.append(("sms", "patient SMS", provider_call(beem_client, 'send_sms'), {
+            "recipient": appointment_data['patient_phone'],
+            "message": messages['sms']['text']
+        }))
+        tasks.append(("whatsapp", "patient WhatsApp", provider_call(twilio_client, 'send_whatsapp'), {
+            "to_number": appointment_data['patient_phone'],
+            "message": messages['whatsapp']['text']
+        }))
+
+    # Send push notification to all of the patient's subscriptions
+    if appointment_data.get('patient_id'):
+        tasks.append(("push", "patient push notification", provider_call(push_notifications, 'send_to_user'), {
+            "user_id": appointment_data['patient_id'],
+            "title": messages['push']['title'],
+            "message": messages['push']['text'],
+            "url": f"/appointments/{appointment_data.get('id')}",
+            "data": {"appointment_id": appointment_data.get("id")}
+        }))
+
+    return tasks
+
+def confirmation_tasks(appointment_data, patient_email, doctor_email):
+    """Build the dispatcher tasks for an appointment confirmation"""
+    return notification_tasks('confirmation', appointment_data, patient_email, doctor_email)
+
+def update_tasks(appointment_data, update_type, patient_email, doctor_email):
+    """Build the dispatcher tasks for an appointment update ('reschedule' or 'cancellation')"""
+    if update_type not in ('reschedule', 'cancellation'):
+        raise ValueError(f"Invalid update type: {update_type}")
+    return notification_tasks(update_type, appointment_data, patient_email, doctor_email)
+
 def send_appointment_confirmation(appointment_data, patient_email, doctor_email):
-    """Send appointment confirmation notifications to both patient and doctor"""
+    """Send appointment confirmation notifications to both patient and doctor
+
+    All channels are dispatched concurrently, so this takes as long as the
+    slowest channel rather than the sum of all of them.
+    """
     try:
-        # Send email to patient
-        success, message = email_client.send_appointment_confirmation_email(
-            appointment_data=appointment_data,
-            recipient_email=patient_email,
-            is_patient=True
+        result = notification_dispatcher.dispatch(
+            confirmation_tasks(appointment_data, patient_email, doctor_email)
         )
-        if not success:
-            logger.error(f"Failed to send confirmation email to patient: {message}")
+        for failure in result.failures:
+            logger.error(f"Failed to send confirmation {failure['label']}: {failure['message']}")
 
-        # Send email to doctor
-        success, message = email_client.send_appointment_confirmation_email(
-            appointment_data=appointment_data,
-            recipient_email=doctor_email,
-            is_patient=False
-        )
-        if not success:
-            logger.error(f"Failed to send confirmation email to doctor: {message}")
-
-        # Send SMS to patient if phone number is available
-        if appointment_data.get('patient_phone'):
-            success, message = beem_client.send_sms(
-                recipient=appointment_data['patient_phone'],
-                message=f"Your appointment with Dr. {appointment_data['doctor_name']} has been confirmed for {appointment_data['date']} at {appointment_data['time']}."
-            )
-            if not success:
-                logger.error(f"Failed to send confirmation SMS to patient: {message}")
-
-        # Send WhatsApp message to patient if phone number is available
-        if appointment_data.get('patient_phone'):
-            success, message = twilio_client.send_whatsapp(
-                to=appointment_data['patient_phone'],
-                message=f"Your appointment with Dr. {appointment_data['doctor_name']} has been confirmed for {appointment_data['date']} at {appointment_data['time']}."
-            )
-            if not success:
-                logger.error(f"Failed to send confirmation WhatsApp to patient: {message}")
-
-        # Send push notification to patient if device token is available
-        if appointment_data.get('patient_device_token'):
-            success, message = send_push_notification(
-                device_token=appointment_data['patient_device_token'],
-                title="Appointment Confirmed",
-                body=f"Your appointment with Dr. {appointment_data['doctor_name']} has been confirmed for {appointment_data['date']} at {appointment_data['time']}."
-            )
-            if not success:
-                logger.error(f"Failed to send confirmation push notification to patient: {message}")
-
-        return True, "Notifications sent successfully"
+        return True, f"Notifications sent successfully ({result.summary()})"
 
     except Exception as e:
         logger.error(f"Error sending appointment confirmation notifications: {str(e)}")
         return False, str(e)
 
 def send_appointment_update(appointment_data, update_type, patient_email, doctor_email):
-    """Send appointment update notifications to both patient and doctor"""
+    """Send appointment update notifications to both patient and doctor
+
+    All channels are dispatched concurrently, so this takes as long as the
+    slowest channel rather than the sum of all of them.
+    """
     try:
-        # Send email to patient
-        success, message = email_client.send_appointment_update_email(
-            appointment_data=appointment_data,
-            update_type=update_type,
-            recipient_email=patient_email,
-            is_patient=True
-        )
-        if not success:
-            logger.error(f"Failed to send update email to patient: {message}")
-
-        # Send email to doctor
-        success, message = email_client.send_appointment_update_email(
-            appointment_data=appointment_data,
-            update_type=update_type,
-            recipient_email=doctor_email,
-            is_patient=False
+        result = notification_dispatcher.dispatch(
+            update_tasks(appointment_data, update_type, patient_email, doctor_email)
         )
-        if not success:
-            logger.error(f"Failed to send update email to doctor: {message}")
-
-        # Send SMS to patient if phone number is available
-        if appointment_data.get('patient_phone'):
-            message = f"Your appointment with Dr. {appointment_data['doctor_name']} has been {update_type}ed for {appointment_data['date']} at {appointment_data['time']}."
-            success, msg = beem_client.send_sms(
-                recipient=appointment_data['patient_phone'],
-                message=message
-            )
-            if not success:
-                logger.error(f"Failed to send update SMS to patient: {msg}")
-
-        # Send WhatsApp message to patient if phone number is available
-        if appointment_data.get('patient_phone'):
-            message = f"Your appointment with Dr. {appointment_data['doctor_name']} has been {update_type}ed for {appointment_data['date']} at {appointment_data['time']}."
-            success, msg = twilio_client.send_whatsapp(
-                to=appointment_data['patient_phone'],
-                message=message
-            )
-            if not success:
-                logger.error(f"Failed to send update WhatsApp to patient: {msg}")
-
-        # Send push notification to patient if device token is available
-        if appointment_data.get('patient_device_token'):
-            success, message = send_push_notification(
-                device_token=appointment_data['patient_device_token'],
-                title=f"Appointment {update_type.title()}ed",
-                body=f"Your appointment with Dr. {appointment_data['doctor_name']} has been {update_type}ed for {appointment_data['date']} at {appointment_data['time']}."
-            )
-            if not success:
-                logger.error(f"Failed to send update push notification to patient: {message}")
+        for failure in result.failures:
+            logger.error(f"Failed to send update {failure['label']}: {failure['message']}")
 
-        return True, "Notifications sent successfully"
+        return True, f"Notifications sent successfully ({result.summary()})"
 
     except Exception as e:
         logger.error(f"Error sending appointment update notifications: {str(e)}")
         return False, str(e)
 
-def trigger_manual_reminder(appointment_id):
-    """Manually trigger a reminder for testing"""
+def trigger_manual_reminder(appointment_id, force=False):
+    """Manually trigger a reminder for testing
+
+    Reminders the ledger shows were already sent are skipped unless force is set.
+    """
     try:
-        appointment_data, error = get_appointment_data(appointment_id)
-        if error:
-            return False, error
+        appointment_data = appointment_hydrator.hydrate(appointment_id)
+        if not appointment_data:
+            return False, "Appointment not found"
+
+        key = notification_key(appointment_data, 'push')
+        if not force and key in sent_notifications('reminder', [appointment_data]):
+            return True, "Reminder already sent"
             
         # Send push notification
         success, message = push_notifications.send_appointment_reminder_push(
@@ -283,7 +193,8 @@ def trigger_manual_reminder(appointment_id):
         
         if not success:
             return False, f"Failed to send push notification: {message}"
-            
+
+        record_notifications('reminder', [key])
         return True, "Manual reminder sent successfully"
     except Exception as e:
         return False, str(e)
@@ -295,16 +206,17 @@ def check_upcoming_appointments():
         tomorrow = datetime.now() + timedelta(days=1)
         tomorrow_str = tomorrow.strftime('%Y-%m-%d')
         
-        result = admin_client.table("appointments").select("id").eq("date", tomorrow_str).execute()
+        # Hydrate the whole day in one go; each reminder below is then a cache hit
+        appointments = appointment_hydrator.hydrate_date(tomorrow_str)
         
-        if not result.data:
+        if not appointments:
             return True, "No upcoming appointments found"
             
         success_count = 0
-        total_count = len(result.data)
+        total_count = len(appointments)
         
-        for appointment in result.data:
-            success, _ = send_appointment_reminder(appointment["id"])
+        for appointment in appointments:
+            success, _ = send_appointment_reminder(appointment.id)
             if success:
                 success_count += 1
                 
@@ -312,32 +224,224 @@ def check_upcoming_appointments():
     except Exception as e:
         return False, str(e)
 
-def send_upcoming_appointment_reminders():
-    """Send reminders for appointments in the next 24 hours"""
+def appointment_shard(appointment_id, shard_count):
+    """Stable shard number for an appointment, the same in every process
+
+    Matches the appointment_shard SQL function, which the data store uses to
+    load just one shard's appointments.
+    """
+    return int(hashlib.md5(str(appointment_id).encode()).hexdigest()[:8], 16) % shard_count
+
+def reminder_sms_messages(appointments_data):
+    """(appointment_id, phone, text) entries for patients who chose SMS
+
+    Each text names the doctor, time and place, so send_bulk_sms sends
+    them one request per patient.
+    """
+    sms_appointments = [
+        appointment_data for appointment_data in appointments_data
+        if appointment_data["preferred_channel"] == "sms" and appointment_data["patient_phone"]
+    ]
+    rendered = message_templates.render_many('reminder', 'sms', sms_appointments)
+    return [
+        (appointment_data["id"], appointment_data["patient_phone"], message['text'])
+        for appointment_data, message in zip(sms_appointments, rendered)
+    ]
+
+def reminder_emails(appointments_data):
+    """(appointment_id, email) entries for patients who prefer email, ready for EmailClient.send_batch"""
+    email_appointments = [
+        appointment_data for appointment_data in appointments_data
+        if appointment_data["preferred_channel"] == "email" and appointment_data["patient_email"]
+    ]
+    rendered = message_templates.render_many('reminder', 'email_patient', email_appointments)
+    return [
+        (
+            appointment_data["id"],
+            email_client.build_message(message['subject'], message['text'], [appointment_data["patient_email"]])
+        )
+        for appointment_data, message in zip(email_appointments, rendered)
+    ]
+
+def pending_reminders(appointments_data):
+    """Split a run's appointments into those still owed a reminder on each channel
+
+    Every patient gets a push reminder, plus an SMS or email if that is
+    their preferred channel. The ledger is checked once for the whole run.
+    Returns {channel: [appointment_data, ...]} for 'push', 'sms' and 'email'.
+    """
+    sent = sent_notifications('reminder', appointments_data)
+    contact_fields = {'push': 'patient_id', 'sms': 'patient_phone', 'email': 'patient_email'}
+    return {
+        channel: [
+            appointment_data for appointment_data in appointments_data
+            if (channel == 'push' or appointment_data["preferred_channel"] == channel)
+            and appointment_data[contact_field]
+            and notification_key(appointment_data, channel) not in sent
+        ]
+        for channel, contact_field in contact_fields.items()
+    }
+
+def record_reminder_results(appointments_data, push_results, sms_results, email_results):
+    """Record the run's successful sends in the ledger"""
+    appointments_by_id = {appointment_data["id"]: appointment_data for appointment_data in appointments_data}
+    keys = [
+        notification_key(appointments_by_id[appointment_id], 'push')
+        for appointment_id, success, _ in push_results if success
+    ]
+    for channel, results in (('sms', sms_results), ('email', email_results)):
+        keys.extend(
+            notification_key(appointments_by_id[appointment_id], channel)
+            for appointment_id, (success, _) in results.items() if success
+        )
+    record_notifications('reminder', keys)
+
+def reminder_run_summary(date_str, push_results, sms_results, email_results, timings):
+    """Log failures and build the result message for a reminder run
+
+    push_results is a list of (appointment_id, success, message); sms_results
+    and email_results map appointment IDs to (success, message) as returned
+    by send_bulk_sms and EmailClient.send_batch.
+    """
+    push_failed = [(appointment_id, message) for appointment_id, success, message in push_results if not success]
+    for appointment_id, message in push_failed:
+        print(f"Failed to send reminder for appointment {appointment_id}: {message}")
+
+    sms_failed = [appointment_id for appointment_id, (success, _) in sms_results.items() if not success]
+    for appointment_id in sms_failed:
+        print(f"Failed to send SMS reminder for appointment {appointment_id}: {sms_results[appointment_id][1]}")
+
+    email_failed = [appointment_id for appointment_id, (success, _) in email_results.items() if not success]
+    for appointment_id in email_failed:
+        print(f"Failed to send email reminder for appointment {appointment_id}: {email_results[appointment_id][1]}")
+
+    timing_summary = ", ".join(f"{stage}={seconds:.2f}s" for stage, seconds in timings.items())
+    logger.info(f"Reminder run for {date_str}: {len(push_results)} appointments ({timing_summary})")
+
+    return (
+        f"Sent {len(push_results) - len(push_failed)} reminders, {len(push_failed)} failed; "
+        f"{len(sms_results) - len(sms_failed)} SMS reminders sent, {len(sms_failed)} failed; "
+        f"{len(email_results) - len(email_failed)} email reminders sent, {len(email_failed)} failed ({timing_summary})"
+    )
+
+def send_upcoming_appointment_reminders(date_str=None, shard=None, shard_count=1):
+    """Send reminders for appointments in the next 24 hours
+
+    Appointments, their patients and doctors, and the patients' push
+    subscriptions are loaded in bulk up front, then reminders fan out from
+    memory instead of hitting Supabase once per appointment. Patients who
+    prefer SMS also get a text, sent through Beem's bulk API.
+
+    Reminders the notification ledger shows were already sent are skipped,
+    so rerunning the job only reaches new or rescheduled appointments.
+
+    date_str defaults to tomorrow; with shard set, only that shard's
+    appointments (see appointment_shard) are reminded.
+    """
     try:
-        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
-        
-        # Get all appointments for tomorrow that haven't been reminded in the last 12 hours
-        twelve_hours_ago = (datetime.now() - timedelta(hours=12)).isoformat()
+        timings = {}
+        tomorrow = date_str or (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
         
-        result = admin_client.table("appointments").select("id").eq("date", tomorrow).execute()
+        stage_start = time.perf_counter()
+        appointments_data = appointment_hydrator.hydrate_date(tomorrow, shard, shard_count)
+        timings["fetch_appointments"] = time.perf_counter() - stage_start
         
-        if not result.data:
+        if not appointments_data:
             return True, "No upcoming appointments to remind"
-            
-        success_count = 0
-        fail_count = 0
-        
-        for appointment in result.data:
-            success, message = send_appointment_reminder(appointment["id"])
-            if success:
-                success_count += 1
-            else:
-                fail_count += 1
-                print(f"Failed to send reminder for appointment {appointment['id']}: {message}")
+
+        stage_start = time.perf_counter()
+        pending = pending_reminders(appointments_data)
+        timings["check_ledger"] = time.perf_counter() - stage_start
+
+        if not any(pending.values()):
+            return True, f"All {len(appointments_data)} reminders for {tomorrow} were already sent"
+
+        stage_start = time.perf_counter()
+        subscriptions_by_user = push_notifications.get_subscriptions_for_users(
+            [appointment_data["patient_id"] for appointment_data in pending['push']]
+        ) if pending['push'] else {}
+        timings["fetch_subscriptions"] = time.perf_counter() - stage_start
         
-        return True, f"Sent {success_count} reminders, {fail_count} failed"
+        stage_start = time.perf_counter()
+        push_results = []
+        for appointment_data in pending['push']:
+            success, message = push_notifications.send_appointment_reminder_push(
+                appointment_data["patient_id"],
+                appointment_data,
+                subscriptions=subscriptions_by_user.get(appointment_data["patient_id"], [])
+            )
+            push_results.append((appointment_data["id"], success, message))
+        timings["send"] = time.perf_counter() - stage_start
+
+        stage_start = time.perf_counter()
+        sms_results = beem_client.send_bulk_sms(reminder_sms_messages(pending['sms']))
+        timings["send_sms"] = time.perf_counter() - stage_start
+
+        stage_start = time.perf_counter()
+        email_results = email_client.send_batch(reminder_emails(pending['email']))
+        timings["send_email"] = time.perf_counter() - stage_start
+
+        record_reminder_results(appointments_data, push_results, sms_results, email_results)
+        return True, reminder_run_summary(tomorrow, push_results, sms_results, email_results, timings)
         
+    except Exception as e:
+        print(f"Error sending upcoming reminders: {str(e)}")
+        return False, str(e)
+
+async def send_upcoming_appointment_reminders_async(date_str=None, shard=None, shard_count=1):
+    """Async variant of send_upcoming_appointment_reminders
+
+    Every push and SMS request is awaited concurrently on the shared async
+    transport, bounded by settings.NOTIFICATION_ASYNC['CONCURRENCY'].
+    """
+    try:
+        timings = {}
+        tomorrow = date_str or (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+
+        stage_start = time.perf_counter()
+        appointments_data = await asyncio.to_thread(appointment_hydrator.hydrate_date, tomorrow, shard, shard_count)
+        timings["fetch_appointments"] = time.perf_counter() - stage_start
+
+        if not appointments_data:
+            return True, "No upcoming appointments to remind"
+
+        stage_start = time.perf_counter()
+        pending = await asyncio.to_thread(pending_reminders, appointments_data)
+        timings["check_ledger"] = time.perf_counter() - stage_start
+
+        if not any(pending.values()):
+            return True, f"All {len(appointments_data)} reminders for {tomorrow} were already sent"
+
+        stage_start = time.perf_counter()
+        subscriptions_by_user = await asyncio.to_thread(
+            push_notifications.get_subscriptions_for_users,
+            [appointment_data["patient_id"] for appointment_data in pending['push']]
+        ) if pending['push'] else {}
+        timings["fetch_subscriptions"] = time.perf_counter() - stage_start
+
+        stage_start = time.perf_counter()
+        push_outcomes, sms_results, email_results = await asyncio.gather(
+            asyncio.gather(*(
+                async_push_notifications.send_appointment_reminder_push(
+                    appointment_data["patient_id"],
+                    appointment_data,
+                    subscriptions=subscriptions_by_user.get(appointment_data["patient_id"], [])
+                )
+                for appointment_data in pending['push']
+            )),
+            async_beem_client.send_bulk_sms(reminder_sms_messages(pending['sms'])),
+            # SMTP batches reuse pooled connections on a worker thread
+            asyncio.to_thread(email_client.send_batch, reminder_emails(pending['email']))
+        )
+        timings["send"] = time.perf_counter() - stage_start
+
+        push_results = [
+            (appointment_data["id"], success, message)
+            for appointment_data, (success, message) in zip(pending['push'], push_outcomes)
+        ]
+        await asyncio.to_thread(record_reminder_results, appointments_data, push_results, sms_results, email_results)
+        return True, reminder_run_summary(tomorrow, push_results, sms_results, email_results, timings)
+
     except Exception as e:
         print(f"Error sending upcoming reminders: {str(e)}")
         return False, str(e) 
\ No newline at end of file
@@ -3,7 +3,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 import json
 from supabase_client import admin_client
-from authapp.utils import get_authenticated_user
+from authapp.decorators import auth_required
 from datetime import datetime
 from .utils import (
     send_appointment_reminder,
@@ -11,22 +11,16 @@ from .utils import (
     send_appointment_update,
     trigger_manual_reminder
 )
+from .hydration import appointment_hydrator
 
 @csrf_exempt
+@auth_required
 def save_subscription(request):
     """Save a push notification subscription"""
     if request.method != "POST":
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
-    # Verify authentication
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return JsonResponse({"error": "Authorization required"}, status=401)
-
-    token = auth_header.split(' ')[1]
-    user = get_authenticated_user(token)
-    if not user:
-        return JsonResponse({"error": "Invalid token"}, status=401)
+    user = request.app_user
 
     try:
         data = json.loads(request.body)
@@ -77,20 +71,13 @@ def save_subscription(request):
         return JsonResponse({"error": str(e)}, status=500)
 
 @csrf_exempt
+@auth_required
 def delete_subscription(request):
     """Delete a push notification subscription"""
     if request.method != "DELETE":
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
-    # Verify authentication
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return JsonResponse({"error": "Authorization required"}, status=401)
-
-    token = auth_header.split(' ')[1]
-    user = get_authenticated_user(token)
-    if not user:
-        return JsonResponse({"error": "Invalid token"}, status=401)
+    user = request.app_user
 
     try:
         data = json.loads(request.body)
@@ -122,20 +109,13 @@ def get_vapid_public_key(request):
     })
 
 @csrf_exempt
+@auth_required
 def test_notifications(request):
     """Test endpoint for notifications"""
     if request.method != "POST":
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
-    # Verify authentication
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return JsonResponse({"error": "Authorization required"}, status=401)
-
-    token = auth_header.split(' ')[1]
-    user = get_authenticated_user(token)
-    if not user:
-        return JsonResponse({"error": "Invalid token"}, status=401)
+    user = request.app_user
 
     try:
         data = json.loads(request.body)
@@ -147,12 +127,18 @@ def test_notifications(request):
 
         # Test different notification types
         if test_type == 'reminder':
-            success, message = trigger_manual_reminder(appointment_id)
-        elif test_type == 'confirmation':
-            success, message = send_appointment_confirmation(appointment_id)
-        elif test_type == 'update':
-            update_type = data.get('update_type', 'reschedule')
-            success, message = send_appointment_update(appointment_id, update_type)
+            success, message = trigger_manual_reminder(appointment_id, force=data.get('force', False))
+        elif test_type in ('confirmation', 'update'):
+            appointment_data = appointment_hydrator.hydrate(appointment_id)
+            if not appointment_data:
+                return JsonResponse({"error": "Appointment not found"}, status=404)
+
+            patient_email, doctor_email = appointment_data.patient_email, appointment_data.doctor_email
+            if test_type == 'confirmation':
+                success, message = send_appointment_confirmation(appointment_data, patient_email, doctor_email)
+            else:
+                update_type = data.get('update_type', 'reschedule')
+                success, message = send_appointment_update(appointment_data, update_type, patient_email, doctor_email)
         else:
             return JsonResponse({"error": "Invalid test type"}, status=400)
 
@@ -169,20 +155,13 @@ def test_notifications(request):
         return JsonResponse({"error": str(e)}, status=500)
 
 @csrf_exempt
+@auth_required
 def test_upcoming_reminders(request):
     """Test endpoint to trigger upcoming appointment reminders"""
     if request.method != "POST":
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
-    # Verify authentication
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return JsonResponse({"error": "Authorization required"}, status=401)
-
-    token = auth_header.split(' ')[1]
-    user = get_authenticated_user(token)
-    if not user:
-        return JsonResponse({"error": "Invalid token"}, status=401)
+    user = request.app_user
 
     try:
         # Get all appointments for testing
@@ -211,20 +190,13 @@ def test_upcoming_reminders(request):
         return JsonResponse({"error": str(e)}, status=500)
 
 @csrf_exempt
+@auth_required
 def check_subscriptions(request):
     """Debug endpoint to check user's push subscriptions"""
     if request.method != "GET":
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
-    # Verify authentication
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return JsonResponse({"error": "Authorization required"}, status=401)
-
-    token = auth_header.split(' ')[1]
-    user = get_authenticated_user(token)
-    if not user:
-        return JsonResponse({"error": "Invalid token"}, status=401)
+    user = request.app_user
 
     try:
         # Get all subscriptions for the user
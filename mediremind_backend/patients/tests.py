@@ -1,3 +1,26 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
+import base64
+import json
+from .utils import _after_condition, decode_patient_cursor, encode_patient_cursor
 
-# Create your tests here.
+USER_ID = "00000000-0000-0000-0000-000000000001"
+
+def raw_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+class PatientCursorTests(SimpleTestCase):
+    def test_round_trip_keeps_quotes(self):
+        cursor = encode_patient_cursor({"full_name": 'Ana "Nana" Mushi', "user_id": USER_ID})
+        self.assertEqual(decode_patient_cursor(cursor), ('Ana "Nana" Mushi', USER_ID))
+
+    def test_quotes_are_escaped_in_the_filter(self):
+        condition = _after_condition(('Ana "Nana" Mushi\\', USER_ID))
+        self.assertIn(r'full_name.eq."Ana \"Nana\" Mushi\\"', condition)
+
+    def test_user_id_must_be_a_uuid(self):
+        with self.assertRaises(ValueError):
+            decode_patient_cursor(raw_cursor(["Ana", f'{USER_ID}",full_name.is.null,id.gt."']))
+
+    def test_full_name_must_be_text(self):
+        with self.assertRaises(ValueError):
+            decode_patient_cursor(raw_cursor([{"or": "x"}, USER_ID]))
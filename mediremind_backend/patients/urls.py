@@ -6,7 +6,8 @@ from .views import (
     view_appointments,
     request_appointment,
     respond_to_appointment,
-    get_all_patients
+    get_all_patients,
+    get_patient_count
 )
 
 urlpatterns = [
@@ -17,4 +18,5 @@ urlpatterns = [
     path('appointments/request/', request_appointment, name='request_appointment'),
     path('appointments/<str:appointment_id>/respond/', respond_to_appointment, name='respond_to_appointment'),
     path('list/', get_all_patients, name='get_all_patients'),
+    path('count/', get_patient_count, name='get_patient_count'),
 ]
@@ -0,0 +1,102 @@
+from supabase_client import admin_client
+from appointments.utils import DEFAULT_PAGE_SIZE
+from uuid import UUID
+import base64
+import json
+import re
+
+# Fields staff can request from the patient directory
+PATIENT_DIRECTORY_FIELDS = ["user_id", "full_name", "phone", "email", "gender", "date_of_birth"]
+
+# Characters that would break out of a PostgREST filter value
+SEARCH_UNSAFE_CHARS = re.compile(r'[,()"*%\\:]')
+
+def parse_directory_fields(value):
+    """Parse a ?fields= list, keeping only allowed fields. Raises ValueError."""
+    if not value:
+        return list(PATIENT_DIRECTORY_FIELDS)
+
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    invalid = [field for field in fields if field not in PATIENT_DIRECTORY_FIELDS]
+    if invalid:
+        raise ValueError(f"Unknown fields: {', '.join(invalid)}. Allowed fields are: {', '.join(PATIENT_DIRECTORY_FIELDS)}")
+
+    # user_id and full_name are the sort key, so they are always returned
+    return list(dict.fromkeys(["user_id", "full_name"] + fields))
+
+def encode_patient_cursor(patient):
+    """Encode a patient's (full_name, user_id) sort key as an opaque cursor"""
+    key = [patient.get("full_name"), patient["user_id"]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_patient_cursor(cursor):
+    """Decode a cursor from encode_patient_cursor. Raises ValueError for malformed cursors."""
+    try:
+        full_name, user_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if full_name is not None and not isinstance(full_name, str):
+            raise TypeError("full_name must be a string")
+        # Only a real UUID goes into the filter
+        return full_name, str(UUID(user_id))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def clean_search_term(term):
+    """Strip characters that are not safe inside a PostgREST filter value"""
+    return SEARCH_UNSAFE_CHARS.sub('', term or '').strip()[:100]
+
+def _quote(value):
+    """Double-quote a PostgREST filter value, escaping backslashes and quotes"""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def _search_condition(term):
+    """Prefix match on name, phone or email (served by the trigram indexes)"""
+    return f'or(full_name.ilike."{term}*",phone.ilike."{term}*",email.ilike."{term}*")'
+
+def _after_condition(after):
+    """Rows after (full_name, user_id); NULL names sort last"""
+    full_name, user_id = after
+    user_id = str(UUID(user_id))
+    if full_name is None:
+        return f'and(full_name.is.null,user_id.gt.{user_id})'
+    full_name = _quote(full_name)
+    return (
+        f'or(full_name.gt.{full_name},full_name.is.null,'
+        f'and(full_name.eq.{full_name},user_id.gt.{user_id}))'
+    )
+
+def search_patients(fields, term=None, limit=DEFAULT_PAGE_SIZE, after=None):
+    """Get one page of the patient directory ordered by (full_name, user_id)
+
+    Returns (patients, next_cursor).
+    """
+    query = admin_client.table("patients").select(", ".join(fields))
+
+    conditions = []
+    if term:
+        conditions.append(_search_condition(term))
+    if after:
+        conditions.append(_after_condition(after))
+    if conditions:
+        # A single-item or() is the one logic tree PostgREST accepts for any mix of conditions
+        query = query.or_(f"and({','.join(conditions)})")
+
+    result = query.order("full_name", nullsfirst=False).order("user_id").limit(limit + 1).execute()
+    rows = result.data or []
+
+    patients = rows[:limit]
+    next_cursor = encode_patient_cursor(patients[-1]) if len(rows) > limit else None
+    return patients, next_cursor
+
+def count_patients(term=None):
+    """Count patients matching a search term
+
+    Without a term the planner's row estimate is used, which avoids a full
+    table scan. Returns (count, estimated).
+    """
+    estimated = not term
+    query = admin_client.table("patients").select("user_id", count="planned" if estimated else "exact")
+    if term:
+        query = query.or_(_search_condition(term))
+
+    result = query.limit(1).execute()
+    return result.count, estimated
@@ -1,82 +1,61 @@
 from django.shortcuts import render
 
 # Create your views here.
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
 from supabase_client import supabase, admin_client
-from authapp.utils import get_authenticated_user
+from data_store import data_store
+from authapp.decorators import role_required
+from authapp.token_cache import token_cache
 from datetime import datetime, timedelta
 from appointments.utils import (
     validate_appointment_type,
     validate_appointment_datetime,
-    check_doctor_availability,
-    check_patient_availability,
+    check_slot_availability,
     validate_appointment_status,
-    get_filtered_appointments
+    get_filtered_appointments,
+    stream_appointments_json,
+    parse_page_limit,
+    decode_cursor
+)
+from appointments.availability import availability_index
+from notifications.hydration import appointment_hydrator
+from notifications.outbox import enqueue_notification
+from .utils import (
+    parse_directory_fields,
+    decode_patient_cursor,
+    clean_search_term,
+    search_patients,
+    count_patients
 )
-from notifications.utils import send_appointment_confirmation, send_appointment_update
-
-def verify_patient_auth(request):
-    """Helper function to verify patient authentication and role"""
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        print("No Authorization header found")
-        return None, JsonResponse({"error": "Authorization header missing"}, status=401)
-        
-    if not auth_header.startswith('Bearer '):
-        print("Invalid Authorization header format")
-        return None, JsonResponse({"error": "Invalid Authorization header format. Must start with 'Bearer '"}, status=401)
-    
-    token = auth_header.split(' ')[1]
-    print(f"Verifying token: {token[:10]}...")  # Log first 10 chars of token
-    
-    user = get_authenticated_user(token)
-    if not user:
-        print("Failed to authenticate user with token")
-        return None, JsonResponse({"error": "Invalid or expired token"}, status=401)
 
-    if not user.id:
-        print(f"No user ID found in authenticated user")
-        return None, JsonResponse({"error": "Invalid user data"}, status=401)
+PATIENT_ROLES = ['patient']
+PATIENT_ONLY_MESSAGE = "Unauthorized. Only patients can access this endpoint"
+patient_required = role_required(PATIENT_ROLES, PATIENT_ONLY_MESSAGE)
 
-    try:
-        if not user.profile:
-            print(f"No profile found for user {user.id}")
-            return None, JsonResponse({"error": "User profile not found"}, status=404)
-            
-        if user.profile.get('role') != 'patient':
-            print(f"Invalid role for user {user.id}: {user.profile.get('role')}")
-            return None, JsonResponse({
-                "error": "Unauthorized. Only patients can access this endpoint",
-                "details": f"User role '{user.profile.get('role')}' is not authorized"
-            }, status=403)
-
-        print(f"Successfully verified patient: {user.id}")
-        return user, None
-    except Exception as e:
-        print(f"Auth verification error: {str(e)}")
-        return None, JsonResponse({"error": "Authentication verification failed"}, status=500)
+STAFF_ROLES = ['doctor', 'staff']
+STAFF_ONLY_MESSAGE = "Unauthorized. Only staff members can access this endpoint"
+staff_required = role_required(STAFF_ROLES, STAFF_ONLY_MESSAGE)
 
 @csrf_exempt
+@patient_required
 def patient_dashboard(request):
     """Patient dashboard endpoint - returns profile and any additional dashboard data"""
     if request.method != "GET":
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
-    user, error_response = verify_patient_auth(request)
-    if error_response:
-        return error_response
+    user = request.app_user
 
     try:
-        # Get patient profile using admin_client
-        result = admin_client.table("patients").select("*").eq("user_id", user.id).execute()
+        # Get patient profile
+        profile = data_store.get_profile("patients", user.id)
         
-        if not result.data or len(result.data) == 0:
+        if not profile:
             return JsonResponse({"error": "Patient profile not found"}, status=404)
 
         dashboard_data = {
-            "profile": result.data[0],
+            "profile": profile,
             "user_id": user.id,
             "role": "patient"
         }
@@ -91,23 +70,22 @@ def patient_dashboard(request):
         return JsonResponse({"error": "Failed to retrieve dashboard data"}, status=500)
 
 @csrf_exempt
+@patient_required
 def patient_profile(request):
     """Patient profile management endpoint - handles profile retrieval"""
-    user, error_response = verify_patient_auth(request)
-    if error_response:
-        return error_response
+    user = request.app_user
 
     try:
         if request.method == "GET":
-            # Get patient profile using admin_client
-            result = admin_client.table("patients").select("*").eq("user_id", user.id).execute()
+            # Get patient profile
+            profile = data_store.get_profile("patients", user.id)
             
-            if not result.data or len(result.data) == 0:
+            if not profile:
                 return JsonResponse({"error": "Profile not found"}, status=404)
 
             return JsonResponse({
                 "message": "Profile retrieved successfully",
-                "profile": result.data[0]
+                "profile": profile
             }, status=200)
         else:
             return JsonResponse({"error": "Method not allowed"}, status=405)
@@ -128,14 +106,13 @@ def get_patient_profile(request):
             return JsonResponse({"error": str(e)}, status=400)
 
 @csrf_exempt
+@role_required(PATIENT_ROLES, PATIENT_ONLY_MESSAGE, verify_remote=True)
 def update_patient_profile(request):
     """Dedicated endpoint for updating patient profile"""
     if request.method != "PUT":
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
-    user, error_response = verify_patient_auth(request)
-    if error_response:
-        return error_response
+    user = request.app_user
 
     try:
         data = json.loads(request.body)
@@ -194,6 +171,7 @@ def update_patient_profile(request):
     try:
         # Update patient profile using admin_client
         profile_result = admin_client.table("patients").update(update_data).eq("user_id", user.id).execute()
+        data_store.forget("patients", user.id)
         
         if not profile_result.data:
             return JsonResponse({"error": "Failed to update patient profile"}, status=500)
@@ -202,6 +180,11 @@ def update_patient_profile(request):
         user_update_data = {k: v for k, v in update_data.items() if k in ["full_name", "phone", "email"]}
         if user_update_data:
             admin_client.table("users").update(user_update_data).eq("id", user.id).execute()
+            data_store.forget("users", user.id)
+
+        # Cached tokens and notification contexts carry the old profile
+        token_cache.invalidate_user(user.id)
+        appointment_hydrator.invalidate_user(user.id)
 
         return JsonResponse({
             "message": "Profile updated successfully",
@@ -216,14 +199,13 @@ def update_patient_profile(request):
         }, status=500)
 
 @csrf_exempt
+@patient_required
 def view_appointments(request):
     """Endpoint for patients to view their appointments with filtering"""
     if request.method != "GET":
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
-    user, error_response = verify_patient_auth(request)
-    if error_response:
-        return error_response
+    user = request.app_user
 
     # Get filter parameters from query string
     filters = {
@@ -236,7 +218,25 @@ def view_appointments(request):
     # Remove None values
     filters = {k: v for k, v in filters.items() if v is not None}
 
-    success, result = get_filtered_appointments(user.id, is_doctor=False, **filters)
+    # ?stream=true returns the full history as a streamed JSON document
+    if request.GET.get('stream') == 'true':
+        return StreamingHttpResponse(
+            stream_appointments_json(user.id, is_doctor=False, **filters),
+            content_type="application/json"
+        )
+
+    try:
+        limit = parse_page_limit(request.GET.get('limit'))
+        after = decode_cursor(request.GET['cursor']) if request.GET.get('cursor') else None
+    except ValueError as e:
+        return JsonResponse({
+            "error": "Invalid pagination parameters",
+            "details": str(e)
+        }, status=400)
+
+    success, result, next_cursor = get_filtered_appointments(
+        user.id, is_doctor=False, limit=limit, after=after, **filters
+    )
     
     if not success:
         return JsonResponse({
@@ -246,18 +246,18 @@ def view_appointments(request):
 
     return JsonResponse({
         "message": "Appointments retrieved successfully",
-        "appointments": result
+        "appointments": result,
+        "next_cursor": next_cursor
     }, status=200)
 
 @csrf_exempt
+@patient_required
 def request_appointment(request):
     """Endpoint for patients to request new appointments"""
     if request.method != "POST":
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
-    user, error_response = verify_patient_auth(request)
-    if error_response:
-        return error_response
+    user = request.app_user
 
     try:
         data = json.loads(request.body)
@@ -293,26 +293,18 @@ def request_appointment(request):
         }, status=400)
 
     # Verify doctor exists
-    doctor_result = admin_client.table("staff_profiles").select("*").eq("user_id", data["doctor_id"]).execute()
-    if not doctor_result.data:
+    doctor = data_store.get_profile("staff_profiles", data["doctor_id"])
+    if not doctor:
         return JsonResponse({
             "error": "Doctor not found",
             "details": "Please provide a valid doctor ID"
         }, status=400)
 
-    # Check doctor availability
-    valid, error_msg = check_doctor_availability(data["doctor_id"], data["date"], data["time"])
+    # Check doctor and patient availability together
+    valid, error_msg, party = check_slot_availability(data["doctor_id"], user.id, data["date"], data["time"])
     if not valid:
         return JsonResponse({
-            "error": "Time slot not available",
-            "details": error_msg
-        }, status=409)
-
-    # Check patient availability
-    valid, error_msg = check_patient_availability(user.id, data["date"], data["time"])
-    if not valid:
-        return JsonResponse({
-            "error": "You already have an appointment at this time",
+            "error": "You already have an appointment at this time" if party == "patient" else "Time slot not available",
             "details": error_msg
         }, status=409)
 
@@ -339,16 +331,24 @@ def request_appointment(request):
                 "details": "Database error occurred"
             }, status=500)
 
+        # Drop cached day indexes for both sides of the new booking
+        availability_index.invalidate(
+            appointment_data["date"],
+            doctor_id=appointment_data["doctor_id"],
+            patient_id=appointment_data["patient_id"]
+        )
+
         # Fetch patient and doctor emails
         appointment_id = result.data[0]["id"]
         patient_email = user.profile.get('email')
-        doctor_result = admin_client.table("staff_profiles").select("email").eq("user_id", data["doctor_id"]).single().execute()
-        doctor_email = doctor_result.data["email"] if doctor_result.data else None
+        doctor_email = doctor.get("email")
 
-        # Send notification to both
-        send_success, send_message = send_appointment_confirmation(appointment_id, patient_email=patient_email, doctor_email=doctor_email)
+        # Queue notification to both for the outbox worker
+        send_success, send_message = enqueue_notification(
+            "confirmation", appointment_id=appointment_id, patient_email=patient_email, doctor_email=doctor_email
+        )
         if not send_success:
-            print(f"Failed to send appointment confirmation: {send_message}")
+            print(f"Failed to queue appointment confirmation: {send_message}")
 
         return JsonResponse({
             "message": "Appointment request sent successfully",
@@ -363,14 +363,13 @@ def request_appointment(request):
         }, status=500)
 
 @csrf_exempt
+@patient_required
 def respond_to_appointment(request, appointment_id):
     """Endpoint for patients to respond to appointments"""
     if request.method != "PUT":
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
-    user, error_response = verify_patient_auth(request)
-    if error_response:
-        return error_response
+    user = request.app_user
 
     try:
         data = json.loads(request.body)
@@ -396,15 +395,15 @@ def respond_to_appointment(request, appointment_id):
 
     try:
         # Verify appointment exists and belongs to patient
-        appointment_result = admin_client.table("appointments").select("*").eq("id", appointment_id).eq("patient_id", user.id).execute()
+        appointment = data_store.get_appointment(appointment_id, patient_id=user.id)
         
-        if not appointment_result.data:
+        if not appointment:
             return JsonResponse({
                 "error": "Appointment not found",
                 "details": "Invalid appointment ID or unauthorized access"
             }, status=404)
 
-        current_status = appointment_result.data[0]["status"]
+        current_status = appointment["status"]
         if current_status in ["cancelled", "completed"]:
             return JsonResponse({
                 "error": "Cannot update appointment",
@@ -417,6 +416,7 @@ def respond_to_appointment(request, appointment_id):
             "notes": data.get("notes", "")
         }
         result = admin_client.table("appointments").update(update_data).eq("id", appointment_id).execute()
+        data_store.forget("appointments", appointment_id)
         
         if not result.data:
             return JsonResponse({
@@ -424,30 +424,43 @@ def respond_to_appointment(request, appointment_id):
                 "details": "Database error occurred"
             }, status=500)
 
+        # A status change can free or take the slot
+        availability_index.invalidate(
+            appointment["date"],
+            doctor_id=appointment["doctor_id"],
+            patient_id=appointment["patient_id"]
+        )
+
         # Fetch patient and doctor emails
         patient_email = user.profile.get('email')
-        doctor_id = appointment_result.data[0]["doctor_id"]
-        doctor_result = admin_client.table("staff_profiles").select("email").eq("user_id", doctor_id).single().execute()
-        doctor_email = doctor_result.data["email"] if doctor_result.data else None
+        doctor_id = appointment["doctor_id"]
+        doctor = data_store.get_profile("staff_profiles", doctor_id, fields=("email",))
+        doctor_email = doctor["email"] if doctor else None
+
+        # The worker skips any cached copy older than this update
+        updated_at = result.data[0].get("updated_at")
 
-        # Send notification to both
+        # Queue notification to both for the outbox worker
         if data["status"] == "confirmed":
-            send_success, send_message = send_appointment_confirmation(
-                appointment_id, patient_email=patient_email, doctor_email=doctor_email
+            send_success, send_message = enqueue_notification(
+                "confirmation", appointment_id=appointment_id, patient_email=patient_email, doctor_email=doctor_email,
+                updated_at=updated_at
             )
         elif data["status"] == "reschedule_requested":
-            send_success, send_message = send_appointment_update(
-                appointment_id, "reschedule", patient_email=patient_email, doctor_email=doctor_email
+            send_success, send_message = enqueue_notification(
+                "update", appointment_id=appointment_id, update_type="reschedule",
+                patient_email=patient_email, doctor_email=doctor_email, updated_at=updated_at
             )
         elif data["status"] == "declined":
-            send_success, send_message = send_appointment_update(
-                appointment_id, "cancellation", patient_email=patient_email, doctor_email=doctor_email
+            send_success, send_message = enqueue_notification(
+                "update", appointment_id=appointment_id, update_type="cancellation",
+                patient_email=patient_email, doctor_email=doctor_email, updated_at=updated_at
             )
         else:
             send_success, send_message = (True, "No notification needed")
 
         if not send_success:
-            print(f"Failed to send appointment notification: {send_message}")
+            print(f"Failed to queue appointment notification: {send_message}")
 
         return JsonResponse({
             "message": "Appointment updated successfully",
@@ -461,77 +474,44 @@ def respond_to_appointment(request, appointment_id):
             "details": str(e)
         }, status=500)
 
-def verify_staff_auth(request):
-    """Helper function to verify staff authentication and role"""
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        print("No Authorization header found")
-        return None, JsonResponse({"error": "Authorization header missing"}, status=401)
-        
-    if not auth_header.startswith('Bearer '):
-        print("Invalid Authorization header format")
-        return None, JsonResponse({"error": "Invalid Authorization header format. Must start with 'Bearer '"}, status=401)
-    
-    token = auth_header.split(' ')[1]
-    print(f"Verifying token: {token[:10]}...")  # Log first 10 chars of token
-    
-    user = get_authenticated_user(token)
-    if not user:
-        print("Failed to authenticate user with token")
-        return None, JsonResponse({"error": "Invalid or expired token"}, status=401)
-
-    if not user.id:
-        print(f"No user ID found in authenticated user")
-        return None, JsonResponse({"error": "Invalid user data"}, status=401)
-
-    try:
-        if not user.profile:
-            print(f"No profile found for user {user.id}")
-            return None, JsonResponse({"error": "User profile not found"}, status=404)
-            
-        if user.profile.get('role') not in ['doctor', 'staff']:
-            print(f"Invalid role for user {user.id}: {user.profile.get('role')}")
-            return None, JsonResponse({
-                "error": "Unauthorized. Only staff members can access this endpoint",
-                "details": f"User role '{user.profile.get('role')}' is not authorized"
-            }, status=403)
-
-        print(f"Successfully verified staff member: {user.id}")
-        return user, None
-    except Exception as e:
-        print(f"Auth verification error: {str(e)}")
-        return None, JsonResponse({"error": "Authentication verification failed"}, status=500)
-
 @csrf_exempt
+@staff_required
 def get_all_patients(request):
-    """Endpoint to get all available patients"""
+    """Endpoint to page through and search the patient directory
+
+    Query params: q (prefix of name, phone or email), fields, limit, cursor.
+    """
     if request.method != "GET":
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
-    user, error_response = verify_staff_auth(request)
-    if error_response:
-        return error_response
+    user = request.app_user
 
     try:
-        # Get all patients with their basic information
-        result = admin_client.table("patients").select(
-            "user_id",
-            "full_name",
-            "phone",
-            "email",
-            "gender",
-            "date_of_birth"
-        ).execute()
+        fields = parse_directory_fields(request.GET.get('fields'))
+        limit = parse_page_limit(request.GET.get('limit'))
+        after = decode_patient_cursor(request.GET['cursor']) if request.GET.get('cursor') else None
+    except ValueError as e:
+        return JsonResponse({
+            "error": "Invalid directory parameters",
+            "details": str(e)
+        }, status=400)
 
-        if not result.data:
+    try:
+        patients, next_cursor = search_patients(
+            fields, term=clean_search_term(request.GET.get('q')), limit=limit, after=after
+        )
+
+        if not patients:
             return JsonResponse({
                 "message": "No patients found",
-                "patients": []
+                "patients": [],
+                "next_cursor": None
             }, status=200)
 
         return JsonResponse({
             "message": "Patients retrieved successfully",
-            "patients": result.data
+            "patients": patients,
+            "next_cursor": next_cursor
         }, status=200)
 
     except Exception as e:
@@ -540,3 +520,27 @@ def get_all_patients(request):
             "error": "Failed to retrieve patients",
             "details": str(e)
         }, status=500)
+
+@csrf_exempt
+@staff_required
+def get_patient_count(request):
+    """Endpoint to count patients, optionally matching a search prefix
+
+    Without q the count is the planner's estimate rather than a table scan.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    try:
+        count, estimated = count_patients(clean_search_term(request.GET.get('q')))
+        return JsonResponse({
+            "count": count,
+            "estimated": estimated
+        }, status=200)
+
+    except Exception as e:
+        print(f"Get patient count error: {str(e)}")
+        return JsonResponse({
+            "error": "Failed to count patients",
+            "details": str(e)
+        }, status=500)
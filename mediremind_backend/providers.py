@@ -0,0 +1,98 @@
+# providers.py
+from contextlib import contextmanager
+import logging
+import threading
+import time
+from django.utils.functional import SimpleLazyObject
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+_environment_loaded = False
+
+def load_environment():
+    """Load .env into the process environment, once per process"""
+    global _environment_loaded
+    if not _environment_loaded:
+        load_dotenv()
+        _environment_loaded = True
+
+class ProviderRegistry:
+    """Builds external service clients on first use instead of at import time
+
+    Modules register a factory and export the lazy proxy that register()
+    returns, so importing a module never contacts a provider or fails on a
+    missing credential; only the code paths that use a client pay for it.
+    The registry records how long each client took to build.
+
+    Tests swap in a fake client with override(); mock.patch on the exported
+    proxy would inspect it and so build the real client.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._overrides = {}
+        self._proxies = {}
+        self._timings = {}
+        self._lock = threading.RLock()
+
+    def register(self, name, factory):
+        """Register a factory and return a lazy proxy for the client it builds"""
+        with self._lock:
+            self._factories[name] = factory
+            self._proxies[name] = SimpleLazyObject(lambda: self.get(name))
+            return self._proxies[name]
+
+    def get(self, name):
+        """Return the named client, building it on first use"""
+        if name in self._overrides:
+            return self._overrides[name]
+
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            if name not in self._instances:
+                if name not in self._factories:
+                    raise KeyError(f"Unknown provider: {name}")
+                load_environment()
+                started = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                self._timings[name] = time.perf_counter() - started
+                logger.debug(f"Built provider {name} in {self._timings[name] * 1000:.1f}ms")
+            return self._instances[name]
+
+    @contextmanager
+    def override(self, name, instance):
+        """Serve instance instead of the named client inside the block
+
+        The real client is not built; the proxy goes back to it afterwards.
+        """
+        with self._lock:
+            if name not in self._factories:
+                raise KeyError(f"Unknown provider: {name}")
+            proxy = self._proxies[name]
+            previous = proxy._wrapped
+            self._overrides[name] = instance
+            proxy._wrapped = instance
+        try:
+            yield instance
+        finally:
+            with self._lock:
+                del self._overrides[name]
+                proxy._wrapped = previous
+
+    def is_built(self, name):
+        return name in self._instances
+
+    def report(self):
+        """(name, built, build seconds) for every registered provider"""
+        with self._lock:
+            return [(name, name in self._instances, self._timings.get(name)) for name in self._factories]
+
+# Create a singleton instance
+providers = ProviderRegistry()
+
+__all__ = ['providers', 'ProviderRegistry', 'load_environment']
@@ -0,0 +1,288 @@
+# query_metrics.py
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+import hmac
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERY_METRICS_SETTINGS = {
+    'ENABLED': True,
+    'QUERY_BUDGET': 15,
+    'TOKEN': None
+}
+
+# Histogram bucket upper bounds: query latency in seconds, and queries per request
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 50, 100)
+
+# Queries outside a request (management commands, worker threads) are tagged with this view
+BACKGROUND_VIEW = 'background'
+
+_current_view = ContextVar('query_metrics_view', default=BACKGROUND_VIEW)
+_request_stats = ContextVar('query_metrics_request_stats', default=None)
+
+def get_query_metrics_settings():
+    return {**DEFAULT_QUERY_METRICS_SETTINGS, **getattr(settings, 'QUERY_METRICS', {})}
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus layout"""
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+class QueryMetrics:
+    """In-process Supabase query latency, error and per-request count metrics"""
+
+    def __init__(self):
+        self._latency = {}  # (table, operation, view) -> Histogram
+        self._errors = Counter()  # (table, operation, view) -> count
+        self._per_request = {}  # view -> Histogram of queries per request
+        self._lock = threading.Lock()
+
+    def observe(self, table, operation, seconds, error=False):
+        view = _current_view.get()
+        key = (table, operation, view)
+        with self._lock:
+            histogram = self._latency.get(key)
+            if histogram is None:
+                histogram = self._latency[key] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+            if error:
+                self._errors[key] += 1
+
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.record(table, operation, seconds)
+
+    def observe_request(self, view, query_count):
+        with self._lock:
+            histogram = self._per_request.get(view)
+            if histogram is None:
+                histogram = self._per_request[view] = Histogram(QUERY_COUNT_BUCKETS)
+            histogram.observe(query_count)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            latency = sorted(self._latency.items())
+            errors = sorted(self._errors.items())
+            per_request = sorted(self._per_request.items())
+
+        lines = [
+            "# HELP supabase_query_duration_seconds Supabase query latency by table, operation and view.",
+            "# TYPE supabase_query_duration_seconds histogram"
+        ]
+        for (table, operation, view), histogram in latency:
+            for bound, count in histogram.cumulative():
+                labels = _labels(table=table, operation=operation, view=view, le=bound)
+                lines.append(f"supabase_query_duration_seconds_bucket{labels} {count}")
+            labels = _labels(table=table, operation=operation, view=view, le="+Inf")
+            lines.append(f"supabase_query_duration_seconds_bucket{labels} {histogram.count}")
+            labels = _labels(table=table, operation=operation, view=view)
+            lines.append(f"supabase_query_duration_seconds_sum{labels} {histogram.sum}")
+            lines.append(f"supabase_query_duration_seconds_count{labels} {histogram.count}")
+
+        lines += [
+            "# HELP supabase_query_errors_total Supabase queries that raised.",
+            "# TYPE supabase_query_errors_total counter"
+        ]
+        for (table, operation, view), count in errors:
+            lines.append(f"supabase_query_errors_total{_labels(table=table, operation=operation, view=view)} {count}")
+
+        lines += [
+            "# HELP supabase_queries_per_request Supabase queries made while serving one request.",
+            "# TYPE supabase_queries_per_request histogram"
+        ]
+        for view, histogram in per_request:
+            for bound, count in histogram.cumulative():
+                lines.append(f"supabase_queries_per_request_bucket{_labels(view=view, le=bound)} {count}")
+            lines.append(f"supabase_queries_per_request_bucket{_labels(view=view, le='+Inf')} {histogram.count}")
+            lines.append(f"supabase_queries_per_request_sum{_labels(view=view)} {histogram.sum}")
+            lines.append(f"supabase_queries_per_request_count{_labels(view=view)} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+class RequestQueryStats:
+    """Queries made while serving one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0
+        self.by_query = Counter()
+
+    def record(self, table, operation, seconds):
+        self.count += 1
+        self.seconds += seconds
+        self.by_query[(table, operation)] += 1
+
+    def repeated(self):
+        """'table.operation xN' for queries made more than once, most frequent first"""
+        return [
+            f"{table}.{operation} x{count}"
+            for (table, operation), count in self.by_query.most_common() if count > 1
+        ]
+
+class InstrumentedQuery:
+    """Proxy for a postgrest query builder that times execute()"""
+    __slots__ = ('_builder', '_table', '_operation')
+
+    def __init__(self, builder, table, operation):
+        self._builder = builder
+        self._table = table
+        self._operation = operation
+
+    def _wrap(self, result):
+        # Filters, modifiers and not_ return builders; keep those instrumented
+        return InstrumentedQuery(result, self._table, self._operation) if hasattr(result, 'execute') else result
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return self._wrap(attr)
+
+        def call(*args, **kwargs):
+            return self._wrap(attr(*args, **kwargs))
+        return call
+
+    def execute(self):
+        started = time.perf_counter()
+        error = True
+        try:
+            response = self._builder.execute()
+            error = False
+            return response
+        finally:
+            query_metrics.observe(self._table, self._operation, time.perf_counter() - started, error)
+
+class InstrumentedTable:
+    """Proxy for client.table(name) whose select/insert/update/upsert/delete are timed"""
+    __slots__ = ('_builder', '_table')
+
+    def __init__(self, builder, table):
+        self._builder = builder
+        self._table = table
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            return InstrumentedQuery(attr(*args, **kwargs), self._table, name)
+        return call
+
+class InstrumentedClient:
+    """Supabase client wrapper that records every table and RPC query in query_metrics"""
+
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, table_name):
+        return InstrumentedTable(self._client.table(table_name), table_name)
+
+    from_ = table
+
+    def rpc(self, fn, *args, **kwargs):
+        return InstrumentedQuery(self._client.rpc(fn, *args, **kwargs), f"rpc:{fn}", 'rpc')
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+def instrument(client):
+    """Wrap a Supabase client unless settings.QUERY_METRICS['ENABLED'] is off"""
+    if not get_query_metrics_settings()['ENABLED']:
+        return client
+    return InstrumentedClient(client)
+
+class QueryMetricsMiddleware:
+    """Tag queries with the view serving the request and enforce the per-request query budget
+
+    Requests making more than QUERY_METRICS['QUERY_BUDGET'] queries are
+    logged with their repeated queries, which usually point at an N+1 loop.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestQueryStats()
+        stats_token = _request_stats.set(stats)
+        view_token = _current_view.set('unresolved')
+        try:
+            response = self.get_response(request)
+            view = _current_view.get()
+        finally:
+            _request_stats.reset(stats_token)
+            _current_view.reset(view_token)
+
+        if stats.count:
+            query_metrics.observe_request(view, stats.count)
+            timing = f"db;dur={stats.seconds * 1000:.1f};desc=\"{stats.count} queries\""
+            existing = response.get('Server-Timing')
+            response['Server-Timing'] = f"{existing}, {timing}" if existing else timing
+
+        budget = get_query_metrics_settings()['QUERY_BUDGET']
+        if budget and stats.count > budget:
+            logger.warning(
+                f"{request.method} {request.path} ({view}) made {stats.count} Supabase queries, "
+                f"over the budget of {budget}; repeated: {', '.join(stats.repeated()) or 'none'}"
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _current_view.set(f"{view_func.__module__}.{view_func.__name__}")
+        return None
+
+@csrf_exempt
+def metrics(request):
+    """Expose query metrics in the Prometheus text format
+
+    Requires QUERY_METRICS['TOKEN'] as a bearer token; without a configured
+    token the endpoint does not exist.
+    """
+    token = get_query_metrics_settings()['TOKEN']
+    if not token:
+        return JsonResponse({"error": "Not found"}, status=404)
+
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return JsonResponse({"error": "Invalid metrics token"}, status=401)
+
+    return HttpResponse(query_metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Create a singleton instance
+query_metrics = QueryMetrics()
+
+__all__ = ['query_metrics', 'instrument', 'QueryMetricsMiddleware', 'metrics']
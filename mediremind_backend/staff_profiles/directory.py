@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from supabase_client import admin_client
+import hashlib
+import json
+import threading
+import time
+
+class DoctorDirectory:
+    """In-memory copy of the doctor list served by get_available_doctors
+
+    The list is built with one joined query and kept, together with its
+    serialized body and ETag, for settings.DOCTOR_DIRECTORY_TTL seconds.
+    invalidate() drops it as soon as a staff profile changes in this
+    process; the TTL bounds how stale other processes can be.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'DOCTOR_DIRECTORY_TTL', 300)
+        self._entry = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Fetch doctors and their staff profiles in a single query"""
+        result = admin_client.table("staff_profiles").select(
+            "user_id, full_name, position, email, phone, users!inner(role)"
+        ).eq("users.role", "doctor").order("full_name").execute()
+
+        return [{
+            "id": doc["user_id"],  # Using user_id as the doctor's ID
+            "full_name": doc["full_name"],
+            "position": doc.get("position", "General"),
+            "email": doc.get("email"),
+            "phone_number": doc.get("phone")
+        } for doc in result.data or []]
+
+    def get(self):
+        """Return (body, etag) for the current directory, loading it if needed"""
+        entry = self._entry
+        if entry and entry[2] > time.monotonic():
+            return entry[0], entry[1]
+
+        with self._lock:
+            # Another request may have rebuilt it while we waited
+            entry = self._entry
+            if entry and entry[2] > time.monotonic():
+                return entry[0], entry[1]
+
+            doctors = self.load()
+            body = json.dumps({
+                "message": "Doctors retrieved successfully" if doctors else "No doctors found",
+                "doctors": doctors
+            }, cls=DjangoJSONEncoder).encode('utf-8')
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()
+
+            self._entry = (body, etag, time.monotonic() + self.ttl)
+            return body, etag
+
+    def invalidate(self):
+        """Drop the cached directory after a staff profile is created or updated"""
+        with self._lock:
+            self._entry = None
+
+def etag_matches(if_none_match, etag):
+    """Check an If-None-Match header against an ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return any((tag[2:] if tag.startswith('W/') else tag) == etag for tag in candidates)
+
+# Create a singleton instance
+doctor_directory = DoctorDirectory()
+
+__all__ = ['doctor_directory', 'DoctorDirectory', 'etag_matches']
@@ -1,84 +1,53 @@
 from django.shortcuts import render
 
 # Create your views here.
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
 from supabase_client import supabase, admin_client
-from authapp.utils import get_authenticated_user
+from data_store import data_store
+from authapp.decorators import auth_required, role_required
+from authapp.token_cache import token_cache
 from datetime import datetime, timedelta
 from appointments.utils import validate_appointment_status
 from appointments.utils import (
     validate_appointment_type,
     validate_appointment_datetime,
-    check_doctor_availability,
-    check_patient_availability,
-    get_filtered_appointments
+    check_slot_availability,
+    get_filtered_appointments,
+    stream_appointments_json,
+    parse_page_limit,
+    decode_cursor
 )
-from notifications.utils import send_appointment_confirmation, send_appointment_update
-
-def verify_staff_auth(request):
-    """Helper function to verify staff authentication and role"""
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        print("No Authorization header found")
-        return None, JsonResponse({"error": "Authorization header missing"}, status=401)
-        
-    if not auth_header.startswith('Bearer '):
-        print("Invalid Authorization header format")
-        return None, JsonResponse({"error": "Invalid Authorization header format. Must start with 'Bearer '"}, status=401)
-    
-    token = auth_header.split(' ')[1]
-    print(f"Verifying token: {token[:10]}...")  # Log first 10 chars of token
-    
-    user = get_authenticated_user(token)
-    if not user:
-        print("Failed to authenticate user with token")
-        return None, JsonResponse({"error": "Invalid or expired token"}, status=401)
+from appointments.availability import availability_index
+from notifications.hydration import appointment_hydrator
+from notifications.outbox import enqueue_notification
+from .directory import doctor_directory, etag_matches
 
-    if not user.id:
-        print(f"No user ID found in authenticated user")
-        return None, JsonResponse({"error": "Invalid user data"}, status=401)
-
-    try:
-        if not user.profile:
-            print(f"No profile found for user {user.id}")
-            return None, JsonResponse({"error": "User profile not found"}, status=404)
-            
-        if user.profile.get('role') not in ['doctor', 'admin']:
-            print(f"Invalid role for user {user.id}: {user.profile.get('role')}")
-            return None, JsonResponse({
-                "error": "Unauthorized. Only staff members can access this endpoint",
-                "details": f"User role '{user.profile.get('role')}' is not authorized"
-            }, status=403)
-
-        print(f"Successfully verified staff member: {user.id} with role: {user.profile.get('role')}")
-        return user, None
-    except Exception as e:
-        print(f"Auth verification error: {str(e)}")
-        return None, JsonResponse({"error": "Authentication verification failed"}, status=500)
+STAFF_ROLES = ['doctor', 'admin']
+STAFF_ONLY_MESSAGE = "Unauthorized. Only staff members can access this endpoint"
+staff_required = role_required(STAFF_ROLES, STAFF_ONLY_MESSAGE)
 
 @csrf_exempt
+@staff_required
 def staff_dashboard(request):
     """Staff dashboard endpoint - returns profile and any additional dashboard data"""
     if request.method != "GET":
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
-    user, error_response = verify_staff_auth(request)
-    if error_response:
-        return error_response
+    user = request.app_user
 
     try:
-        # Get staff profile using admin_client
-        result = admin_client.table("staff_profiles").select("*").eq("user_id", user.id).execute()
+        # Get staff profile
+        profile = data_store.get_profile("staff_profiles", user.id)
         
-        if not result.data or len(result.data) == 0:
+        if not profile:
             return JsonResponse({"error": "Staff profile not found"}, status=404)
 
         dashboard_data = {
-            "profile": result.data[0],
+            "profile": profile,
             "user_id": user.id,
-            "role": user.profile.get('role')
+            "role": user.role
         }
 
         return JsonResponse({
@@ -94,23 +63,22 @@ def staff_dashboard(request):
         }, status=500)
 
 @csrf_exempt
+@staff_required
 def staff_profile(request):
     """Staff profile management endpoint - handles profile retrieval"""
-    user, error_response = verify_staff_auth(request)
-    if error_response:
-        return error_response
+    user = request.app_user
 
     try:
         if request.method == "GET":
-            # Get staff profile using admin_client
-            result = admin_client.table("staff_profiles").select("*").eq("user_id", user.id).execute()
+            # Get staff profile
+            profile = data_store.get_profile("staff_profiles", user.id)
             
-            if not result.data or len(result.data) == 0:
+            if not profile:
                 return JsonResponse({"error": "Profile not found"}, status=404)
 
             return JsonResponse({
                 "message": "Profile retrieved successfully",
-                "profile": result.data[0]
+                "profile": profile
             }, status=200)
         else:
             return JsonResponse({"error": "Method not allowed"}, status=405)
@@ -123,14 +91,13 @@ def staff_profile(request):
         }, status=500)
 
 @csrf_exempt
+@role_required(STAFF_ROLES, STAFF_ONLY_MESSAGE, verify_remote=True)
 def update_staff_profile(request):
     """Dedicated endpoint for updating staff profile"""
     if request.method != "PUT":
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
-    user, error_response = verify_staff_auth(request)
-    if error_response:
-        return error_response
+    user = request.app_user
 
     try:
         data = json.loads(request.body)
@@ -201,6 +168,7 @@ def update_staff_profile(request):
         # Update staff profile using admin_client
         print(f"Updating staff profile for user {user.id} with data: {update_data}")
         profile_result = admin_client.table("staff_profiles").update(update_data).eq("user_id", user.id).execute()
+        data_store.forget("staff_profiles", user.id)
         
         if not profile_result.data:
             print(f"Failed to update staff profile for user {user.id}")
@@ -211,6 +179,12 @@ def update_staff_profile(request):
         if user_update_data:
             print(f"Updating user record for user {user.id} with data: {user_update_data}")
             admin_client.table("users").update(user_update_data).eq("id", user.id).execute()
+            data_store.forget("users", user.id)
+
+        # Cached tokens, notification contexts and the doctor directory carry the old profile
+        token_cache.invalidate_user(user.id)
+        appointment_hydrator.invalidate_user(user.id)
+        doctor_directory.invalidate()
 
         return JsonResponse({
             "message": "Profile updated successfully",
@@ -225,14 +199,13 @@ def update_staff_profile(request):
         }, status=500)
 
 @csrf_exempt
+@staff_required
 def view_appointments(request):
     """Endpoint for doctors to view their appointments with filtering"""
     if request.method != "GET":
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
-    user, error_response = verify_staff_auth(request)
-    if error_response:
-        return error_response
+    user = request.app_user
 
     # Get filter parameters from query string
     filters = {
@@ -245,7 +218,25 @@ def view_appointments(request):
     # Remove None values
     filters = {k: v for k, v in filters.items() if v is not None}
 
-    success, result = get_filtered_appointments(user.id, is_doctor=True, **filters)
+    # ?stream=true returns the full history as a streamed JSON document
+    if request.GET.get('stream') == 'true':
+        return StreamingHttpResponse(
+            stream_appointments_json(user.id, is_doctor=True, **filters),
+            content_type="application/json"
+        )
+
+    try:
+        limit = parse_page_limit(request.GET.get('limit'))
+        after = decode_cursor(request.GET['cursor']) if request.GET.get('cursor') else None
+    except ValueError as e:
+        return JsonResponse({
+            "error": "Invalid pagination parameters",
+            "details": str(e)
+        }, status=400)
+
+    success, result, next_cursor = get_filtered_appointments(
+        user.id, is_doctor=True, limit=limit, after=after, **filters
+    )
     
     if not success:
         return JsonResponse({
@@ -255,18 +246,18 @@ def view_appointments(request):
 
     return JsonResponse({
         "message": "Appointments retrieved successfully",
-        "appointments": result
+        "appointments": result,
+        "next_cursor": next_cursor
     }, status=200)
 
 @csrf_exempt
+@staff_required
 def schedule_appointment(request):
     """Endpoint for doctors to schedule appointments"""
     if request.method != "POST":
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
-    user, error_response = verify_staff_auth(request)
-    if error_response:
-        return error_response
+    user = request.app_user
 
     try:
         data = json.loads(request.body)
@@ -302,26 +293,18 @@ def schedule_appointment(request):
         }, status=400)
 
     # Verify patient exists
-    patient_result = admin_client.table("patients").select("*").eq("user_id", data["patient_id"]).execute()
-    if not patient_result.data:
+    patient = data_store.get_profile("patients", data["patient_id"])
+    if not patient:
         return JsonResponse({
             "error": "Patient not found",
             "details": "Please provide a valid patient ID"
         }, status=400)
 
-    # Check doctor availability
-    valid, error_msg = check_doctor_availability(user.id, data["date"], data["time"])
-    if not valid:
-        return JsonResponse({
-            "error": "Time slot not available",
-            "details": error_msg
-        }, status=409)
-
-    # Check patient availability
-    valid, error_msg = check_patient_availability(data["patient_id"], data["date"], data["time"])
+    # Check doctor and patient availability together
+    valid, error_msg, party = check_slot_availability(user.id, data["patient_id"], data["date"], data["time"])
     if not valid:
         return JsonResponse({
-            "error": "Patient unavailable",
+            "error": "Patient unavailable" if party == "patient" else "Time slot not available",
             "details": error_msg
         }, status=409)
 
@@ -348,16 +331,24 @@ def schedule_appointment(request):
                 "details": "Database error occurred"
             }, status=500)
 
+        # Drop cached day indexes for both sides of the new booking
+        availability_index.invalidate(
+            appointment_data["date"],
+            doctor_id=appointment_data["doctor_id"],
+            patient_id=appointment_data["patient_id"]
+        )
+
         # Fetch patient and doctor emails
         appointment_id = result.data[0]["id"]
         doctor_email = user.profile.get('email')
-        patient_result = admin_client.table("patients").select("email").eq("user_id", data["patient_id"]).single().execute()
-        patient_email = patient_result.data["email"] if patient_result.data else None
+        patient_email = patient.get("email")
 
-        # Send notification to both
-        send_success, send_message = send_appointment_confirmation(appointment_id, patient_email=patient_email, doctor_email=doctor_email)
+        # Queue notification to both for the outbox worker
+        send_success, send_message = enqueue_notification(
+            "confirmation", appointment_id=appointment_id, patient_email=patient_email, doctor_email=doctor_email
+        )
         if not send_success:
-            print(f"Failed to send appointment confirmation: {send_message}")
+            print(f"Failed to queue appointment confirmation: {send_message}")
 
         return JsonResponse({
             "message": "Appointment scheduled successfully",
@@ -372,14 +363,13 @@ def schedule_appointment(request):
         }, status=500)
 
 @csrf_exempt
+@staff_required
 def respond_to_request(request, appointment_id):
     """Endpoint for doctors to respond to appointment requests"""
     if request.method != "PUT":
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
-    user, error_response = verify_staff_auth(request)
-    if error_response:
-        return error_response
+    user = request.app_user
 
     try:
         data = json.loads(request.body)
@@ -405,15 +395,15 @@ def respond_to_request(request, appointment_id):
 
     try:
         # Verify appointment exists and belongs to doctor
-        appointment_result = admin_client.table("appointments").select("*").eq("id", appointment_id).eq("doctor_id", user.id).execute()
+        appointment = data_store.get_appointment(appointment_id, doctor_id=user.id)
         
-        if not appointment_result.data:
+        if not appointment:
             return JsonResponse({
                 "error": "Appointment not found",
                 "details": "Invalid appointment ID or unauthorized access"
             }, status=404)
 
-        current_status = appointment_result.data[0]["status"]
+        current_status = appointment["status"]
         if current_status not in ["requested", "reschedule_requested"]:
             return JsonResponse({
                 "error": "Cannot update appointment",
@@ -426,6 +416,7 @@ def respond_to_request(request, appointment_id):
             "notes": data.get("notes", "")
         }
         result = admin_client.table("appointments").update(update_data).eq("id", appointment_id).execute()
+        data_store.forget("appointments", appointment_id)
         
         if not result.data:
             return JsonResponse({
@@ -433,28 +424,41 @@ def respond_to_request(request, appointment_id):
                 "details": "Database error occurred"
             }, status=500)
 
+        # A status change can free or take the slot
+        availability_index.invalidate(
+            appointment["date"],
+            doctor_id=appointment["doctor_id"],
+            patient_id=appointment["patient_id"]
+        )
+
         # Fetch patient and doctor emails
         doctor_email = user.profile.get('email')
-        patient_id = appointment_result.data[0]["patient_id"]
-        patient_result = admin_client.table("patients").select("email").eq("user_id", patient_id).single().execute()
-        patient_email = patient_result.data["email"] if patient_result.data else None
+        patient_id = appointment["patient_id"]
+        patient = data_store.get_profile("patients", patient_id, fields=("email",))
+        patient_email = patient["email"] if patient else None
+
+        # The worker skips any cached copy older than this update
+        updated_at = result.data[0].get("updated_at")
 
-        # Send notification to both
+        # Queue notification to both for the outbox worker
         if data["status"] == "approved":
-            send_success, send_message = send_appointment_confirmation(
-                appointment_id, patient_email=patient_email, doctor_email=doctor_email
+            send_success, send_message = enqueue_notification(
+                "confirmation", appointment_id=appointment_id, patient_email=patient_email, doctor_email=doctor_email,
+                updated_at=updated_at
             )
         elif data["status"] == "reschedule":
-            send_success, send_message = send_appointment_update(
-                appointment_id, "reschedule", patient_email=patient_email, doctor_email=doctor_email
+            send_success, send_message = enqueue_notification(
+                "update", appointment_id=appointment_id, update_type="reschedule",
+                patient_email=patient_email, doctor_email=doctor_email, updated_at=updated_at
             )
         else:  # rejected
-            send_success, send_message = send_appointment_update(
-                appointment_id, "cancellation", patient_email=patient_email, doctor_email=doctor_email
+            send_success, send_message = enqueue_notification(
+                "update", appointment_id=appointment_id, update_type="cancellation",
+                patient_email=patient_email, doctor_email=doctor_email, updated_at=updated_at
             )
 
         if not send_success:
-            print(f"Failed to send appointment notification: {send_message}")
+            print(f"Failed to queue appointment notification: {send_message}")
 
         return JsonResponse({
             "message": "Appointment updated successfully",
@@ -469,62 +473,28 @@ def respond_to_request(request, appointment_id):
         }, status=500)
 
 @csrf_exempt
+@auth_required  # Any authenticated user can fetch doctors
 def get_available_doctors(request):
-    """Endpoint to fetch all available doctors"""
+    """Endpoint to fetch all available doctors
+
+    Served from the cached doctor directory; clients that send the last
+    ETag in If-None-Match get a 304 without a database query.
+    """
     if request.method != "GET":
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
-    # Verify user authentication (any authenticated user can fetch doctors)
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return JsonResponse({"error": "Authorization header missing"}, status=401)
-        
-    if not auth_header.startswith('Bearer '):
-        return JsonResponse({"error": "Invalid Authorization header format"}, status=401)
-    
-    token = auth_header.split(' ')[1]
-    user = get_authenticated_user(token)
-    if not user:
-        return JsonResponse({"error": "Invalid or expired token"}, status=401)
-
     try:
-        # First get all users with doctor role
-        doctor_users = admin_client.table("users").select("id").eq("role", "doctor").execute()
-        
-        if not doctor_users.data:
-            return JsonResponse({
-                "message": "No doctors found",
-                "doctors": []
-            }, status=200)
+        body, etag = doctor_directory.get()
 
-        # Get doctor IDs
-        doctor_ids = [doc["id"] for doc in doctor_users.data]
-
-        # Then get staff profiles for those doctors
-        result = admin_client.table("staff_profiles") \
-            .select("user_id, full_name, position, email, phone") \
-            .in_("user_id", doctor_ids) \
-            .execute()
-
-        if not result.data:
-            return JsonResponse({
-                "message": "No doctors found",
-                "doctors": []
-            }, status=200)
-
-        # Format the response
-        doctors = [{
-            "id": doc["user_id"],  # Using user_id as the doctor's ID
-            "full_name": doc["full_name"],
-            "position": doc.get("position", "General"),
-            "email": doc.get("email"),
-            "phone_number": doc.get("phone")
-        } for doc in result.data]
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type="application/json")
 
-        return JsonResponse({
-            "message": "Doctors retrieved successfully",
-            "doctors": doctors
-        }, status=200)
+        response['ETag'] = etag
+        # Let clients keep the list but revalidate it on every load
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
     except Exception as e:
         print(f"Error fetching doctors: {str(e)}")
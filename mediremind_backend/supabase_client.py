@@ -1,18 +1,18 @@
 # supabase_client.py
 import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
+from providers import providers
+from query_metrics import instrument
 
-load_dotenv()
+def _create_client(key_variable):
+    # The supabase package is slow to import, so defer it to the first query
+    from supabase import create_client
+    # Every table query is timed and counted in query_metrics
+    return instrument(create_client(os.getenv("SUPABASE_URL"), os.getenv(key_variable)))
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY")  # anon key for auth
-SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")  # service role key for admin operations
-
-# Regular client for auth and user operations
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Regular client for auth and user operations (anon key)
+supabase = providers.register('supabase', lambda: _create_client("SUPABASE_ANON_KEY"))
 
 # Admin client with service role key for database operations
-admin_client: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+admin_client = providers.register('supabase_admin', lambda: _create_client("SUPABASE_SERVICE_ROLE_KEY"))
 
 __all__ = ['supabase', 'admin_client']
@@ -1 +1,80 @@
- 
\ No newline at end of file
+ -- Outbox for notifications queued by the appointment views and delivered by
+-- `python manage.py process_notifications` (NOTIFICATION_OUTBOX_BACKEND=supabase)
+CREATE TABLE IF NOT EXISTS notification_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    kind VARCHAR(50) NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    locked_at TIMESTAMPTZ,
+    last_error TEXT NOT NULL DEFAULT '',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS notification_jobs_status_next_attempt_idx
+    ON notification_jobs (status, next_attempt_at);
+
+-- Shard leases and completion records for `python manage.py send_reminders
+-- --shards N` (REMINDER_SCHEDULER_BACKEND=supabase)
+CREATE TABLE IF NOT EXISTS reminder_shard_runs (
+    id BIGSERIAL PRIMARY KEY,
+    run_date DATE NOT NULL,
+    shard INTEGER NOT NULL,
+    shard_count INTEGER NOT NULL,
+    owner VARCHAR(255) NOT NULL DEFAULT '',
+    lease_expires_at TIMESTAMPTZ,
+    completed_at TIMESTAMPTZ,
+    summary TEXT NOT NULL DEFAULT '',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    UNIQUE (run_date, shard, shard_count)
+);
+
+-- Delivered reminders, keyed by appointment, channel, kind and the appointment
+-- slot, doctor and location they were for (NOTIFICATION_LEDGER_BACKEND=supabase)
+CREATE TABLE IF NOT EXISTS notification_ledger (
+    id BIGSERIAL PRIMARY KEY,
+    appointment_id VARCHAR(255) NOT NULL,
+    channel VARCHAR(20) NOT NULL,
+    kind VARCHAR(50) NOT NULL,
+    send_window VARCHAR(64) NOT NULL,
+    sent_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    UNIQUE (appointment_id, channel, kind, send_window)
+);
+
+-- Patient directory search (GET /patients/list/?q=...) does prefix ilike
+-- matches on name, phone and email; trigram indexes serve those, and the
+-- (full_name, user_id) index serves the keyset pagination order.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS patients_full_name_trgm_idx ON patients USING gin (full_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS patients_phone_trgm_idx ON patients USING gin (phone gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS patients_email_trgm_idx ON patients USING gin (email gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS patients_full_name_user_id_idx ON patients (full_name, user_id);
+
+-- Keep appointments.updated_at current; notification contexts are cached
+-- per (appointment id, updated_at)
+CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS appointments_touch_updated_at ON appointments;
+CREATE TRIGGER appointments_touch_updated_at
+    BEFORE UPDATE ON appointments
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
+-- Reminder shards: each worker loads only its own appointments for a day.
+-- notifications.utils.appointment_shard computes the same value in Python.
+CREATE OR REPLACE FUNCTION appointment_shard(appointment_id UUID, shard_count INTEGER) RETURNS INTEGER AS $$
+    SELECT (('x' || left(md5(appointment_id::text), 8))::bit(32)::bigint % shard_count)::integer;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION appointments_in_shard(run_date DATE, shard INTEGER, shard_count INTEGER)
+RETURNS SETOF appointments AS $$
+    SELECT * FROM appointments WHERE date = run_date AND appointment_shard(id, shard_count) = shard;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,85 @@
+-- Minimal copy of the Supabase tables read by data_store.PostgresDataStore,
+-- for running DATA_STORE_BACKEND=postgres against a local Postgres:
+--
+--   createdb --encoding UTF8 --template template0 mediremind
+--   psql mediremind -f migrations/local_postgres_schema.sql
+--   DATA_STORE_BACKEND=postgres DATABASE_URL=postgresql://localhost/mediremind python manage.py runserver
+--
+-- Not for use against Supabase, where these tables already exist.
+CREATE TABLE IF NOT EXISTS users (
+    id UUID PRIMARY KEY,
+    email TEXT UNIQUE NOT NULL,
+    full_name TEXT,
+    phone TEXT,
+    role TEXT NOT NULL DEFAULT 'patient',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS patients (
+    user_id UUID PRIMARY KEY REFERENCES users (id),
+    full_name TEXT,
+    phone TEXT,
+    email TEXT,
+    gender TEXT,
+    date_of_birth DATE,
+    emergency_contact TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS staff_profiles (
+    user_id UUID PRIMARY KEY REFERENCES users (id),
+    full_name TEXT,
+    phone TEXT,
+    email TEXT,
+    department TEXT,
+    position TEXT,
+    staff_no TEXT,
+    branch TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS appointments (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    patient_id UUID NOT NULL REFERENCES patients (user_id),
+    doctor_id UUID NOT NULL REFERENCES staff_profiles (user_id),
+    date DATE NOT NULL,
+    time TIME NOT NULL,
+    type TEXT,
+    status TEXT NOT NULL DEFAULT 'requested',
+    location_text TEXT,
+    notes TEXT,
+    preferred_channel TEXT,
+    initiated_by TEXT,
+    duration_minutes INTEGER,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Listing and availability lookups
+CREATE INDEX IF NOT EXISTS appointments_patient_date_idx ON appointments (patient_id, date, time, id);
+CREATE INDEX IF NOT EXISTS appointments_doctor_date_idx ON appointments (doctor_id, date, time, id);
+
+-- Keep appointments.updated_at current; notification contexts are cached
+-- per (appointment id, updated_at)
+CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS appointments_touch_updated_at ON appointments;
+CREATE TRIGGER appointments_touch_updated_at
+    BEFORE UPDATE ON appointments
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
+-- Reminder shards: each worker loads only its own appointments for a day.
+-- notifications.utils.appointment_shard computes the same value in Python.
+CREATE OR REPLACE FUNCTION appointment_shard(appointment_id UUID, shard_count INTEGER) RETURNS INTEGER AS $$
+    SELECT (('x' || left(md5(appointment_id::text), 8))::bit(32)::bigint % shard_count)::integer;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION appointments_in_shard(run_date DATE, shard INTEGER, shard_count INTEGER)
+RETURNS SETOF appointments AS $$
+    SELECT * FROM appointments WHERE date = run_date AND appointment_shard(id, shard_count) = shard;
+$$ LANGUAGE sql STABLE;
@@ -10,7 +10,9 @@ cd "$SCRIPT_DIR/.."
 source venv/bin/activate  # On Windows: venv\Scripts\activate
 
 # Run Django management command to send reminders
-python manage.py send_reminders
+# Extra arguments are passed through, e.g. `send_reminders.sh --shards 8` on
+# several machines at once; each shard is sent by exactly one of them
+python manage.py send_reminders "$@"
 
 # Deactivate virtual environment
 deactivate 
\ No newline at end of file